@@ -9,14 +9,36 @@ Created by Pablo SAIDI
 
 import os
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from tkinter import Tk, filedialog, simpledialog, messagebox
+from tse_calo.dialogs import Tk, filedialog, simpledialog, messagebox
 from datetime import timedelta
+from tse_calo.export import write_table, write_tables
+from tse_calo.quality import report_quality
+from tse_calo.schema import compact, drop_unused, use_copy_on_write
+from tse_calo.periodogram import MIN_CYCLES, covered_hours, period_grid, periodogram
+from tse_calo.groups import find_sidecar, read_groups, group_summary, plot_group_curves
+from tse_calo.cosinor import fit_cosinor, plot_cosinor_overlay
+from tse_calo.facets import plot_facets
+from tse_calo.light import dark_spans
+from tse_calo.catalog import register, catalog_path
+from tse_calo.pipeline import prefetch, drain
+from tse_calo.workers import map_ordered
+from tse_calo.sampling import describe_intervals, detect_intervals, rate_samples, row_shift, weight_rates, window_shift
+from tse_calo.profiling import checkpoint
+from tse_calo.lazy import lazy_import
+from tse_calo.partitions import warn_in_memory
+from tse_calo.engine import warn_pandas_only
+
+use_copy_on_write()  # pandas 2: copy-on-write for this run (the default from pandas 3)
+
+plt = lazy_import("matplotlib.pyplot")
+mdates = lazy_import("matplotlib.dates")
 
 # ======================================================
 # 📂 Select Excel file
 # ======================================================
+warn_in_memory("TSE_4_Days_mean.py")
+warn_pandas_only("TSE_4_Days_mean.py")
+checkpoint("dialogs")
 Tk().withdraw()
 file_path = filedialog.askopenfilename(
     title="Select your merged Excel file",
@@ -24,6 +46,8 @@ file_path = filedialog.askopenfilename(
 )
 if not file_path:
     raise FileNotFoundError("❌ No file selected.")
+# Read once for the four days, while the next dialogs are answered
+workbook = prefetch(pd.read_excel, file_path, sheet_name='2em PS 2025 01')
 
 # ======================================================
 # 📅 Choose starting day
@@ -39,20 +63,14 @@ start_day = pd.to_datetime(start_day_str).date()
 # ======================================================
 timestamp_mode = simpledialog.askstring(
     "Timestamp position",
-    "Sampling window = 15 min\n\n"
+    "Sampling window = detected from the data, per animal\n\n"
     "1 = beginning of window\n"
     "2 = center of window (recommended)\n"
     "3 = end of window\n\n"
     "Enter 1, 2 or 3"
 )
 
-if timestamp_mode == "1":
-    timestamp_shift = pd.Timedelta(minutes=15)
-elif timestamp_mode == "2":
-    timestamp_shift = pd.Timedelta(minutes=7, seconds=30)
-elif timestamp_mode == "3":
-    timestamp_shift = pd.Timedelta(0)
-else:
+if timestamp_mode not in ["1", "2", "3"]:
     raise ValueError("Invalid timestamp choice.")
 
 # ======================================================
@@ -84,6 +102,41 @@ root.destroy()
 if y_scale_mode not in ["1", "2", "3"]:
     raise ValueError("Invalid Y-axis scaling choice.")
 
+# ======================================================
+# 〰️ Cosinor overlay
+# ======================================================
+root = Tk()
+root.withdraw()
+overlay_cosinor = messagebox.askyesno(
+    "Cosinor overlay",
+    "Overlay the 24 h cosinor fit of each day on the graphs ?"
+)
+root.destroy()
+
+# ======================================================
+# 👥 Group metadata (optional sidecar <file>_groups.csv / .xlsx)
+# ======================================================
+groups_file = find_sidecar(file_path)
+if groups_file:
+    groups = read_groups(groups_file)
+    print(f"👥 Groups loaded from {groups_file}: {', '.join(sorted(groups['Group'].unique()))}")
+    root = Tk()
+    root.withdraw()
+    group_error = simpledialog.askstring(
+        "Group error band",
+        "Error band for the group curves:\n\n"
+        "1 = SEM\n"
+        "2 = SD\n\n"
+        "Enter 1 or 2"
+    )
+    root.destroy()
+    if group_error not in ["1", "2"]:
+        raise ValueError("Invalid error band choice.")
+    group_error = "SEM" if group_error == "1" else "SD"
+else:
+    groups = None
+    print("ℹ️ No group file (<file>_groups.csv / .xlsx) found: group curves skipped.")
+
 # ======================================================
 # ⚙️ Experimental cycles
 # ======================================================
@@ -101,68 +154,81 @@ output_root = r"D:\pablo.SAIDI\Desktop\Sortie programme calo"
 os.makedirs(output_root, exist_ok=True)
 base_name = os.path.splitext(os.path.basename(file_path))[0]
 
-all_days_data = []
-
 # ======================================================
-# 🔁 Loop over 4 days
+# 📊 Read and clean the export (once for the 4 days)
 # ======================================================
-for i, (cycle_name, cycle_code) in enumerate(cycles):
+checkpoint("read_excel")
+df = workbook.result()
+del workbook  # the task would keep the raw frame alive until the end of the run
+df.columns = df.columns.str.strip()
+
+df = df.rename(columns={
+    df.columns[0]: "Date",
+    df.columns[1]: "Time",
+    "TX002": "Animal",
+    "Unnamed: 13": "RER",
+    "Unnamed: 14": "XT_YT",
+    "Unnamed: 15": "Feed"
+})
+
+if len(df.columns) >= 17:
+    df = df.rename(columns={df.columns[16]: "EE"})
+else:
+    df["EE"] = pd.NA
 
-    day = start_day + timedelta(days=i)
-    start_period = pd.to_datetime(str(day)) + pd.Timedelta(hours=7)
-    end_period = start_period + pd.Timedelta(hours=24)
+# Raw export columns dropped before the first row filter copies them
+df = drop_unused(df)
+df = df[pd.to_numeric(df["Animal"], errors="coerce").notna()]
+df["Animal"] = df["Animal"].astype(int)
 
-    # --------------------------
-    # 📊 Read Excel
-    df = pd.read_excel(file_path, sheet_name='2em PS 2025 01')
-    df.columns = df.columns.str.strip()
-
-    df = df.rename(columns={
-        df.columns[0]: "Date",
-        df.columns[1]: "Time",
-        "TX002": "Animal",
-        "Unnamed: 13": "RER",
-        "Unnamed: 14": "XT_YT",
-        "Unnamed: 15": "Feed"
-    })
-
-    if len(df.columns) >= 17:
-        df = df.rename(columns={df.columns[16]: "EE"})
-    else:
-        df["EE"] = pd.NA
-
-    df = df[pd.to_numeric(df["Animal"], errors="coerce").notna()]
-    df["Animal"] = df["Animal"].astype(int)
-
-    df["DateTime"] = pd.to_datetime(
-        df["Date"].astype(str) + " " + df["Time"].astype(str),
-        errors="coerce"
-    )
+df["DateTime"] = pd.to_datetime(
+    df["Date"].astype(str) + " " + df["Time"].astype(str),
+    errors="coerce"
+)
 
-    # ⏱️ Timestamp correction
-    df["DateTime"] = df["DateTime"] - timestamp_shift
+# ⏱️ Timestamp correction: a share of the sampling interval of each animal (15 min → 15 / 7.5 / 0 min)
+checkpoint("datetime_parse")
+intervals = detect_intervals(df)
+df["DateTime"] = df["DateTime"] - row_shift(df, window_shift(intervals, timestamp_mode))
+print(f"⏱️ Sampling interval: {describe_intervals(intervals)}")
 
-    # Numeric conversion
-    for col in ["RER", "XT_YT", "Feed", "EE"]:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
+# Numeric conversion
+for col in ["RER", "XT_YT", "Feed", "EE"]:
+    df[col] = pd.to_numeric(df[col], errors="coerce")
 
-    df = df.sort_values(["Animal", "DateTime"]).copy()
+# Compact schema: Date/Time text and raw export columns dropped, float32 metrics
+df = compact(df)
 
-    # --------------------------
-    # 🍽️ Feed diff
-    df["Feed_diff"] = df.groupby("Animal")["Feed"].diff()
-    df.loc[df["Feed_diff"] < 0, "Feed_diff"] = 0
+# 🩺 Data quality (gaps, duplicates, NaT, NaN runs)
+checkpoint("quality_check")
+report_quality(df, os.path.join(output_root, f"{base_name}_quality.xlsx"))
+
+df = df.sort_values(["Animal", "DateTime"])
 
-    if filter_feed:
-        df.loc[df["Feed_diff"] > 2, "Feed_diff"] = pd.NA
+# 🍽️ Feed diff
+checkpoint("feed_diff")
+df["Feed_diff"] = df.groupby("Animal")["Feed"].diff()
+df.loc[df["Feed_diff"] < 0, "Feed_diff"] = 0
 
-    # Normalize activity
-    df["XT_YT"] = df["XT_YT"] / 8000
+if filter_feed:
+    df.loc[df["Feed_diff"] > 2, "Feed_diff"] = pd.NA
+
+# Normalize activity
+df["XT_YT"] = df["XT_YT"] / 8000
+
+# ======================================================
+# 🔁 Day windows: independent once Feed_diff is known (TSE_WORKERS runs them in parallel)
+# ======================================================
+def day_values(item):
+    i, (cycle_name, cycle_code) = item
+    day = start_day + timedelta(days=i)
+    start_period = pd.to_datetime(str(day)) + pd.Timedelta(hours=7)
+    end_period = start_period + pd.Timedelta(hours=24)
 
     # --------------------------
     # ⏱️ Select day window
     df_day = df[(df["DateTime"] >= start_period) &
-                (df["DateTime"] < end_period)].copy()
+                (df["DateTime"] < end_period)]
 
     # Relative hour
     df_day["Relative_Hour"] = (
@@ -171,16 +237,18 @@ for i, (cycle_name, cycle_code) in enumerate(cycles):
     ).astype(int)
 
     # --------------------------
-    # 🧮 Hourly aggregation
+    # 🧮 Hourly aggregation (EE summed as 15-min samples whatever the sampling interval,
+    # with the samples behind each sum: EE sum / samples = kcal/h in the catalog)
     agg = {
         "RER": "mean",
         "XT_YT": "sum",
         "Feed_diff": "sum",
-        "EE": "sum"
+        "EE": "sum",
+        "EE_samples": "sum"
     }
 
     df_hour = (
-        df_day
+        rate_samples(weight_rates(df_day, intervals), intervals)
         .groupby(["Relative_Hour", "Animal"])
         .agg(agg)
         .reset_index()
@@ -195,17 +263,62 @@ for i, (cycle_name, cycle_code) in enumerate(cycles):
     df_hour["Cycle"] = cycle_name
     df_hour["CycleType"] = cycle_code
 
-    all_days_data.append(df_hour)
+    return df_hour, df_day.assign(CycleType=cycle_code)
+
+
+checkpoint("hourly_aggregation")
+days = map_ordered(day_values, enumerate(cycles))
+all_days_data = [df_hour for df_hour, _ in days]
+all_days_samples = [df_day for _, df_day in days]
+del days
 
 # ======================================================
 # 🔗 Combine all days
 # ======================================================
-df_all = pd.concat(all_days_data, ignore_index=True)
+checkpoint("combine")
+df_all = compact(pd.concat(all_days_data, ignore_index=True))
 animals = sorted(df_all["Animal"].unique())
 
+# ======================================================
+# 〰️ Cosinor fits: all animals × days × metrics at once
+# ======================================================
+checkpoint("cosinor")
+cosinor_fits = fit_cosinor(df_all, metrics=["RER", "XT_YT", "Feed_diff", "EE"])
+cosinor_fits["Cycle"] = cosinor_fits["Day"].map(
+    {start_day + timedelta(days=i): name for i, (name, _) in enumerate(cycles)}
+)
+cosinor_file = os.path.join(output_root, f"{base_name}_4days_cosinor.xlsx")
+write_table(cosinor_fits, cosinor_file)
+print(f"✅ Cosinor fits exported: {cosinor_file}")
+
+# ======================================================
+# 🌑 DD periodogram (free-running period)
+# ======================================================
+checkpoint("periodogram")
+df_dd = df_all[df_all["CycleType"] == "2"]
+dd_hours, longest = covered_hours(df_dd["DateTime"]), period_grid().max()
+if not df_dd.empty and dd_hours < MIN_CYCLES * longest:
+    # One DD day cannot resolve an 18–30 h period: no free-running period rather than a grid-edge artefact
+    print(f"⚠️ DD periodogram skipped: DD covers {dd_hours:g} h, fewer than {MIN_CYCLES} cycles of {longest:g} h")
+elif not df_dd.empty:
+    dd_peaks, dd_spectrum = periodogram(df_dd, metrics=["RER", "XT_YT", "Feed_diff", "EE"])
+    periodogram_file = os.path.join(output_root, f"{base_name}_DD_periodogram.xlsx")
+    write_tables({"Peaks": dd_peaks, "Spectrum": dd_spectrum}, periodogram_file)
+    print(f"✅ DD periodogram ({dd_peaks['Method'].iloc[0]}, {dd_peaks['Peak_Period'].notna().sum()}"
+          f"/{len(dd_peaks)} reliable peaks) exported: {periodogram_file}")
+
+# ======================================================
+# 🗃️ Cross-experiment catalog (samples + hourly values, TSE_CATALOG)
+# ======================================================
+checkpoint("catalog")
+register(base_name, "TSE_4_Days_mean", samples=pd.concat(all_days_samples, ignore_index=True), hourly=df_all,
+         how={"EE": "sum"}, start_day=start_day, source=file_path, groups=groups, path=catalog_path(output_root))
+del all_days_samples
+
 # ======================================================
 # 📏 Y-axis limits
 # ======================================================
+checkpoint("plot")
 global_y_limits = {}
 manual_y_limits = {}
 
@@ -256,29 +369,66 @@ param_colors = {
     "EE": "purple"
 }
 
-for animal in animals:
-    df_a = df_all[df_all["Animal"] == animal]
+# One faceted figure per parameter: one panel per animal, light shading computed once
+dark_periods = [span for i, (_, cycle_code) in enumerate(cycles)
+                for span in dark_spans(pd.to_datetime(str(start_day + timedelta(days=i))) + pd.Timedelta(hours=7),
+                                       cycle_code)]
+by_animal = {animal: df_a for animal, df_a in df_all.groupby("Animal", sort=True)}
+
+
+def plot_param(item):
+    param, color = item
+    panels = {animal: (df_a["DateTime"], df_a[param]) for animal, df_a in by_animal.items()
+              if not df_a[param].isna().all()}
+
+    overlay = None
+    if overlay_cosinor:
+        fits = cosinor_fits[cosinor_fits["Metric"] == param]
+        overlay = lambda ax, animal, fits=fits: plot_cosinor_overlay(ax, fits[fits["Animal"] == animal])
 
-    for param, color in param_colors.items():
-        if df_a[param].isna().all():
+    # Apply Y-scale (mode 1: each animal autoscaled on its own panel)
+    ylim = None
+    if y_scale_mode == "2" and param in global_y_limits:
+        ylim = global_y_limits[param]
+    elif y_scale_mode == "3" and param in manual_y_limits:
+        ylim = manual_y_limits[param]
+
+    plot_facets(panels, os.path.join(output_root, f"Facets_{param}_4days_hourly.png"),
+                f"{param} (4 days)", param, spans=dark_periods, color=color, ylim=ylim,
+                date_format='%m-%d %Hh', hour_interval=12, overlay=overlay,
+                sharey=y_scale_mode != "1", linewidth=1.5)
+
+
+map_ordered(plot_param, param_colors.items())  # one figure per parameter, in parallel with TSE_WORKERS
+
+# ======================================================
+# 👥 Group curves: mean ± SEM/SD per hour, one figure per parameter
+# ======================================================
+checkpoint("groups")
+if groups is not None:
+    group_stats = group_summary(df_all, groups, list(param_colors))
+    group_file = os.path.join(output_root, f"{base_name}_4days_group_summary.xlsx")
+    write_table(group_stats, group_file)
+    print(f"✅ Group summary exported: {group_file}")
+
+    for param in param_colors:
+        if df_all[param].isna().all():
             continue
 
         fig, ax = plt.subplots(figsize=(16, 6))
-        ax.plot(df_a["DateTime"], df_a[param], color=color, linewidth=2)
+        plot_group_curves(ax, group_stats, param, error=group_error)
 
         for i, (_, cycle_code) in enumerate(cycles):
             day_start = pd.to_datetime(str(start_day + timedelta(days=i))) + pd.Timedelta(hours=7)
             shade_light_cycle(ax, day_start, cycle_code)
 
-        # Apply Y-scale
-        if y_scale_mode == "2" and param in global_y_limits:
-            ax.set_ylim(global_y_limits[param])
-        elif y_scale_mode == "3" and param in manual_y_limits:
+        if y_scale_mode == "3" and param in manual_y_limits:
             ax.set_ylim(manual_y_limits[param])
 
-        ax.set_title(f"Animal {animal} – {param} (4 days)")
+        ax.set_title(f"{param} – Group mean ± {group_error} (4 days)")
         ax.set_xlabel("Time")
         ax.set_ylabel(param)
+        ax.legend(title="Group")
         ax.grid(True, linestyle="--", alpha=0.6)
         ax.xaxis.set_major_locator(mdates.HourLocator(interval=6))
         ax.xaxis.set_major_formatter(mdates.DateFormatter('%m-%d %Hh'))
@@ -287,8 +437,10 @@ for animal in animals:
 
         plt.savefig(os.path.join(
             output_root,
-            f"Animal{animal}_{param}_4days_hourly.png"
+            f"Groups_{param}_4days_hourly.png"
         ))
         plt.close()
 
+checkpoint("background_io")
+drain()
 print("\n✅ All figures generated successfully.")
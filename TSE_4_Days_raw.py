@@ -6,14 +6,27 @@ Includes: timestamp alignment (beginning / center / end of sampling window)
 
 import os
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from tkinter import Tk, filedialog, simpledialog
+from tse_calo.dialogs import Tk, filedialog, simpledialog
 from datetime import timedelta
+from tse_calo.quality import report_quality
+from tse_calo.schema import compact, use_copy_on_write
+from tse_calo.facets import plot_facets
+from tse_calo.light import dark_spans
+from tse_calo.pipeline import prefetch, drain
+from tse_calo.workers import map_ordered
+from tse_calo.sampling import describe_intervals, detect_intervals, row_shift, window_shift
+from tse_calo.profiling import checkpoint
+from tse_calo.partitions import warn_in_memory
+from tse_calo.engine import warn_pandas_only
+
+use_copy_on_write()  # pandas 2: copy-on-write for this run (the default from pandas 3)
 
 # --------------------------
 # 📂 Select Excel file
 # --------------------------
+warn_in_memory("TSE_4_Days_raw.py")
+warn_pandas_only("TSE_4_Days_raw.py")
+checkpoint("dialogs")
 Tk().withdraw()
 file_path = filedialog.askopenfilename(
     title="Select your merged Excel file",
@@ -21,6 +34,8 @@ file_path = filedialog.askopenfilename(
 )
 if not file_path:
     raise FileNotFoundError("❌ No file selected.")
+# Read once for the four days, while the next dialogs are answered
+workbook = prefetch(pd.read_excel, file_path, sheet_name='PS 2025 02')
 
 # --------------------------
 # 📅 Choose starting day
@@ -33,10 +48,10 @@ start_day = pd.to_datetime(start_day_str).date()
 # --------------------------
 timestamp_mode = simpledialog.askstring(
     "Timestamp Position",
-    "Sampling window is 15 min.\n"
+    "Sampling window is detected from the data, per animal.\n"
     "Choose how to position each data point:\n\n"
-    "1 = beginning of window (ex: 08:00 → 07:45)\n"
-    "2 = center of window, recommended (ex: 08:00 → 07:52:30)\n"
+    "1 = beginning of window (ex at 15 min: 08:00 → 07:45)\n"
+    "2 = center of window, recommended (ex at 15 min: 08:00 → 07:52:30)\n"
     "3 = end of window (no correction)\n\n"
     "Enter 1, 2, or 3:"
 )
@@ -44,13 +59,6 @@ timestamp_mode = simpledialog.askstring(
 if timestamp_mode not in ["1", "2", "3"]:
     raise ValueError("❌ Invalid choice. Restart and enter 1, 2, or 3.")
 
-if timestamp_mode == "1":
-    timestamp_shift = pd.Timedelta(minutes=15)
-elif timestamp_mode == "2":
-    timestamp_shift = pd.Timedelta(minutes=7, seconds=30)
-else:
-    timestamp_shift = pd.Timedelta(seconds=0)
-
 # --------------------------
 # ⚙️ Define the 4 cycles
 # --------------------------
@@ -66,67 +74,81 @@ output_root = r"D:\pablo.SAIDI\Desktop\Sortie programme calo"
 os.makedirs(output_root, exist_ok=True)
 base_name = os.path.splitext(os.path.basename(file_path))[0]
 
-all_days_data = []
-
 # --------------------------
-# Loop through the 4 days
+# Read and clean the sheet (once for the 4 days)
 # --------------------------
-for i, (cycle_name, cycle_code) in enumerate(cycles):
-    day = start_day + timedelta(days=i)
-    start_period = pd.to_datetime(str(day)) + pd.Timedelta(hours=7)
-    end_period = start_period + pd.Timedelta(hours=24)
+checkpoint("read_excel")
+df = workbook.result()
+del workbook  # the task would keep the raw frame alive until the end of the run
+df.columns = df.columns.str.strip()
 
-    # Read sheet
-    df = pd.read_excel(file_path, sheet_name='PS 2025 02')
-    df.columns = df.columns.str.strip()
+# Renaming
+df = df.rename(columns={
+    "PS 2025 02": "Date",
+    "Unnamed: 1": "Time",
+    "TX002": "Animal",
+    "Unnamed: 13": "RER",
+    "Unnamed: 14": "XT_YT",
+    "Unnamed: 15": "Feed"
+})
 
-    # Renaming
-    df = df.rename(columns={
-        "PS 2025 02": "Date",
-        "Unnamed: 1": "Time",
-        "TX002": "Animal",
-        "Unnamed: 13": "RER",
-        "Unnamed: 14": "XT_YT",
-        "Unnamed: 15": "Feed"
-    })
+# EE column
+if len(df.columns) >= 17:
+    ee_col_name = df.columns[16]
+    df = df.rename(columns={ee_col_name: "EE"})
+else:
+    df["EE"] = None
 
-    # EE column
-    if len(df.columns) >= 17:
-        ee_col_name = df.columns[16]
-        df = df.rename(columns={ee_col_name: "EE"})
-    else:
-        df["EE"] = None
+useful_columns = ["Date", "Time", "Animal", "RER", "XT_YT", "Feed", "EE"]
+df = df[[c for c in useful_columns if c in df.columns]]  # shares the data of the read (copy-on-write)
 
-    useful_columns = ["Date", "Time", "Animal", "RER", "XT_YT", "Feed", "EE"]
-    df = df[[c for c in useful_columns if c in df.columns]].copy()
+df = df[pd.to_numeric(df["Animal"], errors="coerce").notna()]
+df["Animal"] = df["Animal"].astype(int)
 
-    df = df[pd.to_numeric(df["Animal"], errors="coerce").notna()]
-    df["Animal"] = df["Animal"].astype(int)
+checkpoint("datetime_parse")
+df["DateTime"] = pd.to_datetime(
+    df["Date"].astype(str).str.strip() + " " + df["Time"].astype(str).str.strip(),
+    errors="coerce"
+)
 
-    df["DateTime"] = pd.to_datetime(
-        df["Date"].astype(str).str.strip() + " " + df["Time"].astype(str).str.strip(),
-        errors="coerce"
-    )
+# ⏱️ Apply timestamp shift BEFORE analysis (a share of the sampling interval of each animal)
+intervals = detect_intervals(df)
+df["DateTime"] = df["DateTime"] - row_shift(df, window_shift(intervals, timestamp_mode))
+print(f"⏱️ Sampling interval: {describe_intervals(intervals)}")
 
-    # ⏱️ Apply timestamp shift BEFORE analysis
-    df["DateTime"] = df["DateTime"] - timestamp_shift
+# Convert numeric columns
+for col in ["RER", "XT_YT", "Feed", "EE"]:
+    if col in df.columns:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
 
-    # Convert numeric columns
-    for col in ["RER", "XT_YT", "Feed", "EE"]:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
+# Compact schema: Date/Time text and raw export columns dropped, float32 metrics
+df = compact(df)
 
-    df = df.sort_values(["Animal", "DateTime"]).copy()
+# 🩺 Data quality (gaps, duplicates, NaT, NaN runs)
+checkpoint("quality_check")
+report_quality(df, os.path.join(output_root, f"{base_name}_quality.xlsx"))
 
-    if "Feed" in df.columns:
-        df["Feed_diff"] = df.groupby("Animal")["Feed"].diff().clip(lower=0)
-    else:
-        df["Feed_diff"] = pd.NA
+checkpoint("feed_diff")
+df = df.sort_values(["Animal", "DateTime"])
 
-    if "XT_YT" in df.columns:
-        df["XT_YT"] = df["XT_YT"] / 8000
+if "Feed" in df.columns:
+    df["Feed_diff"] = df.groupby("Animal")["Feed"].diff().clip(lower=0)
+else:
+    df["Feed_diff"] = pd.NA
 
-    df_day = df[(df["DateTime"] >= start_period) & (df["DateTime"] < end_period)].copy()
+if "XT_YT" in df.columns:
+    df["XT_YT"] = df["XT_YT"] / 8000
+
+# --------------------------
+# Day windows: independent once Feed_diff is known (TSE_WORKERS runs them in parallel)
+# --------------------------
+def day_values(item):
+    i, (cycle_name, cycle_code) = item
+    day = start_day + timedelta(days=i)
+    start_period = pd.to_datetime(str(day)) + pd.Timedelta(hours=7)
+    end_period = start_period + pd.Timedelta(hours=24)
+
+    df_day = df[(df["DateTime"] >= start_period) & (df["DateTime"] < end_period)]
 
     agg_dict = {}
     if "RER" in df_day.columns: agg_dict["RER"] = "mean"
@@ -138,13 +160,18 @@ for i, (cycle_name, cycle_code) in enumerate(cycles):
     df_pivot["Cycle"] = cycle_name
     df_pivot["CycleType"] = cycle_code
 
-    all_days_data.append(df_pivot)
+    return df_pivot
+
+
+checkpoint("hourly_aggregation")
+all_days_data = map_ordered(day_values, enumerate(cycles))
 
 # --------------------------
 # Combine all days
 # --------------------------
+checkpoint("combine")
 
-df_all = pd.concat(all_days_data, ignore_index=True)
+df_all = compact(pd.concat(all_days_data, ignore_index=True))
 animals = sorted(df_all["Animal"].unique())
 
 param_colors = {"RER": "blue", "XT_YT": "red", "Feed_diff": "green", "EE": "purple"}
@@ -152,47 +179,30 @@ param_colors = {"RER": "blue", "XT_YT": "red", "Feed_diff": "green", "EE": "purp
 # --------------------------
 # Shade light cycle
 # --------------------------
-def shade_light_cycle(ax, start_time, cycle_type):
-    if cycle_type == "1":
-        for h in range(0, 24, 2):
-            ax.axvspan(start_time + pd.Timedelta(hours=h + 1),
-                       start_time + pd.Timedelta(hours=h + 2),
-                       color='gray', alpha=0.15)
-    elif cycle_type == "2":
-        ax.axvspan(start_time, start_time + pd.Timedelta(hours=24), color='gray', alpha=0.25)
-    elif cycle_type == "3":
-        ax.axvspan(start_time + pd.Timedelta(hours=12),
-                   start_time + pd.Timedelta(hours=24),
-                   color='gray', alpha=0.25)
-
-# --------------------------
-# Plot
-# --------------------------
-for animal in animals:
-    df_animal = df_all[df_all["Animal"] == animal]
-
-    for param, color in param_colors.items():
-        if param not in df_animal.columns or df_animal[param].isna().all():
-            continue
-
-        fig, ax = plt.subplots(figsize=(16,6))
-        ax.plot(df_animal["DateTime"], df_animal[param], color=color, linewidth=2)
-
-        for i, (cycle_name, cycle_code) in enumerate(cycles):
-            day_start = pd.to_datetime(str(start_day + timedelta(days=i))) + pd.Timedelta(hours=7)
-            shade_light_cycle(ax, day_start, cycle_code)
-
-        ax.set_title(f"Animal {animal} - {param} over 4 Days (timestamp corrected)")
-        ax.set_xlabel("DateTime")
-        ax.set_ylabel(param)
-        ax.grid(True, linestyle='--', alpha=0.6)
-        ax.xaxis.set_major_locator(mdates.HourLocator(interval=6))
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%m-%d %Hh'))
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-
-        save_name = f"Animal{animal}_{param}_4Days_corrected.png"
-        plt.savefig(os.path.join(output_root, save_name))
-        plt.close()
+checkpoint("plot")
+dark_periods = [span for i, (_, cycle_code) in enumerate(cycles)
+                for span in dark_spans(pd.to_datetime(str(start_day + timedelta(days=i))) + pd.Timedelta(hours=7),
+                                       cycle_code, ld11_alpha=0.15, alpha=0.25)]
+
+# --------------------------
+# Plot: one faceted figure per parameter (one panel per animal, shared axes)
+# --------------------------
+by_animal = {animal: df_animal for animal, df_animal in df_all.groupby("Animal", sort=True)}
+
+
+def plot_param(item):
+    param, color = item
+    if param not in df_all.columns or df_all[param].isna().all():
+        return
+
+    panels = {animal: (d["DateTime"], d[param]) for animal, d in by_animal.items()}
+    plot_facets(panels, os.path.join(output_root, f"Facets_{param}_4Days_corrected.png"),
+                f"{param} over 4 Days (timestamp corrected)", param, spans=dark_periods, color=color,
+                date_format='%m-%d %Hh', hour_interval=12)
+
+
+map_ordered(plot_param, param_colors.items())  # one figure per parameter, in parallel with TSE_WORKERS
 
+checkpoint("background_io")
+drain()
 print("\n✅ All graphs generated with corrected timestamps.")
@@ -5,12 +5,21 @@ Created on Tue Oct 14 15:00:40 2025
 @author: pablo.SAIDI
 """
 
-import openpyxl
-from tkinter import Tk, filedialog
+from tse_calo.dialogs import Tk, filedialog, messagebox
 import os
 import sys
+import numpy as np
+import pandas as pd
+from tse_calo.energy import energy_expenditure, weight_series, read_weighins
+from tse_calo.profiling import checkpoint
+from tse_calo.lazy import lazy_import
+from tse_calo.partitions import warn_in_memory
+
+openpyxl = lazy_import("openpyxl")
 
 # === Excel file selection window ===
+warn_in_memory("TSE_Add_EE.py")
+checkpoint("dialogs")
 root = Tk()
 root.withdraw()
 root.call('wm', 'attributes', '.', '-topmost', True)  # keep window on top
@@ -26,56 +35,126 @@ if not file_path:
     sys.exit()
 
 # === Open the Excel file ===
+checkpoint("load_workbook")
 wb = openpyxl.load_workbook(file_path)
 sheet = wb.active  # or wb["Your_Sheet_Name"]
 
-# === Automatically read animal weights from B3:C7 ===
-animal_weights = {}
-for row in range(3, 8):  # from B3 to C7
-    box = sheet[f"B{row}"].value
-    weight = sheet[f"C{row}"].value
-    if box is not None and weight is not None:
-        try:
-            animal_weights[int(box)] = float(weight)
-        except:
-            pass
-
-print("📦 Detected weights:", animal_weights)
-
-if not animal_weights:
-    raise ValueError("❌ No weights detected in cells B3:C7.")
-
-# === Automatically find "Box" and "VO2(1)" columns from row 9 ===
-col_box = None
-col_vo2 = None
-
-for cell in sheet[9]:
-    if cell.value and str(cell.value).strip().lower() == "box":
+# === Find the header row (the one containing "Box" and "VO2(1)", row 9 in standard exports) ===
+header_row = None
+for cells in sheet.iter_rows(min_row=1, max_row=50):
+    labels = [str(c.value).strip().lower() for c in cells if c.value is not None]
+    if "box" in labels and any("vo2" in label for label in labels):
+        header_row = cells[0].row
+        break
+
+if header_row is None:
+    raise ValueError("❌ Could not find the header row with 'Box' and 'VO2(1)' columns.")
+
+col_box = col_vo2 = col_vco2 = col_date = col_time = None
+for cell in sheet[header_row]:
+    label = str(cell.value).strip().lower() if cell.value is not None else ""
+    if label == "box":
         col_box = cell.column
-    elif cell.value and "vo2" in str(cell.value).lower():
+    elif "vco2" in label:
+        col_vco2 = cell.column
+    elif "vo2" in label:
         col_vo2 = cell.column
+    elif label == "date":
+        col_date = cell.column
+    elif label == "time":
+        col_time = cell.column
 
 if col_box is None or col_vo2 is None:
-    raise ValueError("❌ Could not find 'Box' and 'VO2(1)' columns from row 9.")
+    raise ValueError(f"❌ Could not find 'Box' and 'VO2(1)' columns in row {header_row}.")
+
+# === Animal weights ===
+# Time series of weigh-ins from <file>_weights.csv / .xlsx if present,
+# otherwise the per-box table B3:C{header_row - 1} (any number of boxes)
+checkpoint("weights")
+weights_file = None
+for suffix in ("_weights.csv", "_weights.xlsx"):
+    if os.path.exists(os.path.splitext(file_path)[0] + suffix):
+        weights_file = os.path.splitext(file_path)[0] + suffix
+        break
+
+if weights_file:
+    weighins = read_weighins(weights_file)
+    print(f"⚖️ Weigh-ins loaded from {weights_file}: {len(weighins)} rows, {weighins['Animal'].nunique()} animals")
+else:
+    animal_weights = {}
+    for row in range(3, header_row):  # from B3 to the row above the header
+        box = sheet[f"B{row}"].value
+        weight = sheet[f"C{row}"].value
+        if box is not None and weight is not None:
+            try:
+                animal_weights[int(box)] = float(weight)
+            except (TypeError, ValueError):
+                pass
+
+    print("📦 Detected weights:", animal_weights)
+
+    if not animal_weights:
+        raise ValueError(f"❌ No weights detected in cells B3:C{header_row - 1}.")
+    weighins = pd.DataFrame({"Animal": list(animal_weights), "Weight": list(animal_weights.values())})
+
+# === Choose the formula ===
+checkpoint("dialogs")
+formula = "legacy"
+if col_vco2 is not None:
+    root = Tk()
+    root.withdraw()
+    use_weir = messagebox.askyesno(
+        "Energy expenditure formula",
+        "Compute EE with the abbreviated Weir equation (3.941·VO2 + 1.106·VCO2)?\n\n"
+        "No = previous formula (VO2 × weight × 0.000005)"
+    )
+    root.destroy()
+    formula = "weir" if use_weir else "legacy"
+else:
+    print("⚠️ No VCO2 column found: using VO2 × weight × 0.000005.")
+print(f"🔥 EE formula: {formula}")
+
+# === Read the data block (from 2 rows under the header until VO2 is empty) ===
+checkpoint("read_data")
+first_row = header_row + 2
+data = pd.DataFrame(
+    sheet.iter_rows(min_row=first_row, max_col=sheet.max_column, values_only=True),
+    columns=range(1, sheet.max_column + 1)
+)
+empty_vo2 = data[col_vo2].isna() | (data[col_vo2].astype(str).str.strip() == "")
+if empty_vo2.any():
+    data = data.iloc[:int(np.argmax(empty_vo2.to_numpy()))]
+
+vo2 = pd.to_numeric(data[col_vo2], errors="coerce")
+vco2 = pd.to_numeric(data[col_vco2], errors="coerce") if col_vco2 is not None else None
+box = pd.to_numeric(data[col_box], errors="coerce")
+
+times = pd.Series(pd.NaT, index=data.index)
+if col_date is not None and col_time is not None:
+    times = pd.to_datetime(
+        data[col_date].astype(str).str.strip() + " " + data[col_time].astype(str).str.strip(),
+        errors="coerce"
+    )
+
+# === Compute every row at once ===
+checkpoint("compute_ee")
+weight = weight_series(box, times, weighins)
+expenditure = energy_expenditure(vo2, weight, vco2, formula=formula)
+
+unweighed = sorted(box[np.isnan(weight) & box.notna()].astype(int).unique())
+if unweighed:
+    print(f"⚠️ No weight for box(es) {unweighed}: EE left empty for these rows.")
 
 # === Write the header and unit of the new column (Q9 and Q10) ===
-sheet["Q9"] = "Energy expenditure"
-sheet["Q10"] = "[kcal/h]"
-
-# === Calculate and write values starting from row 11 ===
-row = 11
-while sheet.cell(row=row, column=col_vo2).value not in (None, ""):
-    try:
-        vo2 = float(sheet.cell(row=row, column=col_vo2).value)
-        box = int(sheet.cell(row=row, column=col_box).value)
-        weight = animal_weights.get(box, 0)
-        expenditure = vo2 * weight * 0.000005
-        sheet[f"Q{row}"] = expenditure
-    except Exception:
-        sheet[f"Q{row}"] = None
-    row += 1
+checkpoint("write_cells")
+sheet[f"Q{header_row}"] = "Energy expenditure"
+sheet[f"Q{header_row + 1}"] = "[kcal/h]"
+
+for offset, value in enumerate(expenditure):
+    sheet[f"Q{first_row + offset}"] = float(value) if np.isfinite(value) else None
 
 # === Save the result in the same folder ===
+checkpoint("save_workbook")
 folder = os.path.dirname(file_path)
 file_name = os.path.basename(file_path)
 output_name = file_name.replace(".xlsx", "_results.xlsx")
@@ -83,5 +162,5 @@ output_path = os.path.join(folder, output_name)
 
 wb.save(output_path)
 
-print("\n✅ Column 'Energy expenditure [kcal/h]' added from Q9–Q10!")
+print(f"\n✅ Column 'Energy expenditure [kcal/h]' added from Q{header_row}–Q{header_row + 1}!")
 print(f"📁 File saved at: {output_path}")
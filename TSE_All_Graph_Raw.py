@@ -1,18 +1,36 @@
 # -*- coding: utf-8 -*-
 """
 Created on Thu Oct  9 09:34:28 2025
-Modified for raw 15-min data + optional 1h rolling mean smoothing
+Modified for raw data at the sampling interval of the export + optional 1h rolling mean smoothing
 @author: pablo
 """
 
 import os
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from tkinter import Tk, filedialog, simpledialog, messagebox
+from tse_calo.dialogs import Tk, filedialog, simpledialog, messagebox
+from tse_calo.export import write_table
+from tse_calo.quality import report_quality
+from tse_calo.schema import compact, use_copy_on_write
+from tse_calo.pipeline import drain
+from tse_calo.index import AnimalIndex
+from tse_calo.facets import bars, save_figure
+from tse_calo.actogram import day_bins, plot_actogram, plot_zt_heatmap
+from tse_calo.sampling import REFERENCE_INTERVAL, describe_intervals, detect_intervals, grid_interval, hourly_points, interval_label
+from tse_calo.profiling import checkpoint
+from tse_calo.lazy import lazy_import
+from tse_calo.partitions import warn_in_memory
+from tse_calo.engine import warn_pandas_only
+
+use_copy_on_write()  # pandas 2: copy-on-write for this run (the default from pandas 3)
+
+mfigure = lazy_import("matplotlib.figure")
+mdates = lazy_import("matplotlib.dates")
 
 # --------------------------
 # 📂 Selecting the Excel file (.xlsx)
+warn_in_memory("TSE_All_Graph_Raw.py")
+warn_pandas_only("TSE_All_Graph_Raw.py")
+checkpoint("dialogs")
 Tk().withdraw()
 file_path = filedialog.askopenfilename(
     title="Select your merged Excel file",
@@ -32,6 +50,7 @@ print(f"📁 Output folder : {output_dir}")
 
 # --------------------------
 # 📊 Reading the Excel file
+checkpoint("read_excel")
 df = pd.read_excel(file_path, sheet_name='PS 2025 02')
 df.columns = df.columns.str.strip()
 print("🧾 Detected columns:", df.columns.tolist())
@@ -58,10 +77,11 @@ else:
 # --------------------------
 # Relevant columns
 useful_columns = ["Date", "Time", "Animal", "RER", "XT_YT", "Feed", "EE"]
-df = df[[c for c in useful_columns if c in df.columns]].copy()
+df = df[[c for c in useful_columns if c in df.columns]]  # shares the data of the read (copy-on-write)
 
 # --------------------------
 # Cleaning and formatting
+checkpoint("datetime_parse")
 df = df[pd.to_numeric(df["Animal"], errors="coerce").notna()]
 df["Animal"] = df["Animal"].astype(int)
 df["DateTime"] = pd.to_datetime(df["Date"].astype(str) + " " + df["Time"].astype(str), errors="coerce")
@@ -70,13 +90,30 @@ for col in ["RER", "XT_YT", "Feed", "EE"]:
     if col in df.columns:
         df[col] = pd.to_numeric(df[col], errors="coerce")
 
+# Compact schema: Date/Time text and raw export columns dropped, float32 metrics
+df = compact(df)
+
+# Sampling interval of each animal: smoothing window, file names, titles and bar widths
+intervals = detect_intervals(df)
+step = grid_interval(intervals)
+resolution = interval_label(step, "-")
+print(f"⏱️ Sampling interval: {describe_intervals(intervals)}")
+
+# --------------------------
+# 🩺 Data quality check (gaps, duplicates, out-of-order rows, NaT, NaN runs)
+checkpoint("quality_check")
+report_quality(df, os.path.join(output_dir, f"{base_name}_quality.xlsx"))
+
+# --------------------------
 df = df.sort_values(["Animal", "DateTime"])
 
 # Differential Feed
+checkpoint("feed_diff")
 df["Feed_diff"] = df.groupby("Animal")["Feed"].diff()
 df.loc[df["Feed_diff"] < 0, "Feed_diff"] = 0
 
 # ❓ Ask user if values >2 should be excluded
+checkpoint("dialogs")
 root = Tk()
 root.withdraw()
 exclude_feed_outliers = messagebox.askyesno(
@@ -92,6 +129,7 @@ else:
     print("✔ Keeping all Feed_diff values (no filtering)")
 
 # Normalizing XT_YT
+checkpoint("normalize")
 df["XT_YT"] = df["XT_YT"] / 8000
 
 # Day / Hour
@@ -100,33 +138,42 @@ df["Hour"] = df["DateTime"].dt.hour
 
 # --------------------------
 # ❓ Ask user if smoothing is desired
+checkpoint("smoothing")
 root = Tk()
 root.withdraw()
 apply_smoothing = messagebox.askyesno(
     "Rolling Mean",
-    "Do you want to smooth the data with a 1-hour rolling mean (4 points of 15 min)?"
+    f"Do you want to smooth the data with a 1-hour rolling mean ({hourly_points(step)} points of {interval_label(step, ' ')})?"
 )
 root.destroy()
 
 if apply_smoothing:
-    print("🔄 Applying 1-hour rolling mean smoothing (4x15min)...")
-    df[["RER", "XT_YT", "EE", "Feed_diff"]] = (
-        df.groupby("Animal")[["RER", "XT_YT", "EE", "Feed_diff"]].transform(
-            lambda x: x.rolling(window=4, min_periods=1).mean()
-        )
-    )
+    print(f"🔄 Applying 1-hour rolling mean smoothing ({hourly_points(step)}x{interval_label(step)})...")
+    # One grouped rolling pass per window length (one hour of samples of each animal)
+    points = intervals.map(hourly_points)
+    smoothed = ["RER", "XT_YT", "EE", "Feed_diff"]
+    df[smoothed] = pd.concat([
+        df[df["Animal"].isin(group.index)].groupby("Animal")[smoothed]
+        .rolling(window=window, min_periods=1).mean().droplevel(0)
+        for window, group in points.groupby(points)
+    ])
 else:
-    print("🚫 No smoothing applied (raw 15-min data used).")
+    print(f"🚫 No smoothing applied (raw {resolution} data used).")
+
+# Contiguous rows of each animal (and each of its days), shared by the export and the graphs
+animal_rows = AnimalIndex(df, day="Day")
 
 # --------------------------
-# Export raw (or smoothed) 15-min data
+# Export raw (or smoothed) data at the sampling interval
+checkpoint("export")
 suffix = "_Smoothed" if apply_smoothing else "_Raw"
-output_file = os.path.join(output_dir, f"{base_name}{suffix}_15min_per_Animal.xlsx")
-df.to_excel(output_file, index=False)
-print("✅ 15-min data exported:", output_file)
+output_file = os.path.join(output_dir, f"{base_name}{suffix}_{interval_label(step)}_per_Animal.xlsx")
+write_table(df, output_file)
+print(f"✅ {resolution} data exported:", output_file)
 
 # --------------------------
 # 🌙 Day/Night Cycle
+checkpoint("dialogs")
 def add_night_zones(ax, days):
     for day in days:
         night_start = pd.to_datetime(str(day) + " 19:00")
@@ -141,7 +188,7 @@ def add_night_zones(ax, days):
 def add_alternation_cycle(ax, day, start_hour=7):
     start = pd.to_datetime(str(day) + f" {start_hour}:00")
     end = start + pd.Timedelta(hours=24)
-    hours = pd.date_range(start=start, end=end, freq="1H")
+    hours = pd.date_range(start=start, end=end, freq="1h")
     for i in range(len(hours)-1):
         t1, t2 = hours[i], hours[i+1]
         if i % 2 == 1:
@@ -162,14 +209,16 @@ root.destroy()
 print(f"🌗 Alternation: {alternation_day} | 🌑 Darkness: {darkness_day}")
 
 # --------------------------
-# Individual Graphs (15-min data)
-animals = df["Animal"].unique()
-for animal in animals:
-    sub = df[df["Animal"] == animal]
-    fig, ax1 = plt.subplots(figsize=(14, 6))
+# Individual Graphs (data at the sampling interval)
+checkpoint("plot_individual")
+animals = animal_rows.animals()
+for animal, sub in animal_rows.items():
+    # Standalone figure (not registered with pyplot), as in tse_calo.facets
+    fig = mfigure.Figure(figsize=(14, 6))
+    ax1 = fig.subplots()
 
     # Conditional display by day
-    for day in sub["Day"].unique():
+    for day in animal_rows.days(animal):
         if alternation_day and str(day) == alternation_day:
             add_alternation_cycle(ax1, alternation_day)
         elif darkness_day and str(day) == darkness_day:
@@ -181,7 +230,8 @@ for animal in animals:
     if "RER" in sub.columns:
         ax1.plot(sub["DateTime"], sub["RER"], label="RER", color='blue', linewidth=1.5)
     if "XT_YT" in sub.columns:
-        ax1.bar(sub["DateTime"], sub["XT_YT"], width=0.01, color='red', alpha=0.6, label="XT_YT [a.u.]")
+        bars(ax1, sub["DateTime"], sub["XT_YT"], width=0.01 * (intervals[animal] / REFERENCE_INTERVAL),  # ~1 interval, in days
+             facecolor='red', alpha=0.6, label="XT_YT [a.u.]")
     if "EE" in sub.columns:
         ax1.plot(sub["DateTime"], sub["EE"], color='purple', linewidth=2, label="EE [kcal/h]")
 
@@ -194,23 +244,24 @@ for animal in animals:
     # Feed on secondary axis
     ax2 = ax1.twinx()
     ax2.plot(sub["DateTime"], sub["Feed_diff"], color='green', linewidth=2, label="Feed [g]")
-    ax2.set_ylabel("Feed (g per 15 min)", color='green', fontsize=14, fontweight='bold')
+    ax2.set_ylabel(f"Feed (g per {interval_label(intervals[animal], ' ')})", color='green', fontsize=14, fontweight='bold')
 
-    ax1.set_title(f"Animal {animal} : RER, XT+YT, EE, Feed (15-min{' smoothed' if apply_smoothing else ' raw'})", fontsize=16, fontweight='bold')
+    ax1.set_title(f"Animal {animal} : RER, XT+YT, EE, Feed ({interval_label(intervals[animal], '-')}{' smoothed' if apply_smoothing else ' raw'})", fontsize=16, fontweight='bold')
     fig.legend(loc="upper left", bbox_to_anchor=(0.1, 0.9))
     ax1.grid(True, axis='y')
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_dir, f"Graph_Animal{animal}_15min{suffix}.png"))
-    plt.close()
+    fig.tight_layout()
+    save_figure(fig, os.path.join(output_dir, f"Graph_Animal{animal}_{interval_label(step)}{suffix}.png"))
 
-print("✅ Individual 15-min graphs generated successfully")
+print(f"✅ Individual {resolution} graphs generated successfully")
 
 # --------------------------
-# Global Graphs (15-min data)
-def generate_global_graph(df, animals, metric_prefix, title, ylabel, filename):
-    fig, ax = plt.subplots(figsize=(14, 6))
+# Global Graphs (data at the sampling interval)
+checkpoint("plot_global")
+def generate_global_graph(df, animal_rows, metric_prefix, title, ylabel, filename):
+    fig = mfigure.Figure(figsize=(14, 6))
+    ax = fig.subplots()
 
-    for day in df["Day"].unique():
+    for day in df["Day"].dropna().unique():
         if alternation_day and str(day) == alternation_day:
             add_alternation_cycle(ax, alternation_day)
         elif darkness_day and str(day) == darkness_day:
@@ -218,8 +269,7 @@ def generate_global_graph(df, animals, metric_prefix, title, ylabel, filename):
         else:
             add_night_zones(ax, [day])
 
-    for animal in animals:
-        sub = df[df["Animal"] == animal]
+    for animal, sub in animal_rows.items():
         if metric_prefix in sub.columns:
             ax.plot(sub["DateTime"], sub[metric_prefix], label=f"Animal {animal}")
 
@@ -231,17 +281,34 @@ def generate_global_graph(df, animals, metric_prefix, title, ylabel, filename):
     fig.autofmt_xdate(rotation=45, ha='right')
     ax.legend()
     ax.grid(True)
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_dir, filename))
-    plt.close()
+    fig.tight_layout()
+    save_figure(fig, os.path.join(output_dir, filename))
 
 # Global graphs
-generate_global_graph(df, animals, "RER", f"RER (15-min{' smoothed' if apply_smoothing else ' raw'}) - All animals", "RER", f"Graph_Global_RER{suffix}.png")
-generate_global_graph(df, animals, "XT_YT", f"XT+YT (15-min{' smoothed' if apply_smoothing else ' raw'}) - All animals", "XT+YT [a.u.]", f"Graph_Global_XT_YT{suffix}.png")
-generate_global_graph(df, animals, "Feed_diff", f"Feed (15-min{' smoothed' if apply_smoothing else ' raw'}) - All animals", "Feed (g/15 min)", f"Graph_Global_Feed{suffix}.png")
+generate_global_graph(df, animal_rows, "RER", f"RER ({resolution}{' smoothed' if apply_smoothing else ' raw'}) - All animals", "RER", f"Graph_Global_RER{suffix}.png")
+generate_global_graph(df, animal_rows, "XT_YT", f"XT+YT ({resolution}{' smoothed' if apply_smoothing else ' raw'}) - All animals", "XT+YT [a.u.]", f"Graph_Global_XT_YT{suffix}.png")
+generate_global_graph(df, animal_rows, "Feed_diff", f"Feed ({resolution}{' smoothed' if apply_smoothing else ' raw'}) - All animals", f"Feed (g/{interval_label(step, ' ')})", f"Graph_Global_Feed{suffix}.png")
 
 if "EE" in df.columns:
-    generate_global_graph(df, animals, "EE", f"Energy Expenditure (15-min{' smoothed' if apply_smoothing else ' raw'}) - All animals", "EE [kcal/h]", f"Graph_Global_EE{suffix}.png")
+    generate_global_graph(df, animal_rows, "EE", f"Energy Expenditure ({resolution}{' smoothed' if apply_smoothing else ' raw'}) - All animals", "EE [kcal/h]", f"Graph_Global_EE{suffix}.png")
 
-print("✅ Global 15-min graphs generated successfully")
+print(f"✅ Global {resolution} graphs generated successfully")
+
+# --------------------------
+# 🧱 Raster views of the whole recording: one image per animal / metric, whatever the number of days
+checkpoint("plot_raster")
+state = ' smoothed' if apply_smoothing else ' raw'
+for metric, name, unit in [("XT_YT", "XT_YT", "XT+YT [a.u.]"), ("Feed_diff", "Feed", "Feed [g]")]:
+    plot_actogram(day_bins(df, metric, bin=step), os.path.join(output_dir, f"Actogram_{name}{suffix}.png"),
+                  f"{name} double-plotted actogram ({resolution}{state})", f"{unit} per {interval_label(step, ' ')}")
+
+for metric, name, unit, how in [("RER", "RER", "RER", "mean"), ("XT_YT", "XT_YT", "XT+YT [a.u.] per hour", "sum"),
+                                ("EE", "EE", "EE [kcal/h]", "mean"), ("Feed_diff", "Feed", "Feed [g/h]", "sum")]:
+    if metric in df.columns:
+        plot_zt_heatmap(day_bins(df, metric, bin="1h", how=how), os.path.join(output_dir, f"ZT_Heatmap_{name}{suffix}.png"),
+                        f"{name} per ZT hour ({resolution}{state}) - All animals", unit)
+
+print("✅ Actograms and ZT heatmaps generated successfully")
+checkpoint("background_io")
+drain()
 print(f"\n📦 All files are in: {output_dir}")
@@ -6,12 +6,25 @@ Created on Thu Oct  9 09:34:28 2025
 
 import os
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from tkinter import Tk, filedialog, simpledialog, messagebox
+from tse_calo.dialogs import Tk, filedialog, simpledialog, messagebox
+from tse_calo.export import write_table
+from tse_calo.quality import report_quality, quality_index
+from tse_calo.partitions import out_of_core, read_export, partitioned, map_partitions
+from tse_calo.schema import compact, use_copy_on_write
+from tse_calo.engine import prepare, aggregate
+from tse_calo.catalog import register, catalog_path
+from tse_calo.pipeline import drain
+from tse_calo.profiling import checkpoint
+from tse_calo.lazy import lazy_import
+
+use_copy_on_write()  # pandas 2: copy-on-write for this run (the default from pandas 3)
+
+plt = lazy_import("matplotlib.pyplot")
+mdates = lazy_import("matplotlib.dates")
 
 # --------------------------
 # 📂 Selecting the Excel file (.xlsx)
+checkpoint("dialogs")
 Tk().withdraw()
 file_path = filedialog.askopenfilename(
     title="Select your merged Excel file",
@@ -30,81 +43,125 @@ os.makedirs(output_dir, exist_ok=True)
 print(f"📁 Output folder : {output_dir}")
 
 # --------------------------
-# 📊 Reading the Excel file
-df = pd.read_excel(file_path, sheet_name='PS 2025 02')
-df.columns = df.columns.str.strip()
-print("🧾 Detected columns:", df.columns.tolist())
-
-# 🧱 Main renaming
-df = df.rename(columns={
-    "PS 2025 02": "Date",
-    "Unnamed: 1": "Time",
-    "TX002": "Animal",
-    "Unnamed: 13": "RER",
-    "Unnamed: 14": "XT_YT",
-    "Unnamed: 15": "Feed"
-})
-
-# 🔍 Forcing the Energy Expenditure column (column Q)
-if len(df.columns) >= 17:
-    ee_col_name = df.columns[16]
-    df = df.rename(columns={ee_col_name: "EE"})
-    print(f"✅ Forced Energy Expenditure column : {ee_col_name} (column Q)")
-else:
-    print("⚠️ The file doesn't contain a Q column. Please check the file format.")
-    df["EE"] = None
-
-# --------------------------
-# Relevant columns
-useful_columns = ["Date", "Time", "Animal", "RER", "XT_YT", "Feed", "EE"]
-df = df[[c for c in useful_columns if c in df.columns]].copy()
-
-# --------------------------
-# Cleaning and formatting
-df = df[pd.to_numeric(df["Animal"], errors="coerce").notna()]
-df["Animal"] = df["Animal"].astype(int)
-df["DateTime"] = pd.to_datetime(df["Date"].astype(str) + " " + df["Time"].astype(str), errors="coerce")
-
-for col in ["RER", "XT_YT", "Feed", "EE"]:
-    if col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
+# 🧹 Cleaning and formatting (whole sheet, or one chunk of it in out-of-core mode)
+def clean(df):
+    df.columns = df.columns.str.strip()
+
+    # 🧱 Main renaming
+    df = df.rename(columns={
+        df.columns[0]: "Date",
+        "Unnamed: 1": "Time",
+        "TX002": "Animal",
+        "Unnamed: 13": "RER",
+        "Unnamed: 14": "XT_YT",
+        "Unnamed: 15": "Feed"
+    })
+
+    # 🔍 Forcing the Energy Expenditure column (column Q)
+    if len(df.columns) >= 17:
+        df = df.rename(columns={df.columns[16]: "EE"})
+    else:
+        df["EE"] = None
+
+    # Relevant columns
+    useful_columns = ["Date", "Time", "Animal", "RER", "XT_YT", "Feed", "EE"]
+    df = df[[c for c in useful_columns if c in df.columns]]  # shares the data of the read (copy-on-write)
+
+    df = df[pd.to_numeric(df["Animal"], errors="coerce").notna()]
+    df["Animal"] = df["Animal"].astype(float).astype(int)
+    df["DateTime"] = pd.to_datetime(df["Date"].astype(str) + " " + df["Time"].astype(str), errors="coerce")
+
+    for col in ["RER", "XT_YT", "Feed", "EE"]:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    # Compact schema: Date/Time text and raw export columns dropped, float32 metrics
+    return compact(df)
+
+
+def report_columns(columns):
+    print("🧾 Detected columns:", columns)
+    if len(columns) >= 17:
+        print(f"✅ Forced Energy Expenditure column : {columns[16]} (column Q)")
+    else:
+        print("⚠️ The file doesn't contain a Q column. Please check the file format.")
 
-df = df.sort_values(["Animal", "DateTime"])
 
 # --------------------------
-# Differential Feed
-df["Feed_diff"] = df.groupby("Animal")["Feed"].diff()
-df.loc[df["Feed_diff"] < 0, "Feed_diff"] = 0
-
-# ❓ Ask user if values >2 should be excluded
-root = Tk()
-root.withdraw()
-exclude_feed_outliers = messagebox.askyesno(
-    "Feed_diff Filtering",
-    "Do you want to exclude Feed_diff values greater than 2 ?"
-)
-root.destroy()
-
-if exclude_feed_outliers:
-    print("⛔ Excluding Feed_diff values > 2")
-    df.loc[df["Feed_diff"] > 2, "Feed_diff"] = None
+# ⏱️ Hourly values of the animals in df (all of them, or one partition)
+def hourly_values(df):
+    # Differential Feed (clipped at 0, > 2 excluded on request) and normalized XT_YT (pandas, or Polars with TSE_BACKEND=polars)
+    df = prepare(df, exclude_feed=exclude_feed_outliers)
+
+    # Day / Hour
+    df["Day"] = df["DateTime"].dt.date
+    df["Hour"] = df["DateTime"].dt.hour
+
+    return aggregate(df, ["Day", "Hour", "Animal"], {"RER": "mean", "XT_YT": "sum", "Feed_diff": "sum", "EE": "mean"})
+
+
+def ask_feed_filter():
+    # ❓ Ask user if values >2 should be excluded
+    root = Tk()
+    root.withdraw()
+    exclude = messagebox.askyesno(
+        "Feed_diff Filtering",
+        "Do you want to exclude Feed_diff values greater than 2 ?"
+    )
+    root.destroy()
+    print("⛔ Excluding Feed_diff values > 2" if exclude else "✔ Keeping all Feed_diff values (no filtering)")
+    return exclude
+
+
+quality_file = os.path.join(output_dir, f"{base_name}_quality.xlsx")
+
+if not out_of_core():
+    # --------------------------
+    # 📊 Reading the Excel file
+    checkpoint("read_excel")
+    df = read_export(file_path, sheet_name='PS 2025 02')
+    report_columns([str(c).strip() for c in df.columns])
+
+    checkpoint("datetime_parse")
+    df = clean(df)
+    animals = sorted(df["Animal"].unique())
+
+    # 🩺 Data quality check (gaps, duplicates, out-of-order rows, NaT, NaN runs)
+    checkpoint("quality_check")
+    report_quality(df, quality_file)
+
+    checkpoint("dialogs")
+    exclude_feed_outliers = ask_feed_filter()
+
+    checkpoint("hourly_aggregation")
+    hourly = hourly_values(df)
+    del df
 else:
-    print("✔ Keeping all Feed_diff values (no filtering)")
+    # --------------------------
+    # 🗂️ Out-of-core: the sheet is streamed into one partition per animal, then processed animal by animal
+    checkpoint("partition")
+    with partitioned(file_path, clean, sheet_name='PS 2025 02') as parts:
+        report_columns(parts.columns)
+        print(f"🗂️ {parts.rows} rows partitioned by animal ({len(parts.animals)} animals)")
+        animals = parts.animals
 
-# --------------------------
-# Normalizing XT_YT
-df["XT_YT"] = df["XT_YT"] / 8000
+        checkpoint("quality_check")
+        # One partition = one animal: each detects its own sampling interval
+        report_quality(None, quality_file, parts=list(map_partitions(parts, quality_index)))
+
+        checkpoint("dialogs")
+        exclude_feed_outliers = ask_feed_filter()
 
-# Day / Hour
-df["Day"] = df["DateTime"].dt.date
-df["Hour"] = df["DateTime"].dt.hour
+        checkpoint("hourly_aggregation")
+        hourly = pd.concat(map_partitions(parts, hourly_values), ignore_index=True)
 
 # --------------------------
 # Hourly averages per animal
-rer_pivot = df.pivot_table(index=["Day", "Hour"], columns="Animal", values="RER", aggfunc="mean")
-xtyt_pivot = df.pivot_table(index=["Day", "Hour"], columns="Animal", values="XT_YT", aggfunc="sum")
-feed_pivot = df.pivot_table(index=["Day", "Hour"], columns="Animal", values="Feed_diff", aggfunc="sum")
-ee_pivot = df.pivot_table(index=["Day", "Hour"], columns="Animal", values="EE", aggfunc="mean")
+checkpoint("pivot")
+rer_pivot = hourly.pivot_table(index=["Day", "Hour"], columns="Animal", values="RER", aggfunc="mean")
+xtyt_pivot = hourly.pivot_table(index=["Day", "Hour"], columns="Animal", values="XT_YT", aggfunc="sum")
+feed_pivot = hourly.pivot_table(index=["Day", "Hour"], columns="Animal", values="Feed_diff", aggfunc="sum")
+ee_pivot = hourly.pivot_table(index=["Day", "Hour"], columns="Animal", values="EE", aggfunc="mean")
 
 rer_pivot.columns = [f"RER_Animal{c}" for c in rer_pivot.columns]
 xtyt_pivot.columns = [f"XT_YT_Animal{c}" for c in xtyt_pivot.columns]
@@ -116,12 +173,14 @@ df_pivot["DateTime"] = pd.to_datetime(df_pivot["Day"].astype(str)) + pd.to_timed
 
 # --------------------------
 # Export to Excel
+checkpoint("export")
 output_file = os.path.join(output_dir, f"{base_name}_Hourly_Averages_per_Animal.xlsx")
-df_pivot.to_excel(output_file, index=False)
+write_table(df_pivot, output_file)
 print("✅ File exported:", output_file)
 
 # --------------------------
 # 🌙 Day/Night Cycle
+checkpoint("dialogs")
 def add_night_zones(ax, days):
     for day in days:
         night_start = pd.to_datetime(str(day) + " 19:00")
@@ -136,7 +195,7 @@ def add_night_zones(ax, days):
 def add_alternation_cycle(ax, day, start_hour=7):
     start = pd.to_datetime(str(day) + f" {start_hour}:00")
     end = start + pd.Timedelta(hours=24)
-    hours = pd.date_range(start=start, end=end, freq="1H")
+    hours = pd.date_range(start=start, end=end, freq="1h")
     for i in range(len(hours)-1):
         if i % 2 == 1:
             ax.axvspan(hours[i], hours[i+1], color='gray', alpha=0.3)
@@ -154,9 +213,19 @@ darkness_day = simpledialog.askstring("Darkness Day", "🌑 Date with full darkn
 root.destroy()
 print(f"🌗 Alternation: {alternation_day} | 🌑 Darkness: {darkness_day}")
 
+# --------------------------
+# 🗃️ Cross-experiment catalog (hourly values, TSE_CATALOG): LD12:12 except the alternation / darkness days
+checkpoint("catalog")
+day_cycles = {day: "1" if alternation_day and str(day) == alternation_day
+              else "2" if darkness_day and str(day) == darkness_day else "3"
+              for day in df_pivot["Day"].unique()}
+register(base_name, "TSE_All_Graph_mean", hourly=hourly.assign(DateTime=pd.to_datetime(
+    hourly["Day"].astype(str)) + pd.to_timedelta(hourly["Hour"], unit="h")), source=file_path,
+    cycle=day_cycles, path=catalog_path(output_root))
+
 # --------------------------
 # Individual Graphs
-animals = df["Animal"].unique()
+checkpoint("plot_individual")
 for animal in animals:
     fig, ax1 = plt.subplots(figsize=(14, 6))
 
@@ -197,6 +266,7 @@ print("✅ Individual graphs generated successfully")
 
 # --------------------------
 # Global Graphs
+checkpoint("plot_global")
 def generate_global_graph(df_pivot, animals, metric_prefix, title, ylabel, filename):
     fig, ax = plt.subplots(figsize=(14, 6))
 
@@ -235,5 +305,7 @@ if ee_cols:
     generate_global_graph(df_pivot, animals, "EE", "Average Energy Expenditure - All animals", "EE [kcal/h]", "Graph_Global_EE.png")
 
 print("✅ Global graphs for RER, XT+YT, Feed, and EE generated successfully")
+checkpoint("background_io")
+drain()
 print(f"\n📦 All files are in: {output_dir}")
 
@@ -7,12 +7,31 @@ Created by Pablo SAIDI
 
 import os
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from tkinter import Tk, filedialog, simpledialog, messagebox
+from tse_calo.dialogs import Tk, filedialog, simpledialog, messagebox
+from tse_calo.export import write_table
+from tse_calo.quality import report_quality
+from tse_calo.schema import compact, drop_unused, use_copy_on_write
+from tse_calo.engine import prepare, aggregate, assign_days
+from tse_calo.catalog import register, catalog_path
+from tse_calo.cosinor import fit_cosinor, plot_cosinor_overlay
+from tse_calo.groups import find_sidecar, read_groups, group_summary, plot_group_curves
+from tse_calo.facets import plot_facets, plot_multi_facets
+from tse_calo.light import dark_spans, day_cycles, find_schedule, read_schedule
+from tse_calo.pipeline import prefetch, drain
+from tse_calo.sampling import describe_intervals, detect_intervals, rate_samples, weight_rates, window_shift
+from tse_calo.profiling import checkpoint
+from tse_calo.lazy import lazy_import
+from tse_calo.partitions import warn_in_memory
+
+use_copy_on_write()  # pandas 2: copy-on-write for this run (the default from pandas 3)
+
+plt = lazy_import("matplotlib.pyplot")
+mdates = lazy_import("matplotlib.dates")
 
 # --------------------------
 # 📂 Select Excel file
+warn_in_memory("TSE_One_Day_mean.py")
+checkpoint("dialogs")
 Tk().withdraw()
 file_path = filedialog.askopenfilename(
     title="Select your merged Excel file",
@@ -23,28 +42,35 @@ if not file_path:
     raise FileNotFoundError("❌ No file selected. Please restart the script and choose an Excel file.")
 
 print(f"✅ Selected file: {file_path}")
+workbook = prefetch(pd.read_excel, file_path, sheet_name='PS 2025 01 arvis M')  # parsed while the next dialogs are answered
 
 # --------------------------
-# 🗓️ Choose start day (7 AM → 7 AM next day)
+# 🗓️ Choose start day (7 AM → 7 AM next day), or every day of the recording
 start_day_str = simpledialog.askstring(
     "Select Day",
     "Enter the START date of the period (YYYY-MM-DD)\n"
-    "Example: 2025-10-15 to analyze from Oct 15th 7 AM to Oct 16th 7 AM"
+    "Example: 2025-10-15 to analyze from Oct 15th 7 AM to Oct 16th 7 AM\n"
+    "Enter all to analyze every day of the recording (one output folder per day)"
 )
-start_day = pd.to_datetime(start_day_str).date()
+sweep = str(start_day_str).strip().lower() == "all"
 
-start_period = pd.to_datetime(str(start_day)) + pd.Timedelta(hours=7)
-end_period = start_period + pd.Timedelta(hours=24)
-print(f"📅 Analysis period: {start_period} → {end_period}")
+if sweep:
+    print("📅 Analysis period: every 7 AM → 7 AM day of the recording")
+else:
+    start_day = pd.to_datetime(start_day_str).date()
+
+    start_period = pd.to_datetime(str(start_day)) + pd.Timedelta(hours=7)
+    end_period = start_period + pd.Timedelta(hours=24)
+    print(f"📅 Analysis period: {start_period} → {end_period}")
 
 # --------------------------
 # 🕒 Choose how to align raw sampling windows
 shift_choice = simpledialog.askstring(
    "Timestamp Position",
-    "Sampling window is 15 min.\n"
+    "Sampling window is detected from the data, per animal.\n"
     "Choose how to position each data point:\n\n"
-    "1 = beginning of window (ex: 08:00 → 07:45)\n"
-    "2 = center of window, recommended (ex: 08:00 → 07:52:30)\n"
+    "1 = beginning of window (ex at 15 min: 08:00 → 07:45)\n"
+    "2 = center of window, recommended (ex at 15 min: 08:00 → 07:52:30)\n"
     "3 = end of window (no correction)\n\n"
     "Enter 1, 2, or 3:"
 )
@@ -52,15 +78,12 @@ shift_choice = simpledialog.askstring(
 if shift_choice not in ["1", "2", "3"]:
     raise ValueError("❌ Invalid choice. Restart the script and enter 1, 2 or 3.")
 
-# Mapping: we subtract offset (because input timestamps are at window end)
+# Mapping: we subtract a share of the sampling interval (because input timestamps are at window end)
 if shift_choice == "1":
-    offset_minutes = 15.0
-    print("⏱️ Alignment: BEGINNING of window (timestamps shifted -15 minutes).")
+    print("⏱️ Alignment: BEGINNING of window (timestamps shifted by one sampling interval).")
 elif shift_choice == "2":
-    offset_minutes = 7.5
-    print("⏱️ Alignment: CENTER of window (timestamps shifted -7.5 minutes).")
+    print("⏱️ Alignment: CENTER of window (timestamps shifted by half a sampling interval).")
 else:
-    offset_minutes = 0.0
     print("⏱️ Alignment: END of window (no timestamp shift).")
 
 # --------------------------
@@ -71,23 +94,35 @@ light_cycle = simpledialog.askstring(
     "1 = LD1:1 --> Alternating 1h light / 1h dark\n"
     "2 = DD --> 24h dark\n"
     "3 = LD 12:12 --> 12h light / 12h dark\n"
-    "(Enter 1, 2 or 3)"
+    "(Enter 1, 2 or 3)\n"
+    "All days: one code per day separated by commas (e.g. 3,3,2,1),\n"
+    "or leave empty to use <file>_schedule.csv"
 )
 
-if light_cycle not in ["1", "2", "3"]:
+if sweep:
+    # Cycle of each day: <file>_schedule.csv / .xlsx (Day, Cycle), else the codes entered
+    schedule_file = find_schedule(file_path)
+    schedule = read_schedule(schedule_file) if schedule_file else None
+    if schedule_file:
+        print(f"📅 Light cycle schedule loaded from {schedule_file}")
+elif light_cycle not in ["1", "2", "3"]:
     raise ValueError("❌ Invalid choice. Restart the script and enter 1, 2, or 3.")
 
 # --------------------------
 # 📁 Output folder
 output_root = r"D:\pablo.SAIDI\Desktop\Sortie programme calo"
 base_name = os.path.splitext(os.path.basename(file_path))[0]
-output_dir = os.path.join(output_root, f"{base_name}_{start_day}_LD11_7h_7h")
+# Sweep: one <file>_<day>_LD11_7h_7h folder per day, created with the outputs of the day
+output_dir = output_root if sweep else os.path.join(output_root, f"{base_name}_{start_day}_LD11_7h_7h")
+period_label = "all_days" if sweep else start_day
 os.makedirs(output_dir, exist_ok=True)
 print(f"📁 Output folder: {output_dir}")
 
 # --------------------------
 # 📊 Read Excel file
-df = pd.read_excel(file_path, sheet_name='PS 2025 01 arvis M')
+checkpoint("read_excel")
+df = workbook.result()
+del workbook  # the task would keep the raw frame alive until the end of the run
 df.columns = df.columns.str.strip()
 
 df = df.rename(columns={
@@ -98,9 +133,12 @@ df = df.rename(columns={
     "Unnamed: 14": "XT_YT",
     "Unnamed: 15": "Feed"
 })
+# Raw export columns dropped before the first row filter copies them (column Q: EE)
+df = drop_unused(df, keep=("Unnamed: 16",))
 
 # --------------------------
 # 🧹 Data cleaning
+checkpoint("datetime_parse")
 df = df[pd.to_numeric(df["Animal"], errors="coerce").notna()]
 df["Animal"] = df["Animal"].astype(int)
 df["DateTime"] = pd.to_datetime(
@@ -116,14 +154,22 @@ for col in ["RER", "XT_YT", "Feed"]:
 if "Unnamed: 16" in df.columns:
     df["EE"] = pd.to_numeric(df["Unnamed: 16"], errors="coerce")
 
-df = df.sort_values(["Animal", "DateTime"]).copy()
+# Compact schema: Date/Time text and raw export columns dropped, float32 metrics
+df = compact(df)
 
-# Compute Feed differences
-df["Feed_diff"] = df.groupby("Animal")["Feed"].diff()
-df.loc[df["Feed_diff"] < 0, "Feed_diff"] = 0
+# Sampling interval of each animal → timestamp correction in minutes (15 min → 15 / 7.5 / 0)
+intervals = detect_intervals(df)
+offset_minutes = window_shift(intervals, shift_choice) / pd.Timedelta(minutes=1)
+print(f"⏱️ Sampling interval: {describe_intervals(intervals)}")
+
+# --------------------------
+# 🩺 Data quality check (gaps, duplicates, out-of-order rows, NaT, NaN runs)
+checkpoint("quality_check")
+report_quality(df, os.path.join(output_dir, f"{base_name}_{period_label}_quality.xlsx"))
 
 # --------------------------
 # 🧪 Option to exclude Feed_diff > 2 g
+checkpoint("dialogs")
 root = Tk()
 root.withdraw()
 exclude_feed = messagebox.askyesno(
@@ -134,54 +180,71 @@ root.destroy()
 
 if exclude_feed:
     print("⛔ Excluding Feed_diff values > 2 g")
-    df["Feed_diff"] = df["Feed_diff"].where(df["Feed_diff"] <= 2, None)
 else:
     print("✔ Keeping all Feed_diff values (no filtering)")
 
 # --------------------------
-# Normalize XT+YT
-df["XT_YT"] = df["XT_YT"] / 8000
-
-# --------------------------
-# ⏱️ SHIFT RAW TIMESTAMPS
-df["DateTime_shifted"] = df["DateTime"] - pd.to_timedelta(offset_minutes, unit="m")
-df = df.sort_values(["Animal", "DateTime_shifted"]).copy()
-
-# --------------------------
-# 🧮 Select period 7 AM → 7 AM next day using shifted timestamps
-df_day = df[(df["DateTime_shifted"] >= start_period) & (df["DateTime_shifted"] < end_period)].copy()
-df_day["Relative_Hour"] = ((df_day["DateTime_shifted"] - start_period).dt.total_seconds() // 3600).astype(int)
+# 〰️ Option to overlay cosinor fits on the graphs
+root = Tk()
+root.withdraw()
+overlay_cosinor = messagebox.askyesno(
+    "Cosinor overlay",
+    "Do you want to overlay the 24 h cosinor fit on the individual metric graphs?"
+)
+root.destroy()
 
 # --------------------------
-# 📘 Export shifted raw data
-output_file_shifted = os.path.join(output_dir, f"{base_name}_{start_day}_shifted_raw.xlsx")
-df_day.to_excel(output_file_shifted, index=False)
-print(f"✅ Shifted raw data exported: {output_file_shifted}")
+# 👥 Group metadata (optional sidecar <file>_groups.csv / .xlsx)
+groups_file = find_sidecar(file_path)
+if groups_file:
+    groups = read_groups(groups_file)
+    print(f"👥 Groups loaded from {groups_file}: {', '.join(sorted(groups['Group'].unique()))}")
+    group_error = simpledialog.askstring(
+        "Group error band",
+        "Error band for the group curves:\n"
+        "1 = SEM\n"
+        "2 = SD\n"
+        "(Enter 1 or 2)"
+    )
+    if group_error not in ["1", "2"]:
+        raise ValueError("❌ Invalid choice. Restart the script and enter 1 or 2.")
+    group_error = "SEM" if group_error == "1" else "SD"
+else:
+    groups = None
+    print("ℹ️ No group file (<file>_groups.csv / .xlsx) found: group curves skipped.")
 
 # --------------------------
-# 📊 Hourly averages / sums
-rer_pivot = df_day.pivot_table(index="Relative_Hour", columns="Animal", values="RER", aggfunc="mean")
-xtyt_pivot = df_day.pivot_table(index="Relative_Hour", columns="Animal", values="XT_YT", aggfunc="sum")
-feed_pivot = df_day.pivot_table(index="Relative_Hour", columns="Animal", values="Feed_diff", aggfunc="sum")
-
-rer_pivot.columns = [f"RER_Animal{col}" for col in rer_pivot.columns]
-xtyt_pivot.columns = [f"XT_YT_Animal{col}" for col in xtyt_pivot.columns]
-feed_pivot.columns = [f"Feed_Animal{col}" for col in feed_pivot.columns]
-
-if "EE" in df_day.columns:
-    ee_pivot = df_day.pivot_table(index="Relative_Hour", columns="Animal", values="EE", aggfunc="sum")
-    ee_pivot.columns = [f"EE_Animal{col}" for col in ee_pivot.columns]
-    df_pivot = pd.concat([rer_pivot, xtyt_pivot, feed_pivot, ee_pivot], axis=1).reset_index()
+# 🧮 Feed differences (clipped at 0, > 2 g excluded on request), XT+YT / 8000,
+# shifted timestamps and 7 AM → 7 AM day of every row (pandas, or Polars with TSE_BACKEND=polars)
+checkpoint("shift_window")
+rows = assign_days(prepare(df, exclude_feed=exclude_feed, offset_minutes=offset_minutes))
+
+if sweep:
+    days = [day.date() for day in sorted(rows["Day"].unique())]
+    if not days:
+        raise ValueError("❌ No timestamped rows in the file: nothing to analyze.")
+    cycles = day_cycles(days, light_cycle, schedule)
+    print(f"📅 {len(days)} days: {days[0]} → {days[-1]} "
+          f"(cycles {', '.join(cycles[day] for day in days)})")
 else:
-    df_pivot = pd.concat([rer_pivot, xtyt_pivot, feed_pivot], axis=1).reset_index()
-
-df_pivot["DateTime"] = start_period + pd.to_timedelta(df_pivot["Relative_Hour"], unit='h') + pd.to_timedelta(0.5, unit='h')
+    rows = rows[rows["Day"] == pd.Timestamp(start_day)]
+    cycles = {start_day: light_cycle}
 
 # --------------------------
-# 💾 Export hourly pivot
-output_file = os.path.join(output_dir, f"{base_name}_{start_day}_LD11_7h_7h.xlsx")
-df_pivot.to_excel(output_file, index=False)
-print(f"✅ Hourly pivot exported: {output_file}")
+# 📊 Hourly values of every day in one grouped pass (Day × Relative_Hour × Animal),
+# EE summed as 15-min samples whatever the sampling interval, with the samples behind each sum
+checkpoint("aggregate")
+hourly_agg = {"RER": "mean", "XT_YT": "sum", "Feed_diff": "sum"}
+samples_agg = {}
+if "EE" in rows.columns:
+    hourly_agg["EE"] = "sum"
+    samples_agg["EE_samples"] = "sum"  # catalog: EE sum / samples = kcal/h
+hourly = aggregate(rate_samples(weight_rates(rows, intervals), intervals), ["Day", "Relative_Hour", "Animal"],
+                   {**hourly_agg, **samples_agg})
+
+rows_of_day = dict(iter(rows.drop(columns="Day").groupby(rows["Day"], sort=True)))
+hourly_of_day = dict(iter(hourly.drop(columns="Day").groupby(hourly["Day"], sort=True)))
+del rows, hourly
 
 # --------------------------
 # ☀️🌙 Light cycle visualization
@@ -198,117 +261,172 @@ def add_light_cycle(ax, day, cycle_type):
         ax.axvspan(night_start, night_end, color='gray', alpha=0.3)
 
 # --------------------------
-# 📈 Multi-axis individual graphs
-animals = df_day["Animal"].unique()
-for animal in animals:
-    fig, ax1 = plt.subplots(figsize=(14, 6))
-    add_light_cycle(ax1, start_day, light_cycle)
-
-    if f"RER_Animal{animal}" in df_pivot.columns:
-        ax1.plot(df_pivot["DateTime"], df_pivot[f"RER_Animal{animal}"],
-                 color='blue', marker='o', linestyle='-', linewidth=1.5, markersize=5, label="RER")
-    ax1.set_xlabel("Hour")
-    ax1.set_ylabel("RER", color='blue')
-    ax1.tick_params(axis='y', labelcolor='blue')
-    ax1.xaxis.set_major_locator(mdates.HourLocator(interval=2))
-    ax1.xaxis.set_major_formatter(mdates.DateFormatter('%Hh'))
-
-    ax2 = ax1.twinx()
-    if f"XT_YT_Animal{animal}" in df_pivot.columns:
-        ax2.plot(df_pivot["DateTime"], df_pivot[f"XT_YT_Animal{animal}"],
-                 color='red', marker='s', linestyle='-', linewidth=1.5, markersize=5, alpha=0.7, label="XT+YT / 8000")
-    ax2.set_ylabel("XT+YT / 8000", color='red')
-    ax2.tick_params(axis='y', labelcolor='red')
-
-    ax3 = ax1.twinx()
-    if f"Feed_Animal{animal}" in df_pivot.columns:
-        ax3.plot(df_pivot["DateTime"], df_pivot[f"Feed_Animal{animal}"],
-                 color='green', marker='D', linestyle='-', linewidth=2, markersize=4, label="Feed (g/h)")
-    ax3.set_ylabel("Feed (g/h)", color='green')
-    ax3.tick_params(axis='y', labelcolor='green')
-    ax3.spines['right'].set_position(('outward', 60))
-
-    ax4 = ax1.twinx()
-    if f"EE_Animal{animal}" in df_pivot.columns:
-        ax4.plot(df_pivot["DateTime"], df_pivot[f"EE_Animal{animal}"],
-                 color='#800080', marker='^', linestyle='-', linewidth=2, markersize=4, label="EE (kcal/h)")
-    ax4.set_ylabel("EE (kcal/h)", color='#800080')
-    ax4.tick_params(axis='y', labelcolor='#800080')
-    ax4.spines['right'].set_position(('outward', 120))
-
-    ax1.set_title(f"Animal {animal} - {start_day} (Cycle {light_cycle})")
-    fig.legend(loc="upper left", bbox_to_anchor=(0.1, 0.9))
-    ax1.grid(True, axis='y', linestyle='--', alpha=0.7)
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_dir, f"Graph_Animal{animal}_{start_day}_Cycle{light_cycle}.png"))
-    plt.close()
-
-print("✅ Multi-axis graphs successfully generated")
-
-# --------------------------
-# 📈 Individual metric graphs
-for animal in animals:
+# 📅 Outputs of one day
+def analyze_day(start_day, light_cycle, df_day, df_hour):
+    """Tables, cosinor fits, catalog rows and figures of one 7 AM → 7 AM day, in <file>_<day>_LD11_7h_7h."""
+    start_period = pd.to_datetime(str(start_day)) + pd.Timedelta(hours=7)
+    output_dir = os.path.join(output_root, f"{base_name}_{start_day}_LD11_7h_7h")
+    os.makedirs(output_dir, exist_ok=True)
+    if sweep:
+        print(f"\n📅 {start_day} (Cycle {light_cycle}) → {output_dir}")
+
+    # --------------------------
+    # 📘 Export shifted raw data
+    checkpoint("export_raw")
+    output_file_shifted = os.path.join(output_dir, f"{base_name}_{start_day}_shifted_raw.xlsx")
+    write_table(df_day, output_file_shifted)
+    print(f"✅ Shifted raw data exported: {output_file_shifted}")
+
+    # --------------------------
+    # 📊 Hourly averages / sums: Relative_Hour × Animal, one column per metric × animal,
+    # read from the hourly values of the day (aggregated once for every day above)
+    checkpoint("pivot")
+    labels = {"RER": "RER", "XT_YT": "XT_YT", "Feed_diff": "Feed", "EE": "EE"}
+    wide = df_hour.set_index(["Relative_Hour", "Animal"])[list(hourly_agg)].unstack("Animal")
+    df_pivot = pd.concat([wide[metric].rename(columns=lambda a, label=label: f"{label}_Animal{a}")
+                          for metric, label in labels.items() if metric in hourly_agg], axis=1)
+    df_pivot = df_pivot.rename_axis(columns=None).reset_index()
+
+    df_pivot["DateTime"] = start_period + pd.to_timedelta(df_pivot["Relative_Hour"], unit='h') + pd.to_timedelta(0.5, unit='h')
+
+    # --------------------------
+    # 💾 Export hourly pivot
+    checkpoint("export_pivot")
+    output_file = os.path.join(output_dir, f"{base_name}_{start_day}_LD11_7h_7h.xlsx")
+    write_table(df_pivot, output_file)
+    print(f"✅ Hourly pivot exported: {output_file}")
+
+    # --------------------------
+    # 〰️ Cosinor fits (mesor / amplitude / acrophase) on the hourly values
+    checkpoint("cosinor")
+    df_hour["DateTime"] = start_period + pd.to_timedelta(df_hour["Relative_Hour"], unit='h') + pd.to_timedelta(0.5, unit='h')
+
+    cosinor_fits = fit_cosinor(df_hour, metrics=list(hourly_agg))
+    output_file_cosinor = os.path.join(output_dir, f"{base_name}_{start_day}_cosinor.xlsx")
+    write_table(cosinor_fits, output_file_cosinor)
+    print(f"✅ Cosinor fits exported: {output_file_cosinor}")
+
+    # --------------------------
+    # 🗃️ Cross-experiment catalog (samples + hourly values, TSE_CATALOG)
+    checkpoint("catalog")
+    register(base_name, "TSE_One_Day_mean", samples=df_day, hourly=df_hour, how=hourly_agg, start_day=start_day, source=file_path,
+             groups=groups, cycle=light_cycle, path=catalog_path(output_root))
+
+    # --------------------------
+    # 📈 Multi-axis graphs: one faceted figure with every animal (one panel each, one axis per metric)
+    checkpoint("plot_individual")
+    animals = df_day["Animal"].unique()
+    day_spans = dark_spans(start_period, light_cycle)
+    panels = {animal: (df_pivot["DateTime"], {label: df_pivot[f"{label}_Animal{animal}"] for label in labels.values()
+                                              if f"{label}_Animal{animal}" in df_pivot.columns})
+              for animal in animals}
+    plot_multi_facets(panels, os.path.join(output_dir, f"Graph_Facets_MultiAxis_{start_day}_Cycle{light_cycle}.png"),
+                      f"{start_day} (Cycle {light_cycle})",
+                      [("RER", "blue", "RER", "o"), ("XT_YT", "red", "XT+YT / 8000", "s"),
+                       ("Feed", "green", "Feed (g/h)", "D"), ("EE", "#800080", "EE (kcal/h)", "^")],
+                      spans=day_spans)
+
+    print("✅ Multi-axis graphs successfully generated")
+
+    # --------------------------
+    # 📈 Individual metric graphs: one faceted figure per metric (one panel per animal, shared axes)
+    checkpoint("plot_metrics")
     for metric, color, ylabel, marker in [
         ("RER", "blue", "RER", "o"),
         ("XT_YT", "red", "XT+YT / 8000", "s"),
         ("Feed", "green", "Feed (g/h)", "D"),
         ("EE", "#800080", "EE (kcal/h)", "^")
     ]:
-        col_name = f"{metric}_Animal{animal}"
-        if col_name in df_pivot.columns:
+        panels = {animal: (df_pivot["DateTime"], df_pivot[f"{metric}_Animal{animal}"])
+                  for animal in animals if f"{metric}_Animal{animal}" in df_pivot.columns}
+        overlay = None
+        if overlay_cosinor:
+            fit_metric = "Feed_diff" if metric == "Feed" else metric
+            fits = cosinor_fits[cosinor_fits["Metric"] == fit_metric]
+            overlay = lambda ax, animal, fits=fits: plot_cosinor_overlay(ax, fits[fits["Animal"] == animal])
+        plot_facets(panels, os.path.join(output_dir, f"Graph_Facets_{metric}_{start_day}_Cycle{light_cycle}.png"),
+                    f"{metric} - {start_day} (Cycle {light_cycle})", ylabel,
+                    spans=day_spans, color=color, marker=marker, overlay=overlay)
+
+    print("✅ Individual metric graphs successfully generated")
+
+    # --------------------------
+    # 📊 Global graphs
+    checkpoint("plot_global")
+    def generate_global_graph(df_pivot, animals, metric_prefix, title, ylabel, filename, color='blue', marker='o'):
+        fig, ax = plt.subplots(figsize=(14, 6))
+        add_light_cycle(ax, start_day, light_cycle)
+
+        for animal in animals:
+            col = f"{metric_prefix}_Animal{animal}"
+            if col in df_pivot.columns:
+                ax.plot(df_pivot["DateTime"], df_pivot[col],
+                        color=color, marker=marker, linestyle='-', linewidth=1.5, markersize=5, label=f"Animal {animal}")
+
+        ax.set_title(f"{title} - {start_day} (Cycle {light_cycle})")
+        ax.set_xlabel("Hour")
+        ax.set_ylabel(ylabel)
+        ax.xaxis.set_major_locator(mdates.HourLocator(interval=2))
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%Hh'))
+        ax.legend()
+        ax.grid(True, linestyle='--', alpha=0.7)
+        plt.xticks(rotation=45)
+        plt.tight_layout()
+        plt.savefig(os.path.join(output_dir, filename))
+        plt.close()
+
+    # 🔹 Generate global graphs
+    generate_global_graph(df_pivot, animals, "RER", "Average RER per hour - All animals",
+                          "RER (hourly average)", f"Graph_Global_RER_All_Animals_{start_day}_Cycle{light_cycle}.png", color='blue')
+    generate_global_graph(df_pivot, animals, "XT_YT", "Average XT+YT/8000 per hour - All animals",
+                          "XT+YT / 8000", f"Graph_Global_XT_YT_All_Animals_{start_day}_Cycle{light_cycle}.png", color='red')
+    generate_global_graph(df_pivot, animals, "Feed", "Hourly Feed - All animals",
+                          "Hourly Feed", f"Graph_Global_Feed_All_Animals_{start_day}_Cycle{light_cycle}.png", color='green')
+    generate_global_graph(df_pivot, animals, "EE", "Hourly EE - All animals",
+                          "Hourly EE", f"Graph_Global_EE_All_Animals_{start_day}_Cycle{light_cycle}.png", color='#800080', marker='^')
+
+    print("✅ All graphs successfully generated")
+
+    # --------------------------
+    # 👥 Group graphs: mean ± SEM/SD per hour
+    checkpoint("groups")
+    if groups is not None:
+        group_stats = group_summary(df_hour, groups, list(hourly_agg))
+        output_file_groups = os.path.join(output_dir, f"{base_name}_{start_day}_group_summary.xlsx")
+        write_table(group_stats, output_file_groups)
+        print(f"✅ Group summary exported: {output_file_groups}")
+
+        for metric, ylabel in [("RER", "RER (hourly average)"), ("XT_YT", "XT+YT / 8000"),
+                               ("Feed_diff", "Hourly Feed"), ("EE", "Hourly EE")]:
+            if metric not in hourly_agg:
+                continue
             fig, ax = plt.subplots(figsize=(14, 6))
             add_light_cycle(ax, start_day, light_cycle)
-            ax.plot(df_pivot["DateTime"], df_pivot[col_name],
-                    color=color, marker=marker, linestyle='-', linewidth=1.5, markersize=5)
-            ax.set_title(f"Animal {animal} - {metric} - {start_day} (Cycle {light_cycle})")
+            plot_group_curves(ax, group_stats, metric, error=group_error)
+            ax.set_title(f"{metric} - Group mean ± {group_error} - {start_day} (Cycle {light_cycle})")
             ax.set_xlabel("Hour")
-            ax.set_ylabel(ylabel, color=color)
-            ax.tick_params(axis='y', labelcolor=color)
+            ax.set_ylabel(ylabel)
             ax.xaxis.set_major_locator(mdates.HourLocator(interval=2))
             ax.xaxis.set_major_formatter(mdates.DateFormatter('%Hh'))
+            ax.legend(title="Group")
             ax.grid(True, linestyle='--', alpha=0.7)
             plt.xticks(rotation=45)
             plt.tight_layout()
-            plt.savefig(os.path.join(output_dir, f"Graph_Animal{animal}_{metric}_{start_day}_Cycle{light_cycle}.png"))
+            plt.savefig(os.path.join(output_dir, f"Graph_Groups_{metric}_{start_day}_Cycle{light_cycle}.png"))
             plt.close()
 
-print("✅ Individual metric graphs successfully generated")
+        print("✅ Group graphs successfully generated")
 
-# --------------------------
-# 📊 Global graphs
-def generate_global_graph(df_pivot, animals, metric_prefix, title, ylabel, filename, color='blue', marker='o'):
-    fig, ax = plt.subplots(figsize=(14, 6))
-    add_light_cycle(ax, start_day, light_cycle)
-
-    for animal in animals:
-        col = f"{metric_prefix}_Animal{animal}"
-        if col in df_pivot.columns:
-            ax.plot(df_pivot["DateTime"], df_pivot[col],
-                    color=color, marker=marker, linestyle='-', linewidth=1.5, markersize=5, label=f"Animal {animal}")
-
-    ax.set_title(f"{title} - {start_day} (Cycle {light_cycle})")
-    ax.set_xlabel("Hour")
-    ax.set_ylabel(ylabel)
-    ax.xaxis.set_major_locator(mdates.HourLocator(interval=2))
-    ax.xaxis.set_major_formatter(mdates.DateFormatter('%Hh'))
-    ax.legend()
-    ax.grid(True, linestyle='--', alpha=0.7)
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_dir, filename))
-    plt.close()
-
-# 🔹 Generate global graphs
-generate_global_graph(df_pivot, animals, "RER", "Average RER per hour - All animals",
-                      "RER (hourly average)", f"Graph_Global_RER_All_Animals_{start_day}_Cycle{light_cycle}.png", color='blue')
-generate_global_graph(df_pivot, animals, "XT_YT", "Average XT+YT/8000 per hour - All animals",
-                      "XT+YT / 8000", f"Graph_Global_XT_YT_All_Animals_{start_day}_Cycle{light_cycle}.png", color='red')
-generate_global_graph(df_pivot, animals, "Feed", "Hourly Feed - All animals",
-                      "Hourly Feed", f"Graph_Global_Feed_All_Animals_{start_day}_Cycle{light_cycle}.png", color='green')
-generate_global_graph(df_pivot, animals, "EE", "Hourly EE - All animals",
-                      "Hourly EE", f"Graph_Global_EE_All_Animals_{start_day}_Cycle{light_cycle}.png", color='#800080', marker='^')
-
-print("✅ All graphs successfully generated")
+
+for day, cycle in cycles.items():
+    key = pd.Timestamp(day)
+    df_day = rows_of_day.pop(key, None)
+    if df_day is None:
+        print(f"⚠️ No data for {day}")
+        continue
+    analyze_day(day, cycle, df_day, hourly_of_day.pop(key).reset_index(drop=True))
+
+checkpoint("background_io")
+drain()
 print(f"\n📦 All output files are located in: {output_dir}")
 
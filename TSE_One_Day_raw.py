@@ -1,17 +1,36 @@
 # -*- coding: utf-8 -*-
 """
-Complete Script: Calorimetry Analysis LD11 (with timestamp correction option + 15-min resampling)
+Complete Script: Calorimetry Analysis LD11 (with timestamp correction option + resampling at the sampling interval)
 Created by Pablo SAIDI
 """
 
 import os
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from tkinter import Tk, filedialog, simpledialog, messagebox
+from tse_calo.dialogs import Tk, filedialog, simpledialog, messagebox
+from tse_calo.export import write_table, write_tables
+from tse_calo.quality import report_quality
+from tse_calo.schema import compact, drop_unused, use_copy_on_write
+from tse_calo.facets import plot_facets, plot_multi_facets
+from tse_calo.index import AnimalIndex
+from tse_calo.light import dark_spans, day_cycles, find_schedule, read_schedule
+from tse_calo.pipeline import prefetch, drain
+from tse_calo.sampling import describe_intervals, detect_intervals, grid_interval, interval_label, row_shift, window_shift
+from tse_calo.profiling import checkpoint
+from tse_calo.lazy import lazy_import
+from tse_calo.partitions import warn_in_memory
+from tse_calo.engine import warn_pandas_only
+
+use_copy_on_write()  # pandas 2: copy-on-write for this run (the default from pandas 3)
+
+plt = lazy_import("matplotlib.pyplot")
+mdates = lazy_import("matplotlib.dates")
 
 # --------------------------
 # 📂 Select Excel file
+warn_in_memory("TSE_One_Day_raw.py")
+warn_pandas_only("TSE_One_Day_raw.py")
+checkpoint("dialogs")
 Tk().withdraw()
 file_path = filedialog.askopenfilename(
     title="Select your merged Excel file",
@@ -22,28 +41,35 @@ if not file_path:
     raise FileNotFoundError("❌ No file selected. Please restart the script and choose an Excel file.")
 
 print(f"✅ Selected file: {file_path}")
+workbook = prefetch(pd.read_excel, file_path, sheet_name='PS 2025 01 arvis M')  # parsed while the next dialogs are answered
 
 # --------------------------
-# 🗓️ Choose start day (7 AM → 7 AM next day)
+# 🗓️ Choose start day (7 AM → 7 AM next day), or every day of the recording
 start_day_str = simpledialog.askstring(
     "Select Day",
     "Enter the START date of the period (YYYY-MM-DD)\n"
-    "Example: 2025-10-15 to analyze from Oct 15th 7 AM to Oct 16th 7 AM"
+    "Example: 2025-10-15 to analyze from Oct 15th 7 AM to Oct 16th 7 AM\n"
+    "Enter all to analyze every day of the recording (one output folder per day)"
 )
-start_day = pd.to_datetime(start_day_str).date()
+sweep = str(start_day_str).strip().lower() == "all"
 
-start_period = pd.to_datetime(str(start_day)) + pd.Timedelta(hours=7)
-end_period = start_period + pd.Timedelta(hours=24)
-print(f"📅 Analysis period: {start_period} → {end_period}")
+if sweep:
+    print("📅 Analysis period: every 7 AM → 7 AM day of the recording")
+else:
+    start_day = pd.to_datetime(start_day_str).date()
+
+    start_period = pd.to_datetime(str(start_day)) + pd.Timedelta(hours=7)
+    end_period = start_period + pd.Timedelta(hours=24)
+    print(f"📅 Analysis period: {start_period} → {end_period}")
 
 # --------------------------
 # ⏱️ Choose timestamp positioning
 timestamp_mode = simpledialog.askstring(
     "Timestamp Position",
-    "Sampling window is 15 min.\n"
+    "Sampling window is detected from the data, per animal.\n"
     "Choose how to position each data point:\n\n"
-    "1 = beginning of window (ex: 08:00 → 07:45)\n"
-    "2 = center of window, recommended (ex: 08:00 → 07:52:30)\n"
+    "1 = beginning of window (ex at 15 min: 08:00 → 07:45)\n"
+    "2 = center of window, recommended (ex at 15 min: 08:00 → 07:52:30)\n"
     "3 = end of window (no correction)\n\n"
     "Enter 1, 2, or 3:"
 )
@@ -51,15 +77,12 @@ timestamp_mode = simpledialog.askstring(
 if timestamp_mode not in ["1", "2", "3"]:
     raise ValueError("❌ Invalid choice. Restart and enter 1, 2, or 3.")
 
-# Offset
+# Offset: a share of the sampling interval of each animal, applied once the file is read
 if timestamp_mode == "1":
-    timestamp_shift = pd.Timedelta(minutes=15)
-    print("⏱️ Using BEGINNING of window timestamps (−15 min).")
+    print("⏱️ Using BEGINNING of window timestamps (− one sampling interval).")
 elif timestamp_mode == "2":
-    timestamp_shift = pd.Timedelta(minutes=7, seconds=30)
-    print("⏱️ Using CENTER of window timestamps (−7m30s).")
+    print("⏱️ Using CENTER of window timestamps (− half a sampling interval).")
 else:
-    timestamp_shift = pd.Timedelta(seconds=0)
     print("⏱️ Using END of window timestamps (no correction).")
 
 # --------------------------
@@ -70,23 +93,35 @@ light_cycle = simpledialog.askstring(
     "1 = LD1:1 --> Alternating 1h light / 1h dark\n"
     "2 = DD --> 24h dark\n"
     "3 = LD 12:12 --> 12h light (7–19h) / 12h dark (19–7h)\n"
-    "(Enter 1, 2 or 3)"
+    "(Enter 1, 2 or 3)\n"
+    "All days: one code per day separated by commas (e.g. 3,3,2,1),\n"
+    "or leave empty to use <file>_schedule.csv"
 )
 
-if light_cycle not in ["1", "2", "3"]:
+if sweep:
+    # Cycle of each day: <file>_schedule.csv / .xlsx (Day, Cycle), else the codes entered
+    schedule_file = find_schedule(file_path)
+    schedule = read_schedule(schedule_file) if schedule_file else None
+    if schedule_file:
+        print(f"📅 Light cycle schedule loaded from {schedule_file}")
+elif light_cycle not in ["1", "2", "3"]:
     raise ValueError("❌ Invalid choice. Restart the script and enter 1, 2, or 3.")
 
 # --------------------------
 # 📁 Output folder
 output_root = r"D:\pablo.SAIDI\Desktop\Sortie programme calo"
 base_name = os.path.splitext(os.path.basename(file_path))[0]
-output_dir = os.path.join(output_root, f"{base_name}_{start_day}_LD11_7h_7h")
+# Sweep: one <file>_<day>_LD11_7h_7h folder per day, created with the outputs of the day
+output_dir = output_root if sweep else os.path.join(output_root, f"{base_name}_{start_day}_LD11_7h_7h")
+period_label = "all_days" if sweep else start_day
 os.makedirs(output_dir, exist_ok=True)
 print(f"📁 Output folder: {output_dir}")
 
 # --------------------------
 # 📊 Read Excel file
-df = pd.read_excel(file_path, sheet_name='PS 2025 01 arvis M')
+checkpoint("read_excel")
+df = workbook.result()
+del workbook  # the task would keep the raw frame alive until the end of the run
 df.columns = df.columns.str.strip()
 
 df = df.rename(columns={
@@ -97,9 +132,12 @@ df = df.rename(columns={
     "Unnamed: 14": "XT_YT",
     "Unnamed: 15": "Feed"
 })
+# Raw export columns dropped before the first row filter copies them (column Q: EE)
+df = drop_unused(df, keep=("Unnamed: 16",))
 
 # --------------------------
 # 🧹 Cleaning
+checkpoint("datetime_parse")
 df = df[pd.to_numeric(df["Animal"], errors="coerce").notna()]
 df["Animal"] = df["Animal"].astype(int)
 
@@ -109,8 +147,10 @@ df["DateTime"] = pd.to_datetime(
     errors="coerce"
 )
 
-# timestamp correction
-df["DateTime"] = df["DateTime"] - timestamp_shift
+# timestamp correction (15 min → −15 min / −7m30s / none)
+intervals = detect_intervals(df)
+df["DateTime"] = df["DateTime"] - row_shift(df, window_shift(intervals, timestamp_mode))
+print(f"⏱️ Sampling interval: {describe_intervals(intervals)}")
 
 # convert numeric
 for col in ["RER", "XT_YT", "Feed"]:
@@ -120,15 +160,26 @@ for col in ["RER", "XT_YT", "Feed"]:
 if "Unnamed: 16" in df.columns:
     df["EE"] = pd.to_numeric(df["Unnamed: 16"], errors="coerce")
 
-df = df.sort_values(["Animal", "DateTime"]).copy()
+# Compact schema: Date/Time text and raw export columns dropped, float32 metrics
+df = compact(df)
+
+# --------------------------
+# 🩺 Data quality check (gaps, duplicates, out-of-order rows, NaT, NaN runs)
+checkpoint("quality_check")
+report_quality(df, os.path.join(output_dir, f"{base_name}_{period_label}_quality.xlsx"))
+
+# --------------------------
+df = df.sort_values(["Animal", "DateTime"])
 
 # --------------------------
 # 🧮 Feed diff
+checkpoint("feed_diff")
 df["Feed_diff"] = df.groupby("Animal")["Feed"].diff()
 df.loc[df["Feed_diff"] < 0, "Feed_diff"] = 0
 df["XT_YT"] = df["XT_YT"] / 8000
 
 # optional filter
+checkpoint("dialogs")
 root = Tk()
 root.withdraw()
 apply_filter = messagebox.askyesno(
@@ -144,69 +195,21 @@ else:
     print("✅ No Feed_diff filtering applied")
 
 # --------------------------
-# 🔎 Extract 7→7h window
-df_day = df[(df["DateTime"] >= start_period) & (df["DateTime"] < end_period)].copy()
-
-# ============================================================
-# 📌 **15-MIN RESAMPLING PIPELINE**
-# ============================================================
-print("\n⏱️ Starting 15-min resampling pipeline...")
-
-time_grid = pd.date_range(start=start_period, end=end_period, freq="15min", inclusive="left")
-resample_vars = ["RER", "XT_YT", "Feed_diff", "EE"]
-
-df_15min = pd.DataFrame({"DateTime": time_grid})
-animals = df_day["Animal"].unique()
-
-for animal in animals:
-    print(f" → Resampling animal {animal}...")
-
-    df_an = df_day[df_day["Animal"] == animal].set_index("DateTime")
-
-    for var in resample_vars:
-        col_name = f"{var}_A{animal}"
-
-        if var not in df_an.columns:
-            df_15min[col_name] = None
-            continue
-
-        ser = (
-            df_an[var]
-            .reindex(df_an.index.union(time_grid))
-            .sort_index()
-            .interpolate(method="time")
-            .reindex(time_grid)
-        )
-
-        df_15min[col_name] = ser.values
-
-output_15min = os.path.join(output_dir, f"{base_name}_{start_day}_15min_resampled.xlsx")
-df_15min.to_excel(output_15min, index=False)
-
-print(f"✅ 15-min resampled data exported: {output_15min}")
-
-# --------------------------
-# 🧱 Wide-format export
-metrics = ["RER", "XT_YT", "Feed_diff", "EE"]
-wide_data = {}
-
-output_file_combined = os.path.join(output_dir, f"{base_name}_{start_day}_wide_data.xlsx")
-
-with pd.ExcelWriter(output_file_combined, engine="openpyxl") as writer:
-    for metric in metrics:
-        if metric in df_day.columns:
-            df_wide = df_day.pivot(index="DateTime", columns="Animal", values=metric)
-            wide_data[metric] = df_wide
-            df_wide.to_excel(writer, sheet_name=metric)
-            print(f"✅ Wide-format sheet added: {metric}")
-
-print(f"📘 Wide-format data saved in: {output_file_combined}")
-
-# --------------------------
-# Raw corrected data export
-output_file = os.path.join(output_dir, f"{base_name}_{start_day}_LD11_7h_7h_raw.xlsx")
-df_day.to_excel(output_file, index=False)
-print(f"✅ Raw data exported: {output_file}")
+# 🔎 7→7h day of every row, split in one grouped pass (rows keep their Animal / DateTime order)
+checkpoint("split_days")
+day_of_row = (df["DateTime"] - pd.Timedelta(hours=7)).dt.floor("D")
+rows_of_day = dict(iter(df.groupby(day_of_row, sort=True)))
+del df, day_of_row
+
+if sweep:
+    days = [day.date() for day in rows_of_day]
+    if not days:
+        raise ValueError("❌ No timestamped rows in the file: nothing to analyze.")
+    cycles = day_cycles(days, light_cycle, schedule)
+    print(f"📅 {len(days)} days: {days[0]} → {days[-1]} "
+          f"(cycles {', '.join(cycles[day] for day in days)})")
+else:
+    cycles = {start_day: light_cycle}
 
 # --------------------------
 # 🌙 Light cycle shading
@@ -225,123 +228,176 @@ def add_light_cycle(ax, day, cycle_type):
         ax.axvspan(night_start, night_end, color='gray', alpha=0.3)
 
 # --------------------------
-# 📈 Multi-axis graphs per animal
-animals = df_day["Animal"].unique()
-for animal in animals:
-    fig, ax1 = plt.subplots(figsize=(14, 6))
-    add_light_cycle(ax1, start_day, light_cycle)
-
-    df_animal = df_day[df_day["Animal"] == animal]
-
-    if "RER" in df_animal.columns:
-        ax1.plot(df_animal["DateTime"], df_animal["RER"],
-                 color='blue', marker='o', linestyle='-', linewidth=1, markersize=3)
-    ax1.set_xlabel("Hour")
-    ax1.set_ylabel("RER", color='blue')
-    ax1.xaxis.set_major_locator(mdates.HourLocator(interval=2))
-    ax1.xaxis.set_major_formatter(mdates.DateFormatter('%Hh'))
-
-    ax2 = ax1.twinx()
-    if "XT_YT" in df_animal.columns:
-        ax2.plot(df_animal["DateTime"], df_animal["XT_YT"],
-                 color='red', marker='s', linestyle='-', linewidth=1, markersize=3, alpha=0.7)
-    ax2.set_ylabel("XT+YT / 8000", color='red')
-
-    ax3 = ax1.twinx()
-    if "Feed_diff" in df_animal.columns:
-        ax3.plot(df_animal["DateTime"], df_animal["Feed_diff"],
-                 color='green', marker='D', linestyle='-', linewidth=1.5, markersize=3)
-    ax3.spines["right"].set_position(("outward", 60))
-    ax3.set_ylabel("Feed (g)", color='green')
-
-    ax4 = ax1.twinx()
-    if "EE" in df_animal.columns:
-        ax4.plot(df_animal["DateTime"], df_animal["EE"],
-                 color='#800080', marker='^', linestyle='-', linewidth=1.5, markersize=3)
-    ax4.spines["right"].set_position(("outward", 120))
-    ax4.set_ylabel("EE (kcal)", color='#800080')
-
-    ax1.grid(True, axis='y', linestyle='--', alpha=0.7)
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_dir, f"Graph_Animal{animal}_{start_day}_Cycle{light_cycle}_raw.png"))
-    plt.close()
-
-print("✅ Multi-axis graphs generated")
+# 📅 Outputs of one day
+def analyze_day(start_day, light_cycle, df_day):
+    """Resampled grid, wide / raw tables and figures of one 7 AM → 7 AM day, in <file>_<day>_LD11_7h_7h."""
+    start_period = pd.to_datetime(str(start_day)) + pd.Timedelta(hours=7)
+    end_period = start_period + pd.Timedelta(hours=24)
+    output_dir = os.path.join(output_root, f"{base_name}_{start_day}_LD11_7h_7h")
+    os.makedirs(output_dir, exist_ok=True)
+    if sweep:
+        print(f"\n📅 {start_day} (Cycle {light_cycle}) → {output_dir}")
+    animal_rows = AnimalIndex(df_day)  # contiguous rows of each animal, shared by resampling and plots
+
+    # ============================================================
+    # 📌 **RESAMPLING PIPELINE** (grid at the sampling interval: the shortest one when animals differ)
+    # ============================================================
+    checkpoint("resample")
+    step = grid_interval(intervals)
+    print(f"\n⏱️ Starting {interval_label(step)} resampling pipeline...")
+
+    time_grid = pd.date_range(start=start_period, end=end_period, freq=step, inclusive="left")
+    grid_ns = time_grid.to_numpy(dtype="datetime64[ns]").view(np.int64)
+    resample_vars = ["RER", "XT_YT", "Feed_diff", "EE"]
+
+    resampled = {"DateTime": time_grid}
+    animals = df_day["Animal"].unique()
+
+    for animal in animals:
+        print(f" → Resampling animal {animal}...")
+
+        df_an = animal_rows[animal]
+        times = df_an["DateTime"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+        for var in resample_vars:
+            col_name = f"{var}_A{animal}"
+
+            if var not in df_an.columns:
+                resampled[col_name] = None
+                continue
+
+            # Linear in time between samples, NaN before the first one, last value held after
+            # the last one (interpolate(method="time") on the union of both time axes)
+            values = df_an[var].to_numpy(dtype="float64", na_value=np.nan)
+            valid = ~np.isnan(values)
+            if valid.any():
+                ser = np.interp(grid_ns, times[valid], values[valid], left=np.nan)
+            else:
+                ser = np.full(len(grid_ns), np.nan)
+            resampled[col_name] = ser.astype(df_an[var].dtype)
+
+    df_resampled = pd.DataFrame(resampled)
+    output_resampled = os.path.join(output_dir, f"{base_name}_{start_day}_{interval_label(step)}_resampled.xlsx")
+    write_table(df_resampled, output_resampled)
+
+    print(f"✅ {interval_label(step)} resampled data exported: {output_resampled}")
+
+    # --------------------------
+    # 🧱 Wide-format export
+    checkpoint("export_wide")
+    metrics = ["RER", "XT_YT", "Feed_diff", "EE"]
+    wide_data = {}
+
+    output_file_combined = os.path.join(output_dir, f"{base_name}_{start_day}_wide_data.xlsx")
 
-# --------------------------
-# 📈 Individual metric graphs per animal
-for animal in animals:
-    df_animal = df_day[df_day["Animal"] == animal]
+    for metric in metrics:
+        if metric in df_day.columns:
+            df_wide = df_day.pivot(index="DateTime", columns="Animal", values=metric)
+            wide_data[metric] = df_wide
+            print(f"✅ Wide-format sheet added: {metric}")
+
+    write_tables(wide_data, output_file_combined, index=True)
+
+    print(f"📘 Wide-format data saved in: {output_file_combined}")
+
+    # --------------------------
+    # Raw corrected data export
+    checkpoint("export_raw")
+    output_file = os.path.join(output_dir, f"{base_name}_{start_day}_LD11_7h_7h_raw.xlsx")
+    write_table(df_day, output_file)
+    print(f"✅ Raw data exported: {output_file}")
+
+    # --------------------------
+    # 📈 Multi-axis graphs: one faceted figure with every animal (one panel each, one axis per metric)
+    checkpoint("plot_individual")
+    day_spans = dark_spans(pd.to_datetime(str(start_day)) + pd.Timedelta(hours=7), light_cycle)
+    by_animal = dict(animal_rows.items())
+    styles = [("RER", "blue", "RER", "o"), ("XT_YT", "red", "XT+YT / 8000", "s"),
+              ("Feed_diff", "green", "Feed (g)", "D"), ("EE", "#800080", "EE (kcal)", "^")]
+    panels = {animal: (d["DateTime"], {metric: d[metric] for metric, *_ in styles if metric in d.columns})
+              for animal, d in by_animal.items()}
+    plot_multi_facets(panels, os.path.join(output_dir, f"Graph_Facets_MultiAxis_{start_day}_Cycle{light_cycle}_raw.png"),
+                      f"{start_day} (Cycle {light_cycle})", styles, spans=day_spans, linewidth=1)
+
+    print("✅ Multi-axis graphs generated")
+
+    # --------------------------
+    # 📈 Individual metric graphs: one faceted figure per metric (one panel per animal, shared axes)
+    checkpoint("plot_metrics")
     for metric, color, ylabel, marker in [
         ("RER", "blue", "RER", "o"),
         ("XT_YT", "red", "XT+YT / 8000", "s"),
         ("Feed_diff", "green", "Feed (g)", "D"),
         ("EE", "#800080", "EE (kcal)", "^")
     ]:
-        if metric in df_animal.columns:
-            fig, ax = plt.subplots(figsize=(14, 6))
-            add_light_cycle(ax, start_day, light_cycle)
-            ax.plot(df_animal["DateTime"], df_animal[metric],
-                    color=color, marker=marker, linestyle='-', linewidth=1, markersize=3)
-            ax.set_title(f"Animal {animal} - {metric} - {start_day}")
-            ax.set_xlabel("Hour")
-            ax.set_ylabel(ylabel, color=color)
-            ax.xaxis.set_major_locator(mdates.HourLocator(interval=2))
-            ax.xaxis.set_major_formatter(mdates.DateFormatter('%Hh'))
-            plt.tight_layout()
-            plt.savefig(os.path.join(output_dir, f"Graph_Animal{animal}_{metric}_{start_day}_raw.png"))
-            plt.close()
-
-print("📈 Individual plots generated")
-
-# ============================================================
-# 📈 GRAPHES PAR PARAMÈTRE AVEC LES 4 ANIMAUX SUR LE MÊME PLOT
-# ============================================================
-
-print("\n📊 Generating per-parameter graphs with all animals...")
-
-metrics_info = {
-    "RER": ("RER", "blue", "RER"),
-    "XT_YT": ("Activity (XT+YT / 8000)", "red", "XT+YT / 8000"),
-    "Feed_diff": ("Food intake (g)", "green", "Feed (g)"),
-    "EE": ("Energy Expenditure (kcal)", "#800080", "EE (kcal)")
-}
-
-for metric, (title_label, default_color, ylabel) in metrics_info.items():
-    if metric not in df_day.columns:
+        if metric in df_day.columns:
+            panels = {animal: (d["DateTime"], d[metric]) for animal, d in by_animal.items()}
+            plot_facets(panels, os.path.join(output_dir, f"Graph_Facets_{metric}_{start_day}_raw.png"),
+                        f"{metric} - {start_day}", ylabel, spans=day_spans, color=color, marker=marker,
+                        linewidth=1)
+
+    print("📈 Individual plots generated")
+
+    # ============================================================
+    # 📈 GRAPHES PAR PARAMÈTRE AVEC TOUS LES ANIMAUX SUR LE MÊME PLOT
+    # ============================================================
+    checkpoint("plot_global")
+
+    print("\n📊 Generating per-parameter graphs with all animals...")
+
+    metrics_info = {
+        "RER": ("RER", "blue", "RER"),
+        "XT_YT": ("Activity (XT+YT / 8000)", "red", "XT+YT / 8000"),
+        "Feed_diff": ("Food intake (g)", "green", "Feed (g)"),
+        "EE": ("Energy Expenditure (kcal)", "#800080", "EE (kcal)")
+    }
+
+    for metric, (title_label, default_color, ylabel) in metrics_info.items():
+        if metric not in df_day.columns:
+            continue
+
+        fig, ax = plt.subplots(figsize=(14, 6))
+        add_light_cycle(ax, start_day, light_cycle)
+
+        # Plot every animal
+        for animal in sorted(animals):
+            df_an = animal_rows[animal]
+
+            if df_an[metric].notna().sum() == 0:
+                continue  # skip empty data
+
+            ax.plot(
+                df_an["DateTime"],
+                df_an[metric],
+                linestyle='-',
+                linewidth=1.3,
+                markersize=3,
+                marker='o',
+                label=f"Animal {animal}"
+            )
+
+        ax.set_title(f"{metric} – All animals – {start_day}")
+        ax.set_xlabel("Hour")
+        ax.set_ylabel(ylabel)
+        ax.xaxis.set_major_locator(mdates.HourLocator(interval=2))
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%Hh'))
+        ax.grid(True, axis="y", linestyle="--", alpha=0.7)
+        ax.legend(title="Animals")
+
+        plt.tight_layout()
+        plt.savefig(os.path.join(output_dir, f"Graph_AllAnimals_{metric}_{start_day}.png"))
+        plt.close()
+
+    print("✅ Multi-animal parameter plots generated")
+
+
+for day, cycle in cycles.items():
+    df_day = rows_of_day.pop(pd.Timestamp(day), None)
+    if df_day is None:
+        print(f"⚠️ No data for {day}")
         continue
+    analyze_day(day, cycle, df_day)
 
-    fig, ax = plt.subplots(figsize=(14, 6))
-    add_light_cycle(ax, start_day, light_cycle)
-
-    # Plot the 4 animals
-    for animal in sorted(animals):
-        df_an = df_day[df_day["Animal"] == animal]
-
-        if df_an[metric].notna().sum() == 0:
-            continue  # skip empty data
-
-        ax.plot(
-            df_an["DateTime"],
-            df_an[metric],
-            linestyle='-',
-            linewidth=1.3,
-            markersize=3,
-            marker='o',
-            label=f"Animal {animal}"
-        )
-
-    ax.set_title(f"{metric} – All animals – {start_day}")
-    ax.set_xlabel("Hour")
-    ax.set_ylabel(ylabel)
-    ax.xaxis.set_major_locator(mdates.HourLocator(interval=2))
-    ax.xaxis.set_major_formatter(mdates.DateFormatter('%Hh'))
-    ax.grid(True, axis="y", linestyle="--", alpha=0.7)
-    ax.legend(title="Animals")
-
-    plt.tight_layout()
-    plt.savefig(os.path.join(output_dir, f"Graph_AllAnimals_{metric}_{start_day}.png"))
-    plt.close()
-
-print("✅ Multi-animal parameter plots generated")
+checkpoint("background_io")
+drain()
 print(f"\n📦 All output files generated in: {output_dir}")
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Warm analysis service: keep exports parsed in memory and query them on localhost
+
+@author: pablo.SAIDI
+"""
+
+import os
+from tse_calo.dialogs import Tk, filedialog, simpledialog
+from tse_calo.service import DEFAULT_BUDGET_MB, DEFAULT_IDLE_SECONDS, DEFAULT_PORT, serve
+from tse_calo.profiling import checkpoint
+
+# --------------------------
+# 📂 Export to parse right away (optional: others are parsed on their first request)
+checkpoint("dialogs")
+Tk().withdraw()
+file_path = filedialog.askopenfilename(
+    title="Select an export to load now (Cancel: load on first request)",
+    filetypes=[("Excel files", "*.xlsx *.xls"), ("CSV files", "*.csv")]
+)
+preload = []
+if file_path:
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"❌ File not found: {file_path}")
+    preload.append(file_path)
+    print(f"✅ Preloaded file : {file_path}")
+
+# --------------------------
+# 🧠 Memory budget of the resident exports
+budget_mb = simpledialog.askfloat(
+    "Memory budget",
+    f"Memory budget of the exports kept in memory, in MB (empty = {DEFAULT_BUDGET_MB}):"
+)
+budget_mb = DEFAULT_BUDGET_MB if budget_mb is None else max(budget_mb, 1)
+
+# --------------------------
+# 🛰️ Serve until Ctrl+C
+checkpoint("serve")
+print(f"🔗 Example: http://127.0.0.1:{DEFAULT_PORT}/hourly?file=<export>&day=YYYY-MM-DD")
+try:
+    serve(DEFAULT_PORT, budget_mb=budget_mb, idle_seconds=DEFAULT_IDLE_SECONDS, preload=preload)
+except KeyboardInterrupt:
+    print("⏹️ Service stopped")
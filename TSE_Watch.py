@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Live check of ongoing recordings: watch a folder of PhenoMaster exports
+
+@author: pablo.SAIDI
+"""
+
+import os
+from tse_calo.dialogs import Tk, filedialog, simpledialog, messagebox
+from tse_calo.live import watch
+from tse_calo.profiling import checkpoint
+
+# --------------------------
+# 📂 Folder where the exports are saved during the experiment
+checkpoint("dialogs")
+Tk().withdraw()
+folder = filedialog.askdirectory(title="Select the folder where the PhenoMaster exports are saved")
+if not folder:
+    raise FileNotFoundError("❌ No folder selected. Restart the script and select a folder.")
+if not os.path.isdir(folder):
+    raise FileNotFoundError(f"❌ Folder not found: {folder}")
+print(f"✅ Watched folder : {folder}")
+
+# --------------------------
+# ❓ Feed_diff filtering and polling interval
+exclude_feed = messagebox.askyesno(
+    "Feed_diff Filtering",
+    "Do you want to exclude Feed_diff values greater than 2 ?"
+)
+print("⛔ Excluding Feed_diff values > 2" if exclude_feed else "✔ Keeping all Feed_diff values (no filtering)")
+
+interval = simpledialog.askfloat(
+    "Polling interval",
+    "Seconds between two scans of the folder (0 = scan once and exit):"
+)
+interval = 60 if interval is None else max(interval, 0)
+
+# --------------------------
+# 📁 Output directory (one <export>_live folder per export)
+output_root = r"D:\pablo.SAIDI\Desktop\Sortie programme calo"
+os.makedirs(output_root, exist_ok=True)
+print(f"📁 Output folder : {output_root}")
+
+# --------------------------
+# 👀 Watch: new rows parsed, hourly values / ZT chronology updated, changed figures redrawn
+checkpoint("watch")
+if interval:
+    print(f"👀 Scanning every {interval:g} s (Ctrl+C to stop)")
+try:
+    watch(folder, output_root, interval=interval, exclude_feed=exclude_feed)
+except KeyboardInterrupt:
+    print("⏹️ Watch stopped")
+
+print(f"📦 Live outputs are in: {output_root}")
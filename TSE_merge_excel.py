@@ -5,11 +5,30 @@ Created on Tue Oct 14 10:32:40 2025
 """
 
 import pandas as pd
-from openpyxl import load_workbook
-from tkinter import Tk, filedialog
+from tse_calo.dialogs import Tk, filedialog
 import os
-
-# --- File selection ---
+from tse_calo.pipeline import prefetch, drain
+from tse_calo.profiling import checkpoint
+from tse_calo.lazy import lazy_import
+
+openpyxl = lazy_import("openpyxl")
+
+# --- Find the header row (the one containing "Box", row 9 in standard 4-cage exports) ---
+def find_header_row(path):
+    top = pd.read_excel(path, header=None, nrows=50)
+    for i, row in top.iterrows():
+        labels = [str(v).strip().lower() for v in row if pd.notna(v)]
+        if "box" in labels and any("animal" in label for label in labels):
+            return i + 1  # 1-based Excel row
+    raise SystemExit(f"❌ Could not find the header row with 'Box' and 'Animal' columns in {path}.")
+
+# --- Read a file starting from its header row ---
+def read_from_header(path):
+    header = find_header_row(path)
+    return header, pd.read_excel(path, skiprows=header - 1)
+
+# --- File selection (each file is read in the background as soon as it is chosen) ---
+checkpoint("dialogs")
 Tk().withdraw()
 
 print("📂 Select the main file (e.g., PS 2025 01 arvis M.xlsx)")
@@ -17,6 +36,7 @@ file1 = filedialog.askopenfilename(
     title="Select the main file",
     filetypes=[("Excel files", "*.xlsx *.xls")]
 )
+read1 = prefetch(read_from_header, file1) if file1 else None
 
 print("📂 Select the file to add (e.g., PS 2025 01 arvis M bis.xlsx)")
 file2 = filedialog.askopenfilename(
@@ -26,10 +46,13 @@ file2 = filedialog.askopenfilename(
 
 if not file1 or not file2:
     raise SystemExit("❌ Selection cancelled. Restart the script and choose both Excel files.")
+read2 = prefetch(read_from_header, file2)
 
-# --- Read both files starting from row 9 ---
-df1 = pd.read_excel(file1, skiprows=8)
-df2 = pd.read_excel(file2, skiprows=8)
+# --- Read both files starting from their header row ---
+checkpoint("read_excel")
+header1, df1 = read1.result()
+header2, df2 = read2.result()
+del read1, read2  # the tasks would keep both raw reads alive until the end of the run
 
 df1.columns = df1.columns.str.strip()
 df2.columns = df2.columns.str.strip()
@@ -47,12 +70,14 @@ if not animal_col:
     raise SystemExit
 
 # --- Open the main file with openpyxl ---
-wb = load_workbook(file1)
+checkpoint("load_workbook")
+wb = openpyxl.load_workbook(file1)
 ws = wb.active
 
 print("\n🔍 Inserting data from the second file into the correct sections...")
 
 # Get the order of animals in the main file
+checkpoint("insert_rows")
 animal_order = df1[animal_col].dropna().unique().tolist()
 
 # Insert starting from the end to avoid shifting already processed rows
@@ -66,7 +91,7 @@ for animal in reversed(animal_order):
     if animal_rows.empty:
         continue
 
-    last_row_index = animal_rows.index[-1] + 10  # +9 for skipped rows +1 because Excel is 1-based
+    last_row_index = animal_rows.index[-1] + header1 + 1  # header row + 1 because Excel is 1-based
 
     # Insert new rows just after
     ws.insert_rows(last_row_index + 1, amount=len(new_rows))
@@ -79,12 +104,15 @@ for animal in reversed(animal_order):
 
 # --- Save the result ---
 # The final file will take the name of the first file + " - final compiled.xlsx"
+checkpoint("save_workbook")
 base_name = os.path.splitext(os.path.basename(file1))[0]
 desktop_path = r"D:\pablo.SAIDI\Desktop"
 output_file = os.path.join(desktop_path, f"{base_name} - final merged.xlsx")
 
 wb.save(output_file)
 
+checkpoint("background_io")
+drain()
 print("\n🎉 Merge completed successfully!")
 print(f"💾 The final file has been saved here:\n{output_file}")
 print("✅ New data has been inserted right after the correct animals, keeping the original structure intact.")
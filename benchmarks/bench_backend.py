@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Backend benchmark: pandas vs Polars on the cleaning / aggregation chain
+Created by Pablo SAIDI
+
+For every size (cages × days @ sampling interval) a synthetic data block is
+parsed into the compact frame of the scripts, then tse_calo.engine runs the
+chain with both backends:
+
+    window    prepare (Feed_diff, > 2 g excluded, 7.5 min shift, 7 AM → 7 AM window)
+              + Relative_Hour × Animal sums / means        (TSE_One_Day_mean.py)
+    hourly    prepare on the whole experiment
+              + Day × Hour × Animal sums / means            (TSE_All_Graph_mean.py)
+
+Each case is first checked with compare_backends (identical prepared rows,
+aggregates within float32 summation order) and the run stops on a mismatch;
+benchmarks/check_backends.py runs the same check on more export shapes.
+The median time of --repeat runs of each backend is then printed:
+
+    python benchmarks/bench_backend.py --sizes 16x14@1min 64x60@1min
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+
+from tse_calo.engine import BACKENDS, aggregate, compare_backends, prepare
+from tse_calo.schema import compact
+from tse_calo.synthetic import synthetic_frame
+
+DEFAULT_SIZES = ["4x4@15min", "16x14@1min", "32x30@1min"]
+WINDOW_AGG = {"RER": "mean", "XT_YT": "sum", "Feed_diff": "sum", "EE": "sum"}
+HOURLY_AGG = {"RER": "mean", "XT_YT": "sum", "Feed_diff": "sum", "EE": "mean"}
+
+
+def parse_size(text):
+    """'16x14@1min' → (16 cages, 14 days, '1min')."""
+    cages_days, _, interval = text.partition("@")
+    cages, days = cages_days.lower().split("x")
+    return int(cages), float(days), interval or "15min"
+
+
+def parsed_frame(n_cages, days, interval):
+    """Synthetic export block as the scripts hold it after parsing (compact schema)."""
+    data = synthetic_frame(n_cages=n_cages, days=days, interval=interval, missing_rate=0.01)
+    df = data.rename(columns={"Animal No.": "Animal", "XT+YT": "XT_YT", "Energy expenditure": "EE"})
+    df["DateTime"] = pd.to_datetime(df["Date"] + " " + df["Time"])
+    return compact(df[["Animal", "DateTime", "RER", "XT_YT", "Feed", "EE"]])
+
+
+def run_window(df, engine):
+    start = df["DateTime"].min().normalize() + pd.Timedelta(days=1, hours=7)
+    df_day = prepare(df, exclude_feed=True, offset_minutes=7.5, start=start,
+                     end=start + pd.Timedelta(days=1), engine=engine)
+    return aggregate(df_day, ["Relative_Hour", "Animal"], WINDOW_AGG, engine=engine)
+
+
+def run_hourly(df, engine):
+    df = prepare(df, engine=engine)
+    df["Day"] = df["DateTime"].dt.date
+    df["Hour"] = df["DateTime"].dt.hour
+    return aggregate(df, ["Day", "Hour", "Animal"], HOURLY_AGG, engine=engine)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="pandas vs Polars backend of the cleaning chain.")
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, help="cages x days @ interval, e.g. 16x14@1min")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'Size':<14} {'Rows':>10}  {'Case':<7}" + "".join(f"  {b + ' (s)':>12}" for b in BACKENDS))
+    print("-" * (36 + 14 * len(BACKENDS)))
+    for size in args.sizes:
+        df = parsed_frame(*parse_size(size))
+        start = df["DateTime"].min().normalize() + pd.Timedelta(days=1, hours=7)
+        # Prepared rows must be identical; per-animal aggregates stand in for Day × Hour keys
+        compare_backends(df, ["Relative_Hour", "Animal"], WINDOW_AGG, exclude_feed=True, offset_minutes=7.5,
+                         start=start, end=start + pd.Timedelta(days=1))
+        compare_backends(df, ["Animal"], HOURLY_AGG)
+        for case, run in [("window", run_window), ("hourly", run_hourly)]:
+            times = []
+            for engine in BACKENDS:
+                runs = []
+                for _ in range(args.repeat):
+                    t0 = time.perf_counter()
+                    run(df, engine)
+                    runs.append(time.perf_counter() - t0)
+                times.append(statistics.median(runs))
+            pd.testing.assert_frame_equal(run(df, "pandas"), run(df, "polars"), check_exact=False, rtol=1e-5)
+            print(f"{size:<14} {len(df):>10}  {case:<7}" + "".join(f"  {t:>12.3f}" for t in times))
+
+
+if __name__ == "__main__":
+    main()
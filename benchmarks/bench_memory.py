@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Peak-memory check of the scripts on a synthetic export
+Created by Pablo SAIDI
+
+A synthetic export (cages × days @ sampling interval, tse_calo.synthetic) is
+written once, then every script that cleans a raw export runs headless
+(benchmarks/headless.py) with TSE_PROFILE=1. Two figures are read from each
+trace:
+
+    peak       peak resident memory of the whole run (figures and workbook writes included)
+    cleaning   peak of the cleaning stages (read_excel → feed_diff), where the
+               copies of the parsed export used to pile up
+
+and compared with the budget recorded in memory_budget.json for that size.
+The run exits with status 1 when a figure goes over its budget by more than
+--tolerance, so a change that brings copies back into the cleaning path is
+caught before it reaches the lab machines:
+
+    python benchmarks/bench_memory.py                    check against memory_budget.json
+    python benchmarks/bench_memory.py --update           record the current peaks as the budget
+
+Peaks include the interpreter, pandas and matplotlib (~150 MB): budgets are
+only comparable on the same Python / pandas versions, and are updated with
+--update when the environment changes.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+
+from bench_scaling import parse_size, run_script
+from tse_calo.synthetic import write_export
+
+DEFAULT_SIZE = "16x5@2min"
+CLEANING_STAGES = ("read_excel", "datetime_parse", "quality_check", "feed_diff")
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "memory_budget.json")
+
+
+def script_runs(xlsx, start_day):
+    """(script, files, dialog answers) of every script that parses and cleans the export."""
+    day1, day2, day3 = (start_day + pd.Timedelta(days=k) for k in range(3))
+    day1, day2, day3 = (d.strftime("%Y-%m-%d") for d in (day1, day2, day3))
+    return [
+        ("TSE_One_Day_mean.py", [xlsx], [day2, "2", "3", "y", "n"]),
+        ("TSE_One_Day_raw.py", [xlsx], [day2, "2", "3", "y"]),
+        ("TSE_4_Days_mean.py", [xlsx], [day1, "2", "n", "1", "n", "1"]),
+        ("TSE_4_Days_raw.py", [xlsx], [day1, "2"]),
+        ("TSE_4_Days_Raw_Excel", [xlsx], [day1, "2"]),
+        ("TSE_All_Graph_Raw.py", [xlsx], ["n", "n", day3, day2]),
+        ("TSE_All_Graph_mean.py", [xlsx], ["n", day3, day2]),
+    ]
+
+
+def peaks(trace):
+    """{"peak": whole run, "cleaning": cleaning stages} in MB, from a TSE_PROFILE trace."""
+    cleaning = [s["rss_peak_mb"] for s in trace["stages"]
+                if s["parent"] is None and s["stage"] in CLEANING_STAGES and s["rss_peak_mb"] is not None]
+    return {"peak": trace["peak_rss_mb"], "cleaning": max(cleaning) if cleaning else None}
+
+
+def read_budget(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the peak memory of the scripts against a budget.")
+    parser.add_argument("--size", default=DEFAULT_SIZE, help="cages x days @ interval, e.g. 16x5@2min")
+    parser.add_argument("--scripts", nargs="+", help="only these scripts (default: every cleaning script)")
+    parser.add_argument("--budget", default=BUDGET_FILE)
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed excess over the budget (0.10 = 10 %%)")
+    parser.add_argument("--update", action="store_true", help="record the measured peaks as the new budget")
+    args = parser.parse_args(argv)
+
+    cages, days, interval = parse_size(args.size)
+    budget = read_budget(args.budget)
+    limits = budget.get(args.size, {})
+    measured, over = {}, []
+
+    with tempfile.TemporaryDirectory() as workdir:
+        xlsx = os.path.join(workdir, f"syn_{cages}x{days:g}_{interval}.xlsx")
+        data = write_export(xlsx, n_cages=cages, days=days, interval=interval)
+        start_day = pd.Timestamp(data["Date"].iloc[0])
+        print(f"📏 {args.size}: {len(data)} rows per sheet ({cages} cages × {days:g} days @ {interval})")
+        del data
+
+        for script, files, answers in script_runs(xlsx, start_day):
+            if args.scripts and script not in args.scripts:
+                continue
+            trace = run_script(script, files, answers, workdir)
+            if trace is None or trace.get("peak_rss_mb") is None:
+                over.append(script)
+                continue
+            measured[script] = values = peaks(trace)
+            for name, value in values.items():
+                limit = limits.get(script, {}).get(name)
+                if value is None:
+                    continue
+                if limit is None:
+                    status = "no budget"
+                elif value > limit * (1 + args.tolerance):
+                    status = f"❌ over budget ({limit:.0f} MB)"
+                    over.append(f"{script} ({name})")
+                else:
+                    status = f"✅ budget {limit:.0f} MB"
+                print(f"   {script:<24} {name:<9} {value:>8.1f} MB   {status}")
+
+    if args.update:
+        budget[args.size] = {**limits, **measured}
+        with open(args.budget, "w", encoding="utf-8") as f:
+            json.dump(budget, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"💾 Budget of {args.size} updated in {os.path.abspath(args.budget)}")
+        return 0
+    if over:
+        print(f"❌ Over budget or failed: {', '.join(over)}")
+        return 1
+    print("✅ Every script within its memory budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
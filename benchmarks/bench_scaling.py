@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Scaling benchmark on synthetic PhenoMaster exports
+Created by Pablo SAIDI
+
+For every size (cages × days @ sampling interval) a synthetic export is
+generated with tse_calo.synthetic, then each stage of the pipeline is timed
+in-process, with the same pandas operations as the scripts:
+
+    read_csv / read_excel   reading the export (read_excel only up to --excel-rows)
+    clean                   rename, Animal filter, DateTime parse, numeric columns, sort, Feed_diff, XT_YT / 8000
+    ee                      body-weight join + Weir EE on every row (TSE_Add_EE.py)
+    merge                   appending a second export after each animal's rows (TSE_merge_excel.py)
+    aggregate               hourly pivots per Day × Hour × Animal (TSE_All_Graph_mean.py)
+    plot                    one multi-axis figure per animal (TSE_One_Day_mean.py)
+
+With --scripts, the real scripts also run headless (benchmarks/headless.py)
+on the sizes that fit in an Excel sheet, with TSE_PROFILE=1, and the stages
+of their traces are added to the results. Their figures and tables go to the
+scripts' usual output folders.
+
+    python benchmarks/bench_scaling.py --sizes 4x4@15min 16x14@1min --scripts
+
+Results are printed as a table (seconds, stage × size) and saved as CSV + JSON in --out.
+"""
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import pandas as pd
+
+from tse_calo.energy import energy_expenditure, weight_series
+from tse_calo.synthetic import synthetic_frame, write_export, header_row, EXCEL_MAX_ROWS
+
+DEFAULT_SIZES = ["4x4@15min", "4x4@1min", "16x14@1min", "32x30@1min", "64x60@1min"]
+TITLE = "PS 2025 01 arvis M"
+
+
+def parse_size(text):
+    """'16x14@1min' → (16 cages, 14 days, '1min')."""
+    cages_days, _, interval = text.partition("@")
+    cages, days = cages_days.lower().split("x")
+    return int(cages), float(days), interval or "15min"
+
+
+# --------------------------
+# 🧪 Stages (same operations as the scripts)
+def stage_read_csv(path):
+    return pd.read_csv(path, low_memory=False)
+
+
+def stage_read_excel(path):
+    return pd.read_excel(path, sheet_name=TITLE)
+
+
+def stage_clean(raw):
+    df = raw.rename(columns={
+        TITLE: "Date",
+        "Unnamed: 1": "Time",
+        "TX002": "Animal",
+        "Unnamed: 11": "VO2",
+        "Unnamed: 12": "VCO2",
+        "Unnamed: 13": "RER",
+        "Unnamed: 14": "XT_YT",
+        "Unnamed: 15": "Feed",
+        "Unnamed: 16": "EE",
+    })
+    df = df[pd.to_numeric(df["Animal"], errors="coerce").notna()].copy()
+    df["Animal"] = df["Animal"].astype(float).astype(int)
+    df["DateTime"] = pd.to_datetime(
+        df["Date"].astype(str).str.strip() + " " + df["Time"].astype(str).str.strip(),
+        errors="coerce"
+    )
+    for col in ["VO2", "VCO2", "RER", "XT_YT", "Feed", "EE"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df = df.sort_values(["Animal", "DateTime"]).copy()
+    df["Feed_diff"] = df.groupby("Animal")["Feed"].diff().clip(lower=0)
+    df["XT_YT"] = df["XT_YT"] / 8000
+    return df
+
+
+def stage_ee(df, weights):
+    weighins = pd.DataFrame({"Animal": list(weights), "Weight": list(weights.values())})
+    weight = weight_series(df["Animal"], df["DateTime"], weighins)
+    return energy_expenditure(df["VO2"], weight, df["VCO2"], formula="weir")
+
+
+def stage_merge(first, second, key="TX002"):
+    # Rows of the second file go right after the rows of the same animal in the first file
+    both = pd.concat([first.assign(_file=0), second.assign(_file=1)], ignore_index=True)
+    return both.sort_values([key, "_file"], kind="stable").drop(columns="_file")
+
+
+def stage_aggregate(df):
+    df = df.dropna(subset=["DateTime"])
+    df = df.assign(Day=df["DateTime"].dt.date, Hour=df["DateTime"].dt.hour)
+    pivots = []
+    for metric, how in [("RER", "mean"), ("XT_YT", "sum"), ("Feed_diff", "sum"), ("EE", "mean")]:
+        p = df.pivot_table(index=["Day", "Hour"], columns="Animal", values=metric, aggfunc=how)
+        p.columns = [f"{metric}_Animal{c}" for c in p.columns]
+        pivots.append(p)
+    df_pivot = pd.concat(pivots, axis=1).reset_index()
+    df_pivot["DateTime"] = pd.to_datetime(df_pivot["Day"].astype(str)) + pd.to_timedelta(df_pivot["Hour"], unit="h")
+    return df_pivot
+
+
+def stage_plot(df_pivot, animals, folder):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    for animal in animals:
+        fig, ax1 = plt.subplots(figsize=(14, 6))
+        axes = [ax1, ax1.twinx(), ax1.twinx(), ax1.twinx()]
+        for k, (ax, metric, color) in enumerate(zip(axes, ["RER", "XT_YT", "Feed", "EE"],
+                                                    ["blue", "red", "green", "#800080"])):
+            col = f"{metric if metric != 'Feed' else 'Feed_diff'}_Animal{animal}"
+            if col in df_pivot.columns:
+                ax.plot(df_pivot["DateTime"], df_pivot[col], color=color, marker="o", linewidth=1.5, markersize=3)
+            if k > 1:
+                ax.spines["right"].set_position(("outward", 60 * (k - 1)))
+        ax1.set_title(f"Animal {animal}")
+        fig.savefig(os.path.join(folder, f"Graph_Animal{animal}.png"))
+        plt.close(fig)
+
+
+# --------------------------
+# 📜 Real scripts, headless, with TSE_PROFILE traces
+def script_runs(xlsx, noee, halves, start_day):
+    day1 = start_day.strftime("%Y-%m-%d")
+    day2 = (start_day + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+    return [
+        ("TSE_merge_excel.py", list(halves), []),
+        ("TSE_Add_EE.py", [noee], ["y"]),
+        ("TSE_One_Day_mean.py", [xlsx], [day2, "2", "3", "n", "n"]),
+        ("TSE_4_Days_mean.py", [xlsx], [day1, "2", "n", "1", "n"]),
+        ("TSE_4_Days_Raw_Excel", [xlsx], [day1, "2"]),
+    ]
+
+
+def run_script(script, files, answers, workdir):
+    if os.name != "nt":
+        # TSE_merge_excel.py saves to an existing Desktop folder (a relative folder of that name elsewhere)
+        os.makedirs(os.path.join(workdir, r"D:\pablo.SAIDI\Desktop"), exist_ok=True)
+    trace_dir = tempfile.mkdtemp(dir=workdir)
+    env = dict(os.environ, TSE_PROFILE="1", TSE_PROFILE_DIR=trace_dir, MPLBACKEND="Agg")
+    cmd = [sys.executable, os.path.join(ROOT, "benchmarks", "headless.py"), os.path.join(ROOT, script),
+           "--files", *files, "--answers", *answers]
+    done = subprocess.run(cmd, cwd=workdir, env=env, capture_output=True, text=True)
+    traces = glob.glob(os.path.join(trace_dir, "*.json"))
+    if done.returncode != 0 or not traces:
+        last = (done.stderr.strip().splitlines() or ["no output"])[-1]
+        print(f"   ⚠️ {script} failed: {last}")
+        return None
+    with open(traces[0], encoding="utf-8") as f:
+        return json.load(f)
+
+
+# --------------------------
+# 🔁 Benchmark loop
+def bench_size(size, args, workdir, results):
+    cages, days, interval = parse_size(size)
+    print(f"\n📏 {size}: {cages} cages × {days:g} days @ {interval}")
+
+    def record(stage, seconds, rows, peak=None):
+        results.append({"Size": size, "Cages": cages, "Days": days, "Interval": interval, "Rows": rows,
+                        "Stage": stage, "Seconds": round(seconds, 4), "Peak_RSS_MB": peak})
+        print(f"   {stage:<36} {seconds:>9.3f} s")
+
+    t = time.perf_counter()
+    data = synthetic_frame(n_cages=cages, days=days, interval=interval, seed=args.seed)
+    csv_path = os.path.join(workdir, f"syn_{cages}x{days:g}_{interval}.csv")
+    write_export(csv_path, data)
+    rows = len(data)
+    record("generate", time.perf_counter() - t, rows)
+
+    excel_ok = header_row(cages) + 1 + rows <= min(EXCEL_MAX_ROWS, args.excel_rows)
+    xlsx_path = csv_path[:-4] + ".xlsx"
+    if excel_ok:
+        write_export(xlsx_path, data)
+    if args.scripts and excel_ok:
+        noee = xlsx_path[:-5] + "_noEE.xlsx"
+        write_export(noee, data, ee=False)
+        half = data["Date"] < data["Date"].iloc[rows // (2 * cages)]
+        halves = (xlsx_path[:-5] + "_part1.xlsx", xlsx_path[:-5] + "_part2.xlsx")
+        write_export(halves[0], data[half])
+        write_export(halves[1], data[~half])
+    weights = data.groupby("Box")["Weight"].first().to_dict()
+    start_day = pd.Timestamp(data["Date"].iloc[0])
+    del data  # only the files are used from here on: keep one copy of the data in memory
+
+    t = time.perf_counter()
+    raw = stage_read_csv(csv_path)
+    record("read_csv", time.perf_counter() - t, rows)
+
+    if excel_ok:
+        t = time.perf_counter()
+        stage_read_excel(xlsx_path)
+        record("read_excel", time.perf_counter() - t, rows)
+
+    split_day = (start_day + pd.Timedelta(days=max(days // 2, 1))).strftime("%Y-%m-%d")
+    half = (raw[TITLE].astype(str) < split_day).to_numpy()
+    t = time.perf_counter()
+    stage_merge(raw[half], raw[~half])
+    record("merge", time.perf_counter() - t, rows)
+
+    t = time.perf_counter()
+    df = stage_clean(raw)
+    record("clean", time.perf_counter() - t, rows)
+    del raw
+
+    t = time.perf_counter()
+    df["EE"] = stage_ee(df, weights)
+    record("ee", time.perf_counter() - t, rows)
+
+    t = time.perf_counter()
+    df_pivot = stage_aggregate(df)
+    record("aggregate", time.perf_counter() - t, rows)
+
+    if not args.no_plots:
+        plot_dir = tempfile.mkdtemp(dir=workdir)
+        t = time.perf_counter()
+        stage_plot(df_pivot, sorted(df["Animal"].unique()), plot_dir)
+        record("plot", time.perf_counter() - t, rows)
+    del df, df_pivot
+
+    if args.scripts and excel_ok:
+        for script, files, answers in script_runs(xlsx_path, noee, halves, start_day):
+            trace = run_script(script, files, answers, workdir)
+            if trace is None:
+                continue
+            for s in trace["stages"]:
+                if s["parent"] is None and s["stage"] != "dialogs":
+                    record(f"{script.replace('.py', '')}:{s['stage']}", s["duration_s"], rows, s["rss_peak_mb"])
+    elif args.scripts:
+        print(f"   ⏭️ scripts skipped: {rows} rows exceed --excel-rows ({args.excel_rows})")
+
+
+def save(results, out, stamp):
+    pd.DataFrame(results).to_csv(os.path.join(out, f"bench_{stamp}.csv"), index=False)
+    with open(os.path.join(out, f"bench_{stamp}.json"), "w", encoding="utf-8") as f:
+        json.dump({"python": sys.version.split()[0], "pandas": pd.__version__, "numpy": np.__version__,
+                   "results": results}, f, indent=2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time every pipeline stage on synthetic exports of growing size.")
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, help="cages x days @ interval, e.g. 16x14@1min")
+    parser.add_argument("--scripts", action="store_true", help="also run the real scripts headless (Excel-sized data only)")
+    parser.add_argument("--excel-rows", type=int, default=250_000,
+                        help="largest export written / read as .xlsx (openpyxl is slow above that)")
+    parser.add_argument("--no-plots", action="store_true")
+    parser.add_argument("--out", default="bench_results")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    results = []
+    for size in args.sizes:
+        # Saved after every size: the largest sizes can run out of memory
+        with tempfile.TemporaryDirectory() as workdir:
+            bench_size(size, args, workdir, results)
+        save(results, args.out, stamp)
+
+    table = pd.DataFrame(results)
+    summary = table.pivot_table(index="Stage", columns="Size", values="Seconds", aggfunc="sum", sort=False)
+    print("\n⏱️ Seconds per stage")
+    print(summary[[s for s in args.sizes if s in summary.columns]].to_string(float_format=lambda v: f"{v:.3f}"))
+    print(f"\n📁 Results saved in {os.path.abspath(args.out)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Startup benchmark: process launch and import cost of the scripts
+Created by Pablo SAIDI
+
+Batch wrappers launch the scripts many times, so the fixed cost of a run
+(interpreter + imports) matters as much as the analysis itself. Each case
+runs in a fresh `python -X importtime` process, --repeat times:
+
+    import tse_calo / tse_calo.<module>   library imports alone
+    <script> (cancel)                     script started with empty file answers: exits at the file dialog
+    TSE_Add_EE.py, TSE_merge_excel.py     pure-export runs on a small synthetic export, answers on the command line
+
+and the median wall time, the time spent importing and the heavy modules
+that were loaded (pandas, matplotlib, tkinter, openpyxl) are printed:
+
+    python benchmarks/bench_startup.py --repeat 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tse_calo.synthetic import write_export
+
+HEAVY = ("pandas", "matplotlib", "tkinter", "openpyxl")
+MODULES = ["export", "quality", "energy", "cosinor", "periodogram", "groups", "bouts", "light", "facets", "live", "catalog", "pipeline", "workers", "index", "service", "sampling", "actogram", "pyramid"]
+SCRIPTS = ["TSE_One_Day_mean.py", "TSE_One_Day_raw.py", "TSE_4_Days_mean.py", "TSE_4_Days_raw.py",
+           "TSE_4_Days_Raw_Excel", "TSE_All_Graph_Raw.py", "TSE_All_Graph_mean.py",
+           "TSE_Add_EE.py", "TSE_merge_excel.py", "zt_outlier_cleaner", "TSE_Watch.py"]
+
+
+def parse_importtime(stderr):
+    """(seconds spent importing, top-level modules loaded) from the `-X importtime` report."""
+    total, loaded = 0, set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not name.startswith("  "):  # top-level import (nested ones are indented)
+            total += int(cumulative)
+        loaded.add(name.strip().split(".")[0])
+    return total / 1e6, loaded
+
+
+def time_case(cmd, repeat, workdir):
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""), MPLBACKEND="Agg")
+    walls, imports, loaded = [], [], set()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        done = subprocess.run([sys.executable, "-X", "importtime"] + cmd, cwd=workdir, env=env,
+                              capture_output=True, text=True)
+        walls.append(time.perf_counter() - t0)
+        seconds, loaded = parse_importtime(done.stderr)
+        imports.append(seconds)
+    return statistics.median(walls), statistics.median(imports), sorted(m for m in HEAVY if m in loaded)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Launch + import time of the TSE scripts.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workdir", default=None, help="folder for the synthetic inputs and outputs (default: temporary)")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="tse_startup_")
+    os.makedirs(workdir, exist_ok=True)
+    if os.name != "nt":  # TSE_merge_excel.py saves to this hard-coded Windows folder
+        os.makedirs(os.path.join(workdir, r"D:\pablo.SAIDI\Desktop"), exist_ok=True)
+    noee, first, second = (os.path.join(workdir, name) for name in ("noee.xlsx", "first.xlsx", "second.xlsx"))
+    write_export(noee, sheets=("PS 2025 01 arvis M",), ee=False, n_cages=4, days=1)
+    write_export(first, sheets=("PS 2025 01 arvis M",), n_cages=4, days=1)
+    write_export(second, sheets=("PS 2025 01 arvis M",), n_cages=4, days=1, start="2025-10-15 07:15")
+
+    cases = [("python (empty)", ["-c", "pass"]), ("import tse_calo", ["-c", "import tse_calo"])]
+    cases += [(f"import tse_calo.{m}", ["-c", f"import tse_calo.{m}"]) for m in MODULES]
+    cases += [(f"{s} (cancel)", [os.path.join(ROOT, s), "", ""]) for s in SCRIPTS]
+    cases += [("TSE_Add_EE.py (export run)", [os.path.join(ROOT, "TSE_Add_EE.py"), noee, "y"]),
+              ("TSE_merge_excel.py (export run)", [os.path.join(ROOT, "TSE_merge_excel.py"), first, second])]
+
+    width = max(len(name) for name, _ in cases)
+    print(f"{'Case':<{width}}  {'Wall (s)':>8}  {'Imports (s)':>11}  Heavy modules loaded")
+    print("-" * (width + 45))
+    for name, cmd in cases:
+        wall, imports, heavy = time_case(cmd, args.repeat, workdir)
+        print(f"{name:<{width}}  {wall:>8.3f}  {imports:>11.3f}  {', '.join(heavy) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Equality check of the pandas and Polars backends
+Created by Pablo SAIDI
+
+tse_calo.engine must give the same tables whatever TSE_BACKEND says. For
+synthetic exports of several shapes, both backends run the chain of the
+scripts that use it and are compared (prepared rows identical, aggregates
+within float32 summation order):
+
+    window    prepare (Feed_diff, > 2 g excluded, timestamp shift, 7 AM → 7 AM)
+              + Relative_Hour × Animal sums / means        (TSE_One_Day_mean.py)
+    hourly    prepare on the whole experiment
+              + Day × Hour × Animal sums / means            (TSE_All_Graph_mean.py)
+
+    4 cages × 3 days @ 15 min       complete
+    16 cages × 2 days @ 1 min       1 % missing values
+    7 cages × 4 days @ 2 min        5 % missing values, one shift per animal
+    15 min + 1 min cages            two sampling intervals in one export
+
+    python benchmarks/check_backends.py
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+
+from tse_calo.engine import aggregate, compare_backends, prepare
+from tse_calo.schema import compact
+from tse_calo.synthetic import synthetic_frame
+
+WINDOW_AGG = {"RER": "mean", "XT_YT": "sum", "Feed_diff": "sum", "EE": "sum"}
+HOURLY_AGG = {"RER": "mean", "XT_YT": "sum", "Feed_diff": "sum", "EE": "mean"}
+
+
+def parsed_frame(blocks):
+    """Synthetic export blocks (synthetic_frame options) as the scripts hold them after parsing."""
+    parts = []
+    for first_animal, options in blocks:
+        data = synthetic_frame(**options)
+        data["Animal No."] += first_animal - 1
+        parts.append(data)
+    df = pd.concat(parts, ignore_index=True)
+    df = df.rename(columns={"Animal No.": "Animal", "XT+YT": "XT_YT", "Energy expenditure": "EE"})
+    df["DateTime"] = pd.to_datetime(df["Date"] + " " + df["Time"])
+    return compact(df[["Animal", "DateTime", "RER", "XT_YT", "Feed", "EE"]])
+
+
+SHAPES = [
+    ("4 cages × 3 days @ 15 min, complete",
+     [(1, dict(n_cages=4, days=3, interval="15min"))], 7.5),
+    ("16 cages × 2 days @ 1 min, 1 % missing",
+     [(1, dict(n_cages=16, days=2, interval="1min", missing_rate=0.01, seed=1))], 0.5),
+    ("7 cages × 4 days @ 2 min, 5 % missing, shift per animal",
+     [(1, dict(n_cages=7, days=4, interval="2min", missing_rate=0.05, seed=2))],
+     pd.Series([0.0, 1.0, 1.0, 0.5, 0.0, 1.0, 0.5], index=range(1, 8))),
+    ("15 min + 1 min cages in one export",
+     [(1, dict(n_cages=3, days=2, interval="15min", seed=3)),
+      (4, dict(n_cages=3, days=2, interval="1min", missing_rate=0.01, seed=4))],
+     pd.Series([7.5] * 3 + [0.5] * 3, index=range(1, 7))),
+]
+
+
+def hourly_keys(df):
+    df["Day"] = df["DateTime"].dt.date
+    df["Hour"] = df["DateTime"].dt.hour
+    return df
+
+
+def check(name, blocks, offset):
+    print(f"\n📄 {name}")
+    df = parsed_frame(blocks)
+    start = df["DateTime"].min().normalize() + pd.Timedelta(days=1, hours=7)
+    window, _ = compare_backends(df, ["Relative_Hour", "Animal"], WINDOW_AGG, exclude_feed=True,
+                                 offset_minutes=offset, start=start, end=start + pd.Timedelta(days=1))
+    print(f"   ✅ window: prepared rows identical, {len(window)} Relative_Hour × Animal rows equal")
+
+    compare_backends(df, ["Animal"], HOURLY_AGG)
+    hourly = {engine: aggregate(hourly_keys(prepare(df, engine=engine)), ["Day", "Hour", "Animal"], HOURLY_AGG,
+                                engine=engine) for engine in ("pandas", "polars")}
+    pd.testing.assert_frame_equal(hourly["pandas"], hourly["polars"], check_exact=False, rtol=1e-5)
+    print(f"   ✅ hourly: prepared rows identical, {len(hourly['pandas'])} Day × Hour × Animal rows equal")
+
+
+def main():
+    for name, blocks, offset in SHAPES:
+        check(name, blocks, offset)
+    print("\n✅ pandas and Polars backends give the same tables")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Live mode check on block-layout re-exports
+Created by Pablo SAIDI
+
+PhenoMaster writes one block of rows per box, so saving a running
+experiment again inserts the new samples at the end of every block. For
+.csv and .xlsx, a synthetic export of 2 days is scanned, saved again with
+3 days (same block layout, the first 2 days unchanged) and scanned again:
+
+    2 days              full read
+    3 days              new rows only; hourly values and every pyramid level
+                        equal those of a full read of the 3-day export
+    schedule sidecar    no new rows, the shaded figures redrawn
+    edited early row    full read
+
+    python benchmarks/check_live.py
+"""
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd
+
+from tse_calo.live import LiveExport
+from tse_calo.pipeline import drain
+from tse_calo.pyramid import LEVELS
+from tse_calo.synthetic import synthetic_frame, write_export
+
+SHEET = ("PS 2025 02",)
+
+
+def expect(condition, message):
+    if not condition:
+        raise AssertionError(f"❌ {message}")
+    print(f"   ✅ {message}")
+
+
+def check(ext, folder):
+    print(f"\n📄 {ext}")
+    full = synthetic_frame(n_cages=4, days=3, interval="15min", seed=1)
+    times = pd.to_datetime(full["Date"] + " " + full["Time"])
+    early = full[times < times.min() + pd.Timedelta(days=2)]  # each box block cut after 2 days
+    path = os.path.join(folder, f"exp{ext}")
+
+    write_export(path, early, sheets=SHEET)
+    live = LiveExport(path, os.path.join(folder, f"live{ext}"))
+    report = live.update()
+    expect("full read" in report, f"first scan: {report}")
+
+    write_export(path, full, sheets=SHEET)
+    report = live.update()
+    expect("new rows only" in report and f"{len(full) - len(early)} rows" in report, f"re-export: {report}")
+
+    reference = LiveExport(path, os.path.join(folder, f"reference{ext}"))
+    reference.update()
+    pd.testing.assert_frame_equal(live.hourly.reset_index(drop=True), reference.hourly.reset_index(drop=True),
+                                  check_exact=False, rtol=1e-5)
+    for level in LEVELS:
+        pd.testing.assert_frame_equal(live.pyramid[level], reference.pyramid[level], check_exact=False, rtol=1e-5)
+    expect(True, "hourly values and pyramid levels equal those of a full read")
+
+    schedule = os.path.splitext(path)[0] + "_schedule.csv"
+    day = (times.min() + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+    pd.DataFrame({"Day": [day], "Cycle": ["2"]}).to_csv(schedule, index=False)
+    expect(live.changed(), "schedule sidecar seen as a change")
+    report = live.update()
+    expect("no new rows" in report and "0 figure(s)" not in report, f"schedule: {report}")
+    os.remove(schedule)
+
+    edited = full.copy()
+    edited.loc[edited.index[0], "RER"] = 0.5
+    write_export(path, edited, sheets=SHEET)
+    report = live.update()
+    expect("full read" in report, f"edited early row: {report}")
+    drain(report=False)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as folder:
+        for ext in (".csv", ".xlsx"):
+            check(ext, folder)
+    print("\n✅ Live mode follows block-layout re-exports")
+
+
+if __name__ == "__main__":
+    main()
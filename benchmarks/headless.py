@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Run one of the dialog-driven scripts without a screen
+Created by Pablo SAIDI
+
+File dialogs return the given files in order, text / number / yes-no
+dialogs return the given answers in order ("y" / "n" for yes-no), and
+matplotlib draws off-screen. Used by bench_scaling.py:
+
+    python benchmarks/headless.py TSE_One_Day_mean.py --files data.xlsx --answers 2025-10-15 2 3 n n
+"""
+
+import argparse
+import os
+import runpy
+import sys
+
+
+def run(script, files, answers):
+    import matplotlib
+    matplotlib.use("Agg")
+    import tkinter
+    from tkinter import filedialog, simpledialog, messagebox
+
+    files, answers = list(files), list(answers)
+
+    def answer(*args, **kwargs):
+        if not answers:
+            raise RuntimeError(f"❌ No answer left for the dialog {args[:1]}")
+        return answers.pop(0)
+
+    class NoWindow:
+        def __init__(self, *args, **kwargs): pass
+        def withdraw(self): pass
+        def destroy(self): pass
+        def attributes(self, *args): pass
+        def call(self, *args): pass
+
+    tkinter.Tk = NoWindow
+    filedialog.askopenfilename = lambda **kwargs: files.pop(0) if len(files) > 1 else files[0]
+    simpledialog.askstring = answer
+    simpledialog.askfloat = lambda *a, **k: (lambda v: None if v == "" else float(v))(answer(*a))
+    messagebox.askyesno = lambda *a, **k: answer(*a).lower().startswith("y")
+
+    script = os.path.abspath(script)
+    sys.argv = [script]
+    sys.path.insert(0, os.path.dirname(script))
+    runpy.run_path(script, run_name="__main__")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a TSE script with canned dialog answers.")
+    parser.add_argument("script")
+    parser.add_argument("--files", nargs="+", required=True)
+    parser.add_argument("--answers", nargs="*", default=[])
+    args = parser.parse_args()
+    run(args.script, args.files, args.answers)
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""
+Shared helpers for the TSE calorimetry scripts.
+Created by Pablo SAIDI
+
+Submodules are imported on first use (`tse_calo.energy`, `tse_calo.cosinor`...),
+so `import tse_calo` stays instant and pandas / matplotlib are only loaded by
+the modules that need them.
+"""
+
+import importlib
+
+__all__ = ["actogram", "bouts", "catalog", "cosinor", "dialogs", "energy", "engine", "export", "facets", "groups",
+           "index", "lazy", "light", "live", "partitions", "periodogram", "pipeline", "profiling", "pyramid",
+           "quality", "sampling", "schema", "service", "synthetic", "workers"]
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Raster actograms and ZT heatmaps: multi-day recordings drawn as images
+Created by Pablo SAIDI
+
+Line plots of a whole recording get denser, and slower to draw, with every
+recorded day. Here the samples of each animal are put once on a day × bin
+array (one row per ZT day starting at lights on, one column per bin, NaN
+where nothing was recorded) with one np.bincount for all animals, and each
+array is drawn as a single image (imshow): a figure costs the same for
+4 days or 8 weeks.
+
+    day_bins(df, "XT_YT", bin="15min")          {animal: DataFrame day × ZT bin}
+    plot_actogram(tables, path, title, label)   double-plotted (day d, then d + 1 on
+                                                the same row), one panel per animal
+    plot_zt_heatmap(tables, path, title, label) animals × bins of the whole recording,
+                                                one image for the cohort
+
+Tables built elsewhere (e.g. the Biological_Day × ZT matrices of
+zt_outlier_cleaner) are drawn the same way: index = day labels, columns =
+consecutive bins of one day.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from tse_calo.facets import facet_grid, save_figure
+from tse_calo.lazy import lazy_import
+from tse_calo.light import LIGHTS_ON_HOUR
+
+mfigure = lazy_import("matplotlib.figure")
+
+DAY = pd.Timedelta(days=1)
+CMAP = "viridis"
+MAX_DAY_TICKS = 14  # day labels kept readable on recordings of several weeks
+
+
+def day_bins(df, metric, bin="1h", how="sum", by="Animal", time="DateTime", start_hour=LIGHTS_ON_HOUR):
+    """
+    Day × bin table of `metric` for every animal with values ({animal: DataFrame}).
+    Rows are the ZT days of the recording (labelled by the date of their
+    lights on, shared by all animals), columns the ZT hour where each bin
+    starts; `how` = "sum" or "mean" of the samples falling in a bin.
+    """
+    if how not in ("sum", "mean"):
+        raise ValueError(f"❌ Unknown aggregation '{how}'. Use 'sum' or 'mean'.")
+    bin_ns = pd.Timedelta(bin).value
+    n_bins = math.ceil(DAY.value / bin_ns)
+
+    t = df[time].to_numpy(dtype="datetime64[ns]").view(np.int64)
+    values = pd.to_numeric(df[metric], errors="coerce").to_numpy(dtype=float)
+    valid = (t != np.iinfo(np.int64).min) & ~np.isnan(values)
+    codes, animals = pd.factorize(df[by].to_numpy()[valid], sort=True)  # animals with values only
+    t, values = t[valid][codes >= 0], values[valid][codes >= 0]
+    codes = codes[codes >= 0]
+    if not len(codes):
+        return {}
+
+    # First lights on at or before the first sample: row 0 of every animal
+    start = pd.Timedelta(hours=start_hour)
+    origin = (pd.Timestamp(t.min()) - start).normalize() + start
+    rel = t - origin.value
+    day, col = rel // DAY.value, (rel % DAY.value) // bin_ns
+    n_days = int(day.max()) + 1
+
+    flat = (codes * n_days + day) * n_bins + col
+    size = len(animals) * n_days * n_bins
+    sums = np.bincount(flat, weights=values, minlength=size)
+    counts = np.bincount(flat, minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cube = sums if how == "sum" else sums / counts
+    cube = np.where(counts > 0, cube, np.nan).reshape(len(animals), n_days, n_bins)
+
+    days = pd.Index(pd.date_range(origin.normalize(), periods=n_days, freq="D").strftime("%Y-%m-%d"), name="Day")
+    columns = pd.Index(np.arange(n_bins) * (bin_ns / pd.Timedelta(hours=1).value), name="ZT")
+    return {animal: pd.DataFrame(cube[i], index=days, columns=columns) for i, animal in enumerate(animals)}
+
+
+def double_plot(matrix):
+    """Day × bin array → day × 2 bins: each row is day d followed by day d + 1 (NaN after the last day)."""
+    matrix = np.asarray(matrix, dtype=float)
+    following = np.vstack([matrix[1:], np.full((1, matrix.shape[1]), np.nan)])
+    return np.hstack([matrix, following])
+
+
+def _color_range(arrays):
+    """Shared colour scale: 1st–99th percentile of all values, so a single spike does not flatten the rest."""
+    values = np.concatenate([np.ravel(a) for a in arrays])
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return 0.0, 1.0
+    low, high = np.percentile(values, [1, 99])
+    return float(low), float(high if high > low else low + 1)
+
+
+def _day_step(n_days):
+    """Days between two day labels: at most MAX_DAY_TICKS labels."""
+    return max(1, math.ceil(n_days / MAX_DAY_TICKS))
+
+
+def _day_ticks(ax, labels, axis="y", span=1.0):
+    """Day labels every _day_step days, at the centre of their row (or column of `span` units)."""
+    ticks = np.arange(0, len(labels), _day_step(len(labels)))
+    positions, names = (ticks + 0.5) * span, [str(labels[i]) for i in ticks]
+    if axis == "y":
+        ax.set_yticks(positions, names)
+    else:
+        ax.set_xticks(positions, names)
+
+
+def plot_actogram(tables, path, title, label, cmap=CMAP, panel_title="Animal {}"):
+    """
+    Double-plotted actogram of every table ({animal: day × bin}), one panel
+    per animal, one image per panel, on a shared colour scale; saved to `path`.
+    """
+    labels = [a for a, table in tables.items() if len(table)]
+    if not labels:
+        return None
+    images = {a: double_plot(tables[a].to_numpy()) for a in labels}
+    vmin, vmax = _color_range(images.values())
+
+    fig, axes = facet_grid(len(labels), sharey=False)
+    for ax, animal in zip(axes, labels):
+        days = tables[animal].index
+        image = ax.imshow(images[animal], aspect="auto", interpolation="nearest", cmap=cmap, vmin=vmin, vmax=vmax,
+                          extent=(0, 48, len(days), 0))
+        ax.vlines([12, 36], 0, len(days), color="white", linewidth=0.6, alpha=0.6)  # lights off of both days
+        _day_ticks(ax, days)
+        ax.set_title(panel_title.format(animal), fontsize=9, pad=2)
+        ax.tick_params(axis="y", labelsize=7)
+
+    axes[0].set_xticks([0, 12, 24, 36, 48], ["ZT0", "ZT12", "ZT0", "ZT12", "ZT0"])
+    for ax in axes:
+        ax.tick_params(axis="x", labelsize=8)
+
+    fig.suptitle(title, fontsize=13, fontweight="bold")
+    width, height = fig.get_size_inches()
+    fig.subplots_adjust(left=1.0 / width, right=1 - 1.1 / width, bottom=0.7 / height, top=1 - 0.7 / height,
+                        wspace=0.35, hspace=0.35)
+    fig.colorbar(image, ax=axes, fraction=0.02, pad=0.02, label=label)
+    return save_figure(fig, path)
+
+
+def plot_zt_heatmap(tables, path, title, label, cmap=CMAP):
+    """
+    Animal × ZT heatmap of the whole recording: one row per animal (its day ×
+    bin table read day after day), one image for the cohort; saved to `path`.
+    """
+    labels = [a for a, table in tables.items() if len(table)]
+    if not labels:
+        return None
+    days = tables[labels[0]].index
+    n_bins = tables[labels[0]].shape[1]
+    rows = np.vstack([tables[a].reindex(days).to_numpy(dtype=float).ravel() for a in labels])
+    vmin, vmax = _color_range([rows])
+
+    fig = mfigure.Figure(figsize=(14, max(3.0, 0.3 * len(labels) + 1.8)))
+    ax = fig.subplots()
+    image = ax.imshow(rows, aspect="auto", interpolation="nearest", cmap=cmap, vmin=vmin, vmax=vmax,
+                      extent=(0, len(days) * 24, len(labels), 0))
+    step = _day_step(len(days))
+    # ZT0 of the labelled days
+    ax.vlines(np.arange(step, len(days), step) * 24, 0, len(labels), color="white", linewidth=0.6, alpha=0.6)
+    _day_ticks(ax, days, axis="x", span=24)
+    ax.set_yticks(np.arange(len(labels)) + 0.5, [f"Animal {a}" for a in labels])
+    ax.tick_params(axis="y", labelsize=max(5, 9 - len(labels) // 16))
+    ax.tick_params(axis="x", labelsize=8)
+    ax.set_xlabel(f"ZT day (ZT0 = lights on, {n_bins} bins per day)", fontweight="bold")
+    ax.set_title(title, fontsize=14, fontweight="bold")
+    fig.colorbar(image, ax=ax, fraction=0.03, pad=0.01, label=label)
+    fig.tight_layout()
+    return save_figure(fig, path)
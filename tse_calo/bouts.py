@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Meal and activity bout detection
+Created by Pablo SAIDI
+
+A sample is "active" when its value is above `threshold` (Feed_diff for
+meals, XT_YT for activity). Active samples of the same animal belong to the
+same bout unless they are separated by at least `min_gap` of inactivity.
+Bouts are found by run-length encoding the sorted frame with array
+operations (no per-row loop), then summarized per animal × light phase.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def detect_bouts(df, value_col, threshold=0.0, min_gap="15min", min_size=0.0,
+                 time_col="DateTime", by=("Animal",), phase_col=None, interval=None):
+    """
+    One row per bout: by..., Bout, Start, End, Duration_min, Size, Samples
+    (+ Phase of the bout start when `phase_col` is given, + Gap_Before_min).
+
+    `interval` is the sampling interval (default: median step of the data), or
+    one per animal (Series indexed by the first `by` key, tse_calo.sampling);
+    each sample stands for one interval, so a single-sample bout lasts one interval.
+    """
+    by = list(by)
+    cols = by + [time_col, value_col] + ([phase_col] if phase_col else [])
+    data = df.loc[df[time_col].notna(), cols].sort_values(by + [time_col], kind="stable")
+
+    t = data[time_col].to_numpy(dtype="datetime64[ns]")
+    values = pd.to_numeric(data[value_col], errors="coerce").to_numpy(dtype=float)
+    keys = data[by].to_numpy()
+
+    same_animal = np.ones(len(data), dtype=bool)
+    if len(data):
+        same_animal[0] = False
+        same_animal[1:] = (keys[1:] == keys[:-1]).all(axis=1)
+
+    if interval is None:
+        steps = np.diff(t)[same_animal[1:]] if len(t) > 1 else np.array([], dtype="timedelta64[ns]")
+        interval = pd.Timedelta(np.median(steps)) if len(steps) else pd.Timedelta(0)
+    if isinstance(interval, pd.Series):
+        step = interval.reindex(data[by[0]].to_numpy()).to_numpy(dtype="timedelta64[ns]")
+    else:
+        step = np.full(len(data), np.timedelta64(pd.Timedelta(interval).value, "ns"))
+    min_gap = pd.Timedelta(min_gap)
+
+    # --------------------------
+    # Run-length encoding on the active samples only
+    active = np.nan_to_num(values, nan=-np.inf) > threshold
+    idx = np.flatnonzero(active)
+    t_act = t[idx]
+
+    new_animal = np.ones(len(idx), dtype=bool)
+    new_animal[1:] = (keys[idx][1:] != keys[idx][:-1]).any(axis=1)
+    gap = np.zeros(len(idx), dtype="timedelta64[ns]")
+    gap[1:] = t_act[1:] - t_act[:-1] - step[idx][1:]
+    starts = new_animal | (gap >= np.timedelta64(min_gap.value, "ns"))
+    bout_id = np.cumsum(starts) - 1
+
+    active_rows = data.iloc[idx]
+    grouped = pd.DataFrame({
+        "Bout": bout_id,
+        "Start": t_act,
+        "Size": values[idx],
+    }).groupby("Bout", sort=True)
+
+    bouts = active_rows[by].iloc[np.flatnonzero(starts)].reset_index(drop=True)
+    bouts["Bout"] = np.arange(len(bouts))
+    bouts["Start"] = grouped["Start"].min().to_numpy()
+    bouts["End"] = grouped["Start"].max().to_numpy() + step[idx][starts]
+    bouts["Duration_min"] = (bouts["End"] - bouts["Start"]).dt.total_seconds() / 60
+    bouts["Size"] = grouped["Size"].sum().to_numpy()
+    bouts["Samples"] = grouped["Size"].size().to_numpy()
+    if phase_col:
+        bouts["Phase"] = active_rows[phase_col].to_numpy()[starts]
+
+    if min_size > 0:
+        bouts = bouts[bouts["Size"] >= min_size].reset_index(drop=True)
+
+    # Time since the end of the previous bout of the same animal
+    prev_end = bouts.groupby(by, sort=False, observed=True)["End"].shift()
+    bouts["Gap_Before_min"] = (bouts["Start"] - prev_end).dt.total_seconds() / 60
+    return bouts
+
+
+def summarize_bouts(bouts, by=("Animal",), phase_col="Phase"):
+    """Count, total / mean size, mean duration and mean inter-bout interval per animal (× phase)."""
+    keys = list(by) + ([phase_col] if phase_col and phase_col in bouts.columns else [])
+    return (
+        bouts.groupby(keys, observed=True)
+        .agg(Count=("Bout", "size"),
+             Total_Size=("Size", "sum"),
+             Mean_Size=("Size", "mean"),
+             Mean_Duration_min=("Duration_min", "mean"),
+             Mean_Interval_min=("Gap_Before_min", "mean"))
+        .reset_index()
+    )
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Cross-experiment catalog in an embedded SQLite database
+Created by Pablo SAIDI
+
+Every analysis run registers what it computed in one local database
+(tse_catalog.sqlite in the output folder), so cohorts can be compared
+without opening the workbooks of each run:
+
+    experiments   one row per run: export name, script, start day, source file
+    animals       group of each animal (from the <file>_groups sidecar, if any)
+    samples       cleaned rows of the export (one row per animal × sample)
+    hourly        hourly values (one row per animal × hour)
+
+Each row carries the biological day (starting at 07:00), the ZT hour (0 =
+lights on), the light cycle of the day (LD12:12 / DD / LD1:1, when the
+script knows it) and one column per metric; hourly EE is always the mean
+rate of the hour (kcal/h), whether the script summed or averaged it (a sum
+is divided by the samples it holds, so partial hours and gaps keep their
+rate), so runs of different scripts compare. Rows are indexed by experiment,
+animal, day and ZT, and by cycle and day. Running a script again on the
+same export replaces its previous rows. Queries return one row per value
+(metric, value), so any metric selection has the same shape:
+
+    from tse_calo.catalog import query
+    query("EE", cycle="DD", group="KO", start="2025-01-01", end="2025-12-31")
+
+The database is chosen per run with TSE_CATALOG (a path; 0 / off disables
+the registration).
+"""
+
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from tse_calo.groups import find_sidecar, read_groups
+from tse_calo.light import LIGHTS_ON_HOUR
+from tse_calo.profiling import stage
+
+CATALOG_NAME = "tse_catalog.sqlite"
+CYCLE_NAMES = {"1": "LD1:1", "2": "DD", "3": "LD12:12"}
+METRICS = ("RER", "XT_YT", "Feed_diff", "EE", "VO2", "VCO2", "Feed", "Activity")
+TABLES = ("samples", "hourly")
+EPOCH = pd.Timestamp("1970-01-01")  # datetime column: seconds since EPOCH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiments (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    script TEXT NOT NULL,
+    start_day TEXT NOT NULL DEFAULT '',
+    source TEXT,
+    registered TEXT,
+    UNIQUE (name, script, start_day)
+);
+CREATE TABLE IF NOT EXISTS animals (
+    experiment_id INTEGER NOT NULL REFERENCES experiments (id),
+    animal INTEGER NOT NULL,
+    grp TEXT,
+    PRIMARY KEY (experiment_id, animal)
+);
+"""
+KEYS = ("experiment_id", "animal", "datetime", "day", "zt", "cycle")
+VALUES_TABLE = """
+CREATE TABLE IF NOT EXISTS {table} (
+    experiment_id INTEGER NOT NULL REFERENCES experiments (id),
+    animal INTEGER NOT NULL,
+    datetime INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    zt INTEGER NOT NULL,
+    cycle TEXT,
+    """ + ",\n    ".join(f"{m} REAL" for m in METRICS) + """
+);
+CREATE INDEX IF NOT EXISTS {table}_experiment ON {table} (experiment_id, animal, day, zt);
+CREATE INDEX IF NOT EXISTS {table}_cycle ON {table} (cycle, day, zt);
+"""
+
+
+def catalog_path(default_folder, value=None):
+    """Database of this run: TSE_CATALOG, else <default_folder>/tse_catalog.sqlite; None when disabled."""
+    if value is None:
+        value = os.environ.get("TSE_CATALOG", "")
+    value = str(value).strip()
+    if value.lower() in ("0", "false", "no", "off"):
+        return None
+    return value or os.path.join(default_folder, CATALOG_NAME)
+
+
+def connect(path):
+    """Open (and create if needed) the catalog database."""
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    con = sqlite3.connect(path)
+    con.execute("PRAGMA journal_mode = WAL")
+    con.execute("PRAGMA synchronous = NORMAL")
+    con.executescript(SCHEMA + "".join(VALUES_TABLE.format(table=t) for t in TABLES))
+    return con
+
+
+# --------------------------
+# 📥 Registration
+def _table_rows(df, cycle):
+    """Frame (Animal, DateTime, metric columns) → columns of a values table, without experiment_id."""
+    df = df.dropna(subset=["DateTime"])
+    if df.empty:
+        return None
+
+    bio = df["DateTime"] - pd.Timedelta(hours=LIGHTS_ON_HOUR)
+    keys = pd.DataFrame({
+        "animal": df["Animal"].astype(int).to_numpy(),
+        "datetime": ((df["DateTime"] - EPOCH) // pd.Timedelta(seconds=1)).to_numpy(),
+        "day": bio.dt.strftime("%Y-%m-%d").to_numpy(),
+        "zt": bio.dt.hour.to_numpy(),
+    })
+    if "CycleType" in df.columns:
+        codes = df["CycleType"].astype(str).to_numpy()
+    elif isinstance(cycle, dict):  # biological day (date) → cycle code
+        codes = bio.dt.date.map(lambda d: cycle.get(d)).astype(str).to_numpy()
+    else:
+        codes = [str(cycle)] * len(df)
+    keys["cycle"] = pd.Series(codes).map(CYCLE_NAMES).to_numpy()
+    for metric in METRICS:
+        keys[metric] = df[metric].to_numpy(dtype="float64") if metric in df.columns else np.nan
+    return keys
+
+
+def _hourly_rates(hourly, how):
+    """Hourly EE as kcal/h: an hourly sum divided by its 15-min samples (EE_samples, tse_calo.sampling.rate_samples)."""
+    if hourly is None or "EE" not in hourly.columns or (how or {}).get("EE", "mean") != "sum":
+        return hourly
+    if "EE_samples" not in hourly.columns:
+        raise ValueError("❌ An hourly EE sum needs its EE_samples column (tse_calo.sampling.rate_samples) "
+                         "to be stored as kcal/h")
+    samples = hourly["EE_samples"].where(hourly["EE_samples"] > 0)
+    return hourly.assign(EE=hourly["EE"] / samples)
+
+
+def register(name, script, samples=None, hourly=None, start_day=None, source=None,
+             groups=None, cycle=None, path=None, how=None):
+    """
+    Register the rows of one run and return its experiment id (None when
+    the catalog is disabled). `samples` / `hourly`: frames with Animal,
+    DateTime and metric columns. `how`: aggregation of the hourly metrics
+    ({metric: "sum" / "mean"}, mean by default); an hourly EE sum comes with
+    its EE_samples column and is stored as kcal/h (sum / samples). `cycle`:
+    light cycle code of the rows ("1" / "2" / "3"), or a dict biological
+    day → code; a CycleType column takes precedence. `groups`: Animal /
+    Group table, read from the sidecar of `source` when not given. A
+    previous registration of the same name, script and start day is
+    replaced.
+    """
+    if path is None:
+        return None
+    if groups is None and source:
+        sidecar = find_sidecar(source)
+        groups = read_groups(sidecar) if sidecar else None
+
+    hourly = _hourly_rates(hourly, how)
+
+    t0 = time.perf_counter()
+    with stage("catalog"):
+        con = connect(path)
+        try:
+            with con:
+                key = (name, script, str(start_day or ""))
+                old = con.execute("SELECT id FROM experiments WHERE name = ? AND script = ? AND start_day = ?",
+                                  key).fetchone()
+                if old:
+                    for table in ("animals",) + TABLES:
+                        con.execute(f"DELETE FROM {table} WHERE experiment_id = ?", old)
+                    con.execute("DELETE FROM experiments WHERE id = ?", old)
+                cur = con.execute(
+                    "INSERT INTO experiments (name, script, start_day, source, registered) VALUES (?, ?, ?, ?, ?)",
+                    key + (source, datetime.now().isoformat(timespec="seconds")))
+                exp_id = cur.lastrowid
+
+                frames = [f for f in (samples, hourly) if f is not None]
+                animals = sorted({int(a) for f in frames for a in f["Animal"].dropna().unique()})
+                group_of = {}
+                if groups is not None:
+                    group_of = dict(zip(groups["Animal"].astype(int), groups["Group"].astype(str)))
+                con.executemany("INSERT INTO animals VALUES (?, ?, ?)",
+                                [(exp_id, a, group_of.get(a)) for a in animals])
+
+                counts = {}
+                for table, frame in zip(TABLES, (samples, hourly)):
+                    rows = _table_rows(frame, cycle) if frame is not None else None
+                    if rows is None:
+                        continue
+                    rows.insert(0, "experiment_id", exp_id)
+                    # Plain Python values (tolist) insert several times faster than numpy scalars
+                    columns = [rows[c].to_numpy().tolist() for c in rows.columns]
+                    con.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(columns))})", zip(*columns))
+                    counts[table] = len(rows)
+        finally:
+            con.close()
+
+    summary = ", ".join(f"{n} {t} rows" for t, n in counts.items()) or "no values"
+    print(f"🗃️ Catalog: {name} ({script}) registered, {summary} in {time.perf_counter() - t0:.1f} s → {path}")
+    return exp_id
+
+
+# --------------------------
+# 🔎 Queries
+def _as_list(value):
+    return None if value is None else [value] if isinstance(value, (str, int)) else list(value)
+
+
+def query(metric=None, table="hourly", experiment=None, script=None, animals=None, group=None,
+          cycle=None, start=None, end=None, zt=None, path=None):
+    """
+    Values of the catalog as a DataFrame (experiment, script, start_day,
+    animal, group, datetime, day, zt, cycle, metric, value). Every filter is
+    optional and takes one value or a list: `experiment` (SQL LIKE patterns,
+    e.g. "PS 2025%"), `cycle` ("DD", "LD12:12", "LD1:1"), `start` / `end`
+    (biological days, inclusive, "YYYY-MM-DD"), `zt` (0–23). `path`:
+    TSE_CATALOG, else tse_catalog.sqlite in the current folder.
+    """
+    path = path or catalog_path(os.getcwd())
+    if table not in TABLES:
+        raise ValueError(f"❌ Unknown table '{table}'. Choose among: {', '.join(TABLES)}")
+    metrics = _as_list(metric) or list(METRICS)
+    unknown = [m for m in metrics if m not in METRICS]
+    if unknown:
+        raise ValueError(f"❌ Unknown metric(s) {unknown}. Choose among: {', '.join(METRICS)}")
+    where, params = [], []
+
+    def condition(column, values, op="="):
+        values = _as_list(values)
+        if values:
+            where.append("(" + " OR ".join(f"{column} {op} ?" for _ in values) + ")")
+            params.extend(values)
+
+    condition("e.name", experiment, "LIKE")
+    condition("e.script", script)
+    condition("v.animal", animals)
+    condition("a.grp", group)
+    condition("v.cycle", cycle)
+    condition("v.zt", zt)
+    if start is not None:
+        where.append("v.day >= ?")
+        params.append(str(start))
+    if end is not None:
+        where.append("v.day <= ?")
+        params.append(str(end))
+
+    sql = ("SELECT e.name AS experiment, e.script, e.start_day, v.animal, a.grp AS \"group\", v.datetime, "
+           f"v.day, v.zt, v.cycle, {', '.join('v.' + m for m in metrics)} FROM {table} v "
+           "JOIN experiments e ON e.id = v.experiment_id "
+           "LEFT JOIN animals a ON a.experiment_id = v.experiment_id AND a.animal = v.animal"
+           + (" WHERE " + " AND ".join(where) if where else "")
+           + " ORDER BY e.name, e.script, e.start_day, v.animal, v.datetime")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"❌ Catalog not found: {path}")
+    con = sqlite3.connect(path)
+    try:
+        result = pd.read_sql_query(sql, con, params=params)
+    finally:
+        con.close()
+    result["datetime"] = EPOCH + pd.to_timedelta(result["datetime"], unit="s")
+
+    # One row per value; metrics a run did not compute (NULL) are left out
+    ids = [c for c in result.columns if c not in metrics]
+    result = result.melt(id_vars=ids, value_vars=metrics, var_name="metric", value_name="value")
+    result = result.dropna(subset=["value"])
+    return result.sort_values(["experiment", "script", "start_day", "animal", "datetime"], kind="stable",
+                              ignore_index=True)
+
+
+def experiments(path=None):
+    """Registered runs with their number of animals."""
+    path = path or catalog_path(os.getcwd())
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"❌ Catalog not found: {path}")
+    con = sqlite3.connect(path)
+    try:
+        return pd.read_sql_query(
+            "SELECT e.*, COUNT(a.animal) AS animals FROM experiments e "
+            "LEFT JOIN animals a ON a.experiment_id = e.id GROUP BY e.id ORDER BY e.name, e.script, e.start_day", con)
+    finally:
+        con.close()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Batched cosinor analysis (mesor / amplitude / acrophase)
+Created by Pablo SAIDI
+
+Model for each animal × day × metric:
+    y(t) = M + b*cos(2πt/P) + g*sin(2πt/P)
+with t in hours since the start of the biological day (07:00 = ZT00).
+
+The fit is linear least squares, so instead of looping over the fits we
+accumulate the normal-equation sums of every (animal, day, metric) in one
+grouped pass and solve all the 3×3 systems at once with np.linalg.solve.
+"""
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_METRICS = ["RER", "XT_YT", "Feed_diff", "EE"]
+
+# Order of the per-row sums (all masked by the metric's NaN)
+_SUMS = ["n", "c", "s", "cc", "ss", "cs", "y", "yc", "ys", "yy"]
+
+
+def fit_cosinor(df, metrics=None, period=24.0, time_col="DateTime", by=("Animal",), day_start_hour=7):
+    """
+    Fit a cosinor to every `by` group × biological day × metric in one batch.
+
+    Returns a tidy table with one row per fit:
+    by..., Day, Metric, N, Mesor, Amplitude, Acrophase_ZT (h), R2, Period
+    Fits with fewer than 3 valid points (or a singular design) are NaN.
+    """
+    by = list(by)
+    metrics = [m for m in (metrics or DEFAULT_METRICS) if m in df.columns]
+    if not metrics:
+        raise ValueError("❌ None of the requested metrics are present for the cosinor fit.")
+
+    data = df.loc[df[time_col].notna(), by + [time_col] + metrics]
+    t_shifted = data[time_col] - pd.Timedelta(hours=day_start_hour)
+    day = t_shifted.dt.normalize()
+    hours = ((t_shifted - day).dt.total_seconds() / 3600.0).to_numpy()
+
+    # --------------------------
+    # Group codes for (by..., Day)
+    keys = data[by].assign(Day=day.dt.date)
+    grouped = keys.groupby(by + ["Day"], sort=True, observed=True)
+    codes = grouped.ngroup().to_numpy()
+    groups = grouped.size().index.to_frame(index=False)
+    n_groups, n_metrics = len(groups), len(metrics)
+
+    omega = 2.0 * np.pi / period
+    c = np.cos(omega * hours)
+    s = np.sin(omega * hours)
+
+    y = data[metrics].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    valid = np.isfinite(y)
+    y = np.where(valid, y, 0.0)
+    w = valid.astype(float)
+
+    # Per-row terms (rows, metrics, sums), then one grouped sum
+    terms = np.stack([
+        w,
+        w * c[:, None],
+        w * s[:, None],
+        w * (c * c)[:, None],
+        w * (s * s)[:, None],
+        w * (c * s)[:, None],
+        y,
+        y * c[:, None],
+        y * s[:, None],
+        y * y,
+    ], axis=2)
+    sums = (
+        pd.DataFrame(terms.reshape(len(data), -1))
+        .groupby(codes).sum()
+        .to_numpy()
+        .reshape(n_groups, n_metrics, len(_SUMS))
+    )
+    S = {name: sums[..., i] for i, name in enumerate(_SUMS)}
+
+    # --------------------------
+    # Batched normal equations
+    XtX = np.stack([
+        np.stack([S["n"], S["c"], S["s"]], axis=-1),
+        np.stack([S["c"], S["cc"], S["cs"]], axis=-1),
+        np.stack([S["s"], S["cs"], S["ss"]], axis=-1),
+    ], axis=-2)
+    Xty = np.stack([S["y"], S["yc"], S["ys"]], axis=-1)
+
+    solvable = (S["n"] >= 3) & (np.abs(np.linalg.det(XtX)) > 1e-9)
+    XtX[~solvable] = np.eye(3)
+    beta = np.linalg.solve(XtX, Xty[..., None])[..., 0]
+    beta[~solvable] = np.nan
+
+    mesor, b, g = beta[..., 0], beta[..., 1], beta[..., 2]
+    amplitude = np.hypot(b, g)
+    acrophase = (np.arctan2(g, b) / omega) % period
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        tss = S["yy"] - S["y"] ** 2 / S["n"]
+        rss = S["yy"] - np.sum(beta * Xty, axis=-1)
+        r2 = np.where(tss > 0, 1.0 - rss / tss, np.nan)
+
+    # --------------------------
+    # Tidy table
+    out = groups.loc[np.repeat(np.arange(n_groups), n_metrics)].reset_index(drop=True)
+    out["Metric"] = np.tile(metrics, n_groups)
+    out["N"] = S["n"].ravel().astype(int)
+    out["Mesor"] = mesor.ravel()
+    out["Amplitude"] = amplitude.ravel()
+    out["Acrophase_ZT"] = acrophase.ravel()
+    out["R2"] = r2.ravel()
+    out["Period"] = period
+    return out
+
+
+def cosinor_curve(fit, times, day_start_hour=7):
+    """Evaluate one fitted row (Mesor / Amplitude / Acrophase_ZT / Period / Day) at `times`."""
+    day_start = pd.Timestamp(fit["Day"]) + pd.Timedelta(hours=day_start_hour)
+    t = (pd.DatetimeIndex(times) - day_start).total_seconds() / 3600.0
+    return fit["Mesor"] + fit["Amplitude"] * np.cos(2.0 * np.pi * (t - fit["Acrophase_ZT"]) / fit["Period"])
+
+
+def plot_cosinor_overlay(ax, fits, color="black", points=97, day_start_hour=7):
+    """Draw the fitted curve of each row of `fits` (one per day) over its own 24 h window."""
+    for _, fit in fits.iterrows():
+        if not np.isfinite(fit["Mesor"]):
+            continue
+        day_start = pd.Timestamp(fit["Day"]) + pd.Timedelta(hours=day_start_hour)
+        times = pd.date_range(day_start, day_start + pd.Timedelta(hours=24), periods=points)
+        ax.plot(times, cosinor_curve(fit, times, day_start_hour), color=color,
+                linestyle="--", linewidth=1.2, alpha=0.8, label="_cosinor")
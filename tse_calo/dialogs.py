@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Dialogs of the scripts, answerable from the command line
+Created by Pablo SAIDI
+
+Drop-in for the tkinter names the scripts use (`Tk`, `filedialog`,
+`simpledialog`, `messagebox`). The command-line arguments of the script
+answer its dialogs in the order they appear, so batch runs never load tkinter:
+
+    python TSE_4_Days_raw.py data.xlsx 2025-10-14 2
+    python TSE_Add_EE.py data.xlsx y
+
+Yes/no questions take y / n (o / oui also work), an empty argument ("")
+cancels a file dialog or leaves an optional number empty. When no answer
+is left, the usual window opens (tkinter is imported at that moment).
+"""
+
+import sys
+from types import SimpleNamespace
+
+from tse_calo.lazy import lazy_import
+
+tkinter = lazy_import("tkinter")
+_filedialog = lazy_import("tkinter.filedialog")
+_simpledialog = lazy_import("tkinter.simpledialog")
+_messagebox = lazy_import("tkinter.messagebox")
+
+YES = ("y", "yes", "o", "oui", "1", "true")
+
+_answers = None
+_root = None
+
+
+def _next_answer():
+    """Next command-line answer, or None when they are all used (→ real dialog)."""
+    global _answers
+    if _answers is None:
+        _answers = list(sys.argv[1:])
+    return _answers.pop(0) if _answers else None
+
+
+def _hidden_root():
+    """Hidden, topmost root window for the real dialogs (created once)."""
+    global _root
+    if _root is None:
+        _root = tkinter.Tk()
+        _root.withdraw()
+        _root.attributes("-topmost", True)
+    return _root
+
+
+def askopenfilename(**options):
+    answer = _next_answer()
+    if answer is not None:
+        return answer
+    _hidden_root()
+    return _filedialog.askopenfilename(**options)
+
+
+def askdirectory(**options):
+    answer = _next_answer()
+    if answer is not None:
+        return answer
+    _hidden_root()
+    return _filedialog.askdirectory(**options)
+
+
+def askstring(title, prompt, **options):
+    answer = _next_answer()
+    if answer is not None:
+        return answer
+    _hidden_root()
+    return _simpledialog.askstring(title, prompt, **options)
+
+
+def askfloat(title, prompt, **options):
+    answer = _next_answer()
+    if answer is not None:
+        return float(answer.replace(",", ".")) if answer.strip() else None
+    _hidden_root()
+    return _simpledialog.askfloat(title, prompt, **options)
+
+
+def askyesno(title, message, **options):
+    answer = _next_answer()
+    if answer is not None:
+        return answer.strip().lower() in YES
+    _hidden_root()
+    return _messagebox.askyesno(title, message, **options)
+
+
+class Tk:
+    """`Tk().withdraw()` / `root.destroy()` of the scripts: the real window only exists if a dialog opened."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def withdraw(self):
+        pass
+
+    def attributes(self, *args):
+        pass
+
+    def call(self, *args):
+        pass
+
+    def destroy(self):
+        global _root
+        if _root is not None:
+            _root.destroy()
+            _root = None
+
+
+filedialog = SimpleNamespace(askopenfilename=askopenfilename, askdirectory=askdirectory)
+simpledialog = SimpleNamespace(askstring=askstring, askfloat=askfloat)
+messagebox = SimpleNamespace(askyesno=askyesno)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Energy expenditure (EE) from VO2 / VCO2 and body weight
+Created by Pablo SAIDI
+
+TSE exports VO2 and VCO2 normalized to body weight [ml/h/kg], so:
+
+    Weir (abbreviated):  EE [kcal/h] = (3.941*VO2 + 1.106*VCO2) / 1000 * weight[g] / 1000
+    Legacy:              EE [kcal/h] = VO2 * weight[g] * 0.000005      (previous TSE_Add_EE.py)
+
+Body weight is either one static value per box or a time series of
+weigh-ins, linearly interpolated between weigh-ins through an as-of join
+(held constant before the first and after the last weigh-in). With a single
+weigh-in per animal the result is identical to the static weight.
+"""
+
+import numpy as np
+import pandas as pd
+
+WEIR_VO2 = 3.941
+WEIR_VCO2 = 1.106
+LEGACY_FACTOR = 0.000005
+
+
+def energy_expenditure(vo2, weight_g, vco2=None, formula="weir"):
+    """EE [kcal/h] for every row at once (NaN where an input is missing)."""
+    vo2 = np.asarray(vo2, dtype=float)
+    weight_g = np.asarray(weight_g, dtype=float)
+    if formula == "legacy":
+        return vo2 * weight_g * LEGACY_FACTOR
+    if formula == "weir":
+        if vco2 is None:
+            raise ValueError("❌ The Weir equation needs the VCO2 column.")
+        vco2 = np.asarray(vco2, dtype=float)
+        return (WEIR_VO2 * vo2 + WEIR_VCO2 * vco2) / 1000.0 * weight_g / 1000.0
+    raise ValueError(f"❌ Unknown EE formula '{formula}' (use weir or legacy).")
+
+
+def weight_series(animals, times, weighins):
+    """
+    Body weight [g] of every (animal, time) row.
+
+    `weighins` has the columns Animal, Weight and optionally DateTime.
+    Without DateTime (or with one weigh-in per animal) the weight is constant.
+    Animals without any weigh-in, and undated rows when weigh-ins are dated, get NaN.
+    """
+    rows = pd.DataFrame({"Animal": np.asarray(animals), "DateTime": pd.to_datetime(np.asarray(times))})
+    rows["_row"] = np.arange(len(rows))
+    w = weighins.dropna(subset=["Weight"]).copy()
+    w["Animal"] = w["Animal"].astype(rows["Animal"].dtype)
+    w["Weight"] = w["Weight"].astype(float)
+
+    if "DateTime" not in w.columns or w["DateTime"].isna().all():
+        static = w.drop_duplicates("Animal", keep="last").set_index("Animal")["Weight"]
+        return rows["Animal"].map(static).to_numpy(dtype=float)
+
+    w["DateTime"] = pd.to_datetime(w["DateTime"])
+    w = w.dropna(subset=["DateTime"]).sort_values("DateTime")
+    left = rows.dropna(subset=["DateTime"]).sort_values("DateTime")
+
+    prev = pd.merge_asof(left, w.rename(columns={"DateTime": "T0", "Weight": "W0"}),
+                         left_on="DateTime", right_on="T0", by="Animal", direction="backward")
+    nxt = pd.merge_asof(left, w.rename(columns={"DateTime": "T1", "Weight": "W1"}),
+                        left_on="DateTime", right_on="T1", by="Animal", direction="forward")
+    both = prev.merge(nxt[["_row", "T1", "W1"]], on="_row")
+
+    # Hold the first / last weigh-in outside the weighed period
+    both["W0"] = both["W0"].fillna(both["W1"])
+    both["T0"] = both["T0"].fillna(both["T1"])
+    both["W1"] = both["W1"].fillna(both["W0"])
+    both["T1"] = both["T1"].fillna(both["T0"])
+
+    span = (both["T1"] - both["T0"]).dt.total_seconds().to_numpy()
+    done = (both["DateTime"] - both["T0"]).dt.total_seconds().to_numpy()
+    w0, w1 = both["W0"].to_numpy(), both["W1"].to_numpy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weight = np.where((span > 0) & (w0 != w1), w0 + (w1 - w0) * done / span, w0)
+
+    out = np.full(len(rows), np.nan)
+    out[both["_row"].to_numpy()] = weight
+    return out
+
+
+def read_weighins(path):
+    """Weigh-in sidecar (csv/xlsx) with the columns Animal (or Box), Weight and optional Date/DateTime."""
+    if path.lower().endswith(".csv"):
+        w = pd.read_csv(path, sep=None, engine="python")
+    else:
+        w = pd.read_excel(path)
+    w.columns = w.columns.str.strip()
+    w = w.rename(columns={"Box": "Animal", "Date": "DateTime"})
+    if not {"Animal", "Weight"} <= set(w.columns):
+        raise ValueError(f"❌ Weight file {path} must have the columns Animal (or Box) and Weight.")
+    w = w[pd.to_numeric(w["Animal"], errors="coerce").notna()].copy()
+    w["Animal"] = w["Animal"].astype(int)
+    w["Weight"] = pd.to_numeric(w["Weight"], errors="coerce")
+    if "DateTime" in w.columns:
+        w["DateTime"] = pd.to_datetime(w["DateTime"].astype(str).str.strip(), format="mixed", errors="coerce")
+    return w
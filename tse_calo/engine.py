@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Execution backend of the cleaning / aggregation chain (pandas or Polars)
+Created by Pablo SAIDI
+
+The scripts share the same chain once the export is parsed: sort by
+Animal / DateTime, grouped Feed difference, negative steps clipped to 0,
+optional exclusion of steps > 2 g, XT+YT scaling, window selection and
+grouped hourly aggregation. `prepare` and `aggregate` run it with pandas
+(default) or with Polars lazy frames (multi-threaded, query-optimised),
+chosen per run with the TSE_BACKEND environment variable:
+
+    TSE_BACKEND=polars python TSE_One_Day_mean.py
+
+Both backends return the same pandas frames: the Polars plan only works on
+the columns it needs and hands back row positions and derived columns, so
+categories and dtypes of the input are kept. `compare_backends` checks the
+two paths against each other (benchmarks/check_backends.py runs it on
+several synthetic exports, benchmarks/bench_backend.py times them).
+
+Only the scripts of BACKEND_SCRIPTS run their chain through this module;
+the others clean the export with pandas and say so (`warn_pandas_only`)
+when TSE_BACKEND asks for another backend.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from tse_calo.lazy import lazy_import
+from tse_calo.profiling import stage
+from tse_calo.sampling import row_shift
+
+pl = lazy_import("polars")
+
+BACKENDS = ("pandas", "polars")
+BACKEND_SCRIPTS = ("TSE_One_Day_mean.py", "TSE_All_Graph_mean.py")
+XT_YT_SCALE = 8000
+FEED_MAX = 2
+
+
+def backend(value=None):
+    """Backend of this run (TSE_BACKEND, default: pandas)."""
+    if value is None:
+        value = os.environ.get("TSE_BACKEND", "")
+    value = str(value).strip().lower() or "pandas"
+    if value not in BACKENDS:
+        raise ValueError(f"❌ Unknown backend '{value}'. Choose among: {', '.join(BACKENDS)}")
+    if value == "polars":
+        try:
+            import polars  # noqa: F401
+        except ImportError:
+            raise ImportError("❌ TSE_BACKEND=polars needs the polars package (pip install polars).")
+    return value
+
+
+def warn_pandas_only(script):
+    """Tell that TSE_BACKEND is not honoured by `script`, which cleans the export with pandas."""
+    value = os.environ.get("TSE_BACKEND", "").strip().lower() or "pandas"
+    if value != "pandas":
+        print(f"⚠️ TSE_BACKEND={value} is ignored by {script}: the export is cleaned with pandas "
+              f"(TSE_BACKEND is used by {', '.join(BACKEND_SCRIPTS)})")
+
+
+# --------------------------
+# 🧹 Feed difference, scaling and window selection
+def timestamp_shift(df, offset_minutes):
+    """Timestamp correction: one value in minutes, or a Series animal → minutes (tse_calo.sampling.window_shift)."""
+    if isinstance(offset_minutes, pd.Series):
+        return row_shift(df, pd.to_timedelta(offset_minutes, unit="m"))
+    return pd.to_timedelta(offset_minutes, unit="m")
+
+
+def _prepare_pandas(df, exclude_feed, offset_minutes, start, end):
+    df = df.sort_values(["Animal", "DateTime"])  # new data: derived columns below never write into the caller's frame
+
+    df["Feed_diff"] = df.groupby("Animal", observed=True)["Feed"].diff()
+    df.loc[df["Feed_diff"] < 0, "Feed_diff"] = 0
+    if exclude_feed:
+        df["Feed_diff"] = df["Feed_diff"].where(df["Feed_diff"] <= FEED_MAX, None)
+
+    df["XT_YT"] = df["XT_YT"] / XT_YT_SCALE
+    df["DateTime_shifted"] = df["DateTime"] - timestamp_shift(df, offset_minutes)
+
+    if start is not None:
+        df = df[(df["DateTime_shifted"] >= start) & (df["DateTime_shifted"] < end)]
+        df["Relative_Hour"] = ((df["DateTime_shifted"] - start).dt.total_seconds() // 3600).astype(int)
+    return df
+
+
+def _prepare_polars(df, exclude_feed, offset_minutes, start, end):
+    shift = timestamp_shift(df, offset_minutes)
+    shifted_dtype = (df["DateTime"].iloc[:0] - (shift.iloc[:0] if isinstance(shift, pd.Series) else shift)).dtype
+    frame = df[["Animal", "DateTime", "Feed"]].reset_index(drop=True)
+    if isinstance(shift, pd.Series):  # one shift per animal: a column of the plan
+        frame["_shift"], shift = shift.to_numpy(), pl.col("_shift")
+    plan = (
+        pl.from_pandas(frame)
+        .lazy()
+        .with_row_index("_row")
+        .sort(["Animal", "DateTime"], nulls_last=True, maintain_order=True)
+        .with_columns(
+            pl.col("Feed").diff().over("Animal").alias("Feed_diff"),
+            (pl.col("DateTime") - shift).alias("DateTime_shifted"),
+        )
+        .with_columns(
+            pl.when(pl.col("Feed_diff") < 0).then(0.0).otherwise(pl.col("Feed_diff")).alias("Feed_diff")
+        )
+    )
+    if exclude_feed:
+        plan = plan.with_columns(
+            pl.when(pl.col("Feed_diff") > FEED_MAX).then(None).otherwise(pl.col("Feed_diff")).alias("Feed_diff")
+        )
+    columns = ["_row", "Feed_diff", "DateTime_shifted"]
+    if start is not None:
+        plan = plan.filter((pl.col("DateTime_shifted") >= start) & (pl.col("DateTime_shifted") < end))
+        plan = plan.with_columns(
+            ((pl.col("DateTime_shifted") - start).dt.total_seconds() // 3600).alias("Relative_Hour")
+        )
+        columns.append("Relative_Hour")
+    derived = plan.select(columns).collect()
+
+    # Rows of the input in the computed order, derived columns in the pandas dtypes
+    # (XT_YT is scaled here: Polars divides float32 with a 1-ulp difference)
+    out = df.iloc[derived["_row"].to_numpy()]
+    out["Feed_diff"] = derived["Feed_diff"].to_numpy().astype("float64")
+    out["XT_YT"] = out["XT_YT"] / XT_YT_SCALE
+    out["DateTime_shifted"] = derived["DateTime_shifted"].to_numpy().astype(shifted_dtype)
+    if start is not None:
+        out["Relative_Hour"] = derived["Relative_Hour"].to_numpy().astype(int)
+    return out
+
+
+def prepare(df, exclude_feed=False, offset_minutes=0.0, start=None, end=None, engine=None):
+    """
+    Parsed (compact) frame → rows sorted by Animal / DateTime with Feed_diff
+    (clipped at 0, > 2 g removed when `exclude_feed`), XT_YT / 8000 and
+    DateTime_shifted (DateTime - offset_minutes: one value, or a Series
+    animal → minutes when the sampling interval differs between animals).
+    With `start` / `end`, only the rows with start <= DateTime_shifted < end
+    are kept and Relative_Hour (whole hours since start) is added.
+    """
+    engine = backend(engine)
+    with stage(f"prepare_{engine}"):
+        if engine == "polars":
+            return _prepare_polars(df, exclude_feed, offset_minutes, start, end)
+        return _prepare_pandas(df, exclude_feed, offset_minutes, start, end)
+
+
+def window(df, start, end, offset_minutes=0.0):
+    """
+    Rows of a frame prepared without window whose DateTime - offset_minutes
+    falls in [start, end), with DateTime_shifted and Relative_Hour: the rows
+    of prepare(df, ..., offset_minutes, start, end), without recomputing the
+    Feed differences (windows of one experiment, tse_calo.service).
+    """
+    shifted = df["DateTime"] - timestamp_shift(df, offset_minutes)
+    keep = ((shifted >= start) & (shifted < end)).to_numpy()
+    df = df[keep].assign(DateTime_shifted=shifted[keep])
+    df["Relative_Hour"] = ((df["DateTime_shifted"] - start).dt.total_seconds() // 3600).astype(int)
+    return df
+
+
+def assign_days(df, day_start_hour=7):
+    """
+    Every 7 AM → 7 AM window of a frame prepared without window, in one
+    pass: each row gets its Day (midnight of the date whose `day_start_hour`
+    starts its window, from DateTime_shifted) and its Relative_Hour. The rows
+    of one Day are those of prepare(..., start=Day + 7 h, end=+24 h); rows
+    without a timestamp are dropped.
+    """
+    since_start = df["DateTime_shifted"] - pd.Timedelta(hours=day_start_hour)
+    day = since_start.dt.floor("D")
+    keep = day.notna().to_numpy()
+    df = df[keep].assign(Day=day[keep])
+    df["Relative_Hour"] = ((since_start[keep] - day[keep]).dt.total_seconds() // 3600).astype(int)
+    return df
+
+
+# --------------------------
+# 📊 Grouped aggregation
+def aggregate(df, by, agg, engine=None):
+    """
+    df.groupby(by).agg(agg).reset_index() (`agg`: column → "mean" / "sum"),
+    keys sorted. Mean skips NaN, an all-NaN sum is 0, as in pandas.
+    """
+    engine = backend(engine)
+    with stage(f"aggregate_{engine}"):
+        if engine == "pandas":
+            return df.groupby(by, observed=True).agg(agg).reset_index()
+
+        keys = df[by].reset_index(drop=True)
+        frame = pl.from_pandas(pd.concat(
+            [keys.apply(_key_codes), df[list(agg)].reset_index(drop=True)], axis=1))
+        exprs = [getattr(pl.col(col), how)().alias(col) for col, how in agg.items()]
+        exprs.append(pl.col("_row").first())
+        result = (
+            frame.lazy()
+            .with_row_index("_row")
+            .drop_nulls(by)
+            .group_by(by)
+            .agg(exprs)
+            .sort(by)
+            .collect()
+        )
+
+        # Keys back to their input values (first row of each group), metrics in the pandas dtypes
+        out = keys.iloc[result["_row"].to_numpy()].reset_index(drop=True)
+        for col, how in agg.items():
+            out[col] = result[col].to_numpy().astype(df[col].dtype if how == "sum" else _mean_dtype(df[col]))
+        return out
+
+
+def _key_codes(values):
+    """Group key as sortable numbers: codes for categories / objects, NA → null (dropped, as in pandas)."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = values.cat.codes
+    elif values.dtype == object:
+        codes = pd.Series(pd.factorize(values, sort=True)[0], index=values.index)
+    else:
+        return values
+    return codes.where(codes >= 0)
+
+
+def _mean_dtype(values):
+    return values.dtype if values.dtype in (np.float32, np.float64) else np.float64
+
+
+# --------------------------
+# ⚖️ Equality of the two backends
+def compare_backends(df, by, agg, rtol=1e-5, **prepare_options):
+    """
+    Run prepare + aggregate with both backends on the same frame. The
+    prepared rows must be identical; aggregates may differ by the summation
+    order (`rtol`). Returns (pandas hourly, polars hourly); raises
+    AssertionError on a mismatch.
+    """
+    prepared = {engine: prepare(df, engine=engine, **prepare_options) for engine in BACKENDS}
+    pd.testing.assert_frame_equal(prepared["pandas"], prepared["polars"], check_exact=True)
+    hourly = {engine: aggregate(prepared[engine], by, agg, engine=engine) for engine in BACKENDS}
+    pd.testing.assert_frame_equal(hourly["pandas"], hourly["polars"], check_exact=False, rtol=rtol)
+    return hourly["pandas"], hourly["polars"]
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Tabular outputs in Excel and columnar binary formats (Parquet / Arrow / HDF5)
+Created by Pablo SAIDI
+
+Every script writes its tables through `write_table` / `write_tables` so the
+same run can produce the usual .xlsx next to typed, zero-parse copies.
+The formats are chosen per run with the TSE_OUTPUT_FORMATS environment
+variable, e.g.:
+
+    TSE_OUTPUT_FORMATS=xlsx,parquet python TSE_One_Day_mean.py
+
+Writes run on the background writer of tse_calo.pipeline (TSE_BACKGROUND_IO):
+the functions return the paths at once and the files are complete after
+pipeline.drain().
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+from tse_calo.pipeline import background
+from tse_calo.profiling import stage
+from tse_calo.schema import copy_on_write
+
+# --------------------------
+# 📦 Supported formats (name → file extension)
+FORMAT_EXTENSIONS = {
+    "xlsx": ".xlsx",
+    "parquet": ".parquet",
+    "arrow": ".arrow",
+    "hdf5": ".h5",
+}
+
+FORMAT_ALIASES = {
+    "excel": "xlsx",
+    "feather": "arrow",
+    "ipc": "arrow",
+    "h5": "hdf5",
+    "hdf": "hdf5",
+}
+
+DEFAULT_FORMATS = ("xlsx",)
+
+
+def output_formats(value=None):
+    """Return the list of output formats for this run (default: Excel only)."""
+    if value is None:
+        value = os.environ.get("TSE_OUTPUT_FORMATS", "")
+    if isinstance(value, str):
+        value = [v for v in value.replace(";", ",").split(",")]
+
+    formats = []
+    for fmt in value:
+        fmt = fmt.strip().lower()
+        if not fmt:
+            continue
+        fmt = FORMAT_ALIASES.get(fmt, fmt)
+        if fmt not in FORMAT_EXTENSIONS:
+            raise ValueError(f"❌ Unknown output format '{fmt}'. Choose among: {', '.join(FORMAT_EXTENSIONS)}")
+        if fmt not in formats:
+            formats.append(fmt)
+
+    return formats or list(DEFAULT_FORMATS)
+
+
+def _columnar_frame(df, index):
+    """Make a frame safe for Arrow/HDF5: index as column, str names, no mixed objects."""
+    if index:
+        df = df.reset_index()
+    df = df.rename(columns=lambda c: str(c))
+
+    for col in df.columns:
+        if df[col].dtype == "object":
+            values = df[col].dropna()
+            kinds = {type(v) for v in values}
+            if len(kinds) > 1 or (kinds and not kinds <= {str, bool}):
+                # Mixed cells (e.g. dates read as text or datetime.time) → text, keeps NA
+                df[col] = df[col].map(lambda v: v if pd.isna(v) else str(v)).astype("string")
+    return df
+
+
+def _significant(values, digits=7):
+    """float32 values as float64 rounded to their significant digits (0.01, not 0.009999999776)."""
+    x = values.to_numpy(dtype="float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        decimals = digits - 1 - np.floor(np.log10(np.abs(x)))
+    scale = 10.0 ** np.where(np.isfinite(decimals), decimals, 0)
+    return pd.Series(np.round(x * scale) / scale, index=values.index, name=values.name)
+
+
+def _excel_frame(df):
+    """Excel stores float64 only: widen the float32 columns of compact frames without binary noise."""
+    narrow = [i for i, dtype in enumerate(df.dtypes) if dtype == "float32"]
+    if not narrow:
+        return df
+    df = df.copy(deep=False)
+    for i in narrow:  # by position: exported tables may repeat a column name
+        df.isetitem(i, _significant(df.iloc[:, i]))
+    return df
+
+
+def _snapshot(df):
+    """The table as it is now, for a background write (shallow under copy-on-write, else a deep copy)."""
+    return df.copy(deep=not copy_on_write())
+
+
+def _write_one(df, path, fmt, index, key, **excel_kwargs):
+    if fmt == "xlsx":
+        _excel_frame(df).to_excel(path, index=index, **excel_kwargs)
+    elif fmt == "parquet":
+        _columnar_frame(df, index).to_parquet(path, index=False)
+    elif fmt == "arrow":
+        _columnar_frame(df, index).to_feather(path)
+    elif fmt == "hdf5":
+        _columnar_frame(df, index).to_hdf(path, key=key, mode="w", format="table")
+
+
+def write_table(df, path, formats=None, index=False, **excel_kwargs):
+    """
+    Write one table in every selected format.
+    `path` is the usual .xlsx path; other formats reuse its stem.
+    Returns the list of files (complete after pipeline.drain()).
+    """
+    stem = os.path.splitext(path)[0]
+    formats = output_formats(formats)
+    background(_write_table, _snapshot(df), stem, formats, index, **excel_kwargs)
+    return [stem + FORMAT_EXTENSIONS[fmt] for fmt in formats]
+
+
+def _write_table(df, stem, formats, index, **excel_kwargs):
+    for fmt in formats:
+        try:
+            with stage(f"write_{fmt}"):
+                _write_one(df, stem + FORMAT_EXTENSIONS[fmt], fmt, index, key="data", **excel_kwargs)
+        except ImportError as e:
+            raise ImportError(f"❌ '{fmt}' output needs an extra package ({e}). "
+                              "Install it (pip install pyarrow tables) or remove it from TSE_OUTPUT_FORMATS.") from e
+
+
+def write_tables(sheets, path, formats=None, index=False, **excel_kwargs):
+    """
+    Write several tables (dict sheet name → DataFrame).
+    xlsx: one workbook with one sheet per table.
+    parquet / arrow: one file per table, named <stem>__<sheet>.<ext>.
+    hdf5: one file with one key per table.
+    """
+    stem = os.path.splitext(path)[0]
+    formats = output_formats(formats)
+    sheets = {sheet_name: _snapshot(df) for sheet_name, df in sheets.items()}
+    background(_write_tables, sheets, stem, formats, index, **excel_kwargs)
+    return [out for fmt in formats for out in _sheet_paths(sheets, stem, fmt)]
+
+
+def _write_tables(sheets, stem, formats, index, **excel_kwargs):
+    for fmt in formats:
+        try:
+            with stage(f"write_{fmt}"):
+                _write_sheets(sheets, stem, fmt, index, **excel_kwargs)
+        except ImportError as e:
+            raise ImportError(f"❌ '{fmt}' output needs an extra package ({e}). "
+                              "Install it (pip install pyarrow tables) or remove it from TSE_OUTPUT_FORMATS.") from e
+
+
+def _sheet_paths(sheets, stem, fmt):
+    if fmt in ("xlsx", "hdf5"):
+        return [stem + FORMAT_EXTENSIONS[fmt]]
+    return [f"{stem}__{_file_safe(sheet_name)}{FORMAT_EXTENSIONS[fmt]}" for sheet_name in sheets]
+
+
+def _write_sheets(sheets, stem, fmt, index, **excel_kwargs):
+    if fmt == "xlsx":
+        with pd.ExcelWriter(stem + ".xlsx", engine="openpyxl") as writer:
+            for sheet_name, df in sheets.items():
+                _excel_frame(df).to_excel(writer, sheet_name=sheet_name, index=index, **excel_kwargs)
+    elif fmt == "hdf5":
+        with pd.HDFStore(stem + ".h5", mode="w") as store:
+            for sheet_name, df in sheets.items():
+                store.put(_hdf_key(sheet_name), _columnar_frame(df, index), format="table")
+    else:
+        for sheet_name, df, out in zip(sheets, sheets.values(), _sheet_paths(sheets, stem, fmt)):
+            _write_one(df, out, fmt, index, key="data")
+
+
+def _file_safe(name):
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in str(name))
+
+
+def _hdf_key(name):
+    key = _file_safe(name)
+    return key if key[:1].isalpha() else f"t_{key}"
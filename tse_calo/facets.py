@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Faceted small-multiples: all animals of one metric in a single figure
+Created by Pablo SAIDI
+
+One panel per animal on a near-square grid with shared X and Y axes, so a
+metric costs one figure whatever the number of cages (instead of one 14×6
+figure per animal); plot_multi_facets does the same for the multi-axis
+view of every metric of an animal. The light-cycle shading is computed once and added to
+every panel as a single collection, and tick labels are only drawn on the
+outer panels. Figures are standalone (not registered with pyplot), so they
+can be drawn from worker threads (tse_calo.workers), and `save_figure`
+clears them once written: a figure is a web of reference cycles (figure,
+axes, artists, canvas), and once cleared nothing large is left for the
+cycle collector, so data and pixels are freed as soon as the figure is.
+"""
+
+import math
+
+from tse_calo.lazy import lazy_import
+
+mfigure = lazy_import("matplotlib.figure")
+mdates = lazy_import("matplotlib.dates")
+
+PANEL_SIZE = (4.2, 2.4)  # inches per panel
+
+
+def facet_grid(n, ncols=None, sharey=True, panel_size=PANEL_SIZE):
+    """Figure with `n` panels on a near-square grid; returns (fig, list of the n used axes)."""
+    ncols = ncols or max(1, math.ceil(math.sqrt(n * 1.5)))
+    nrows = max(1, math.ceil(n / ncols))
+    fig = mfigure.Figure(figsize=(max(8, ncols * panel_size[0]), max(4, nrows * panel_size[1] + 1)))
+    axes = fig.subplots(nrows, ncols, sharex=True, sharey=sharey, squeeze=False)
+    axes = axes.ravel()
+    for ax in axes[n:]:
+        ax.set_visible(False)
+    for i, ax in enumerate(axes[:n]):
+        if i + ncols >= n:  # last panel of its column: keep the date labels
+            ax.xaxis.set_tick_params(labelbottom=True)
+    return fig, list(axes[:n])
+
+
+def save_figure(fig, path, **kwargs):
+    """Write a standalone figure (rendered with Agg) to `path`, then clear it; returns `path`."""
+    from matplotlib.text import Text
+
+    fig.savefig(path, **kwargs)
+    # Drawn texts keep the Agg renderer (pixel buffer of the whole figure); legends hold theirs in
+    # cycles that clearing the figure does not break
+    for text in fig.findobj(Text):
+        text._renderer = None
+    fig.clear()
+    return path
+
+
+def _span_vertices(spans):
+    """Rectangles in (date number, axes fraction) coordinates, built once for every panel."""
+    verts, alphas = [], []
+    for start, end, alpha in spans:
+        x0, x1 = mdates.date2num(start), mdates.date2num(end)
+        verts.append([(x0, 0), (x0, 1), (x1, 1), (x1, 0)])
+        alphas.append(alpha)
+    return verts, alphas
+
+
+def shade_panels(axes, spans, color="gray"):
+    """Light-cycle shading of every panel: spans are (start, end, alpha) as given by tse_calo.light.dark_spans."""
+    if not spans:
+        return
+    from matplotlib.collections import PolyCollection
+    from matplotlib.colors import to_rgba
+
+    verts, alphas = _span_vertices(spans)
+    facecolors = [to_rgba(color, a) for a in alphas]
+    for ax in axes:
+        ax.add_collection(PolyCollection(verts, transform=ax.get_xaxis_transform(), facecolors=facecolors,
+                                         edgecolors="none", zorder=0), autolim=False)
+
+
+def bars(ax, times, heights, width, **kwargs):
+    """
+    ax.bar(times, heights, width, ...) drawn as one collection: same pixels
+    (zero baseline kept in the autoscale, NaN bars skipped), but one path per
+    figure instead of one patch per sample (1-min data: thousands of bars).
+    """
+    import numpy as np
+    from matplotlib.collections import PolyCollection
+    from matplotlib.container import BarContainer
+    from matplotlib.patches import Rectangle
+
+    x = mdates.date2num(np.asarray(times, dtype="datetime64[ns]"))
+    h = np.asarray(heights, dtype=float)
+    keep = ~np.isnan(h)
+    left, right, h = x[keep] - width / 2, x[keep] + width / 2, h[keep]
+    zero = np.zeros_like(h)
+    verts = np.stack([np.c_[left, zero], np.c_[left, h], np.c_[right, h], np.c_[right, zero]], axis=1)
+    label = kwargs.pop("label", None)
+    collection = PolyCollection(verts, edgecolors="none", linewidths=0, **kwargs)
+    collection.sticky_edges.y.append(0)
+    ax.add_collection(collection)
+    ax.autoscale_view()
+    if label is not None:
+        # Legend entry of ax.bar (a container, listed after the lines of the axes)
+        proxy = Rectangle((0, 0), width, 0, label="_nolegend_", **kwargs)
+        ax.add_container(BarContainer([proxy], label=label))
+    return collection
+
+
+def plot_facets(panels, path, title, ylabel, spans=(), color="blue", marker=None, ylim=None,
+                date_format="%Hh", hour_interval=2, overlay=None, ncols=None, sharey=True,
+                panel_title="Animal {}", **line_kwargs):
+    """
+    Draw one panel per entry of `panels` (animal → (x, y)) and save the figure to `path`.
+    `overlay(ax, animal)` is called after each curve (e.g. cosinor fits).
+    """
+    labels = list(panels)
+    if not labels:
+        return None
+    fig, axes = facet_grid(len(labels), ncols=ncols, sharey=sharey)
+    shade_panels(axes, list(spans))
+
+    line_kwargs.setdefault("linewidth", 1.2)
+    if marker:
+        line_kwargs.setdefault("markersize", 2.5)
+    for ax, label in zip(axes, labels):
+        x, y = panels[label]
+        ax.plot(x, y, color=color, marker=marker, linestyle="-", **line_kwargs)
+        if overlay is not None:
+            overlay(ax, label)
+        ax.set_title(panel_title.format(label), fontsize=9, pad=2)
+        ax.grid(True, linestyle="--", alpha=0.5)
+
+    if ylim is not None:
+        axes[0].set_ylim(ylim)
+    axes[0].xaxis.set_major_locator(mdates.HourLocator(interval=hour_interval))
+    axes[0].xaxis.set_major_formatter(mdates.DateFormatter(date_format))
+    for ax in axes:
+        ax.tick_params(axis="x", labelrotation=45, labelsize=8)
+        ax.tick_params(axis="y", labelsize=8)
+
+    fig.suptitle(title, fontsize=13, fontweight="bold")
+    fig.supylabel(ylabel)
+    width, height = fig.get_size_inches()
+    fig.subplots_adjust(left=0.9 / width, right=1 - 0.2 / width, bottom=0.9 / height, top=1 - 0.7 / height,
+                        wspace=0.08 if sharey else 0.25, hspace=0.35)
+    return save_figure(fig, path)
+
+
+def plot_multi_facets(panels, path, title, styles, spans=(), date_format="%Hh", hour_interval=2, ncols=None,
+                      panel_title="Animal {}", **line_kwargs):
+    """
+    Multi-axis version of plot_facets: every metric of an animal in its panel, the first one on the
+    left axis and each other one on its own right axis. Each axis is shared by all the panels, so
+    its tick labels are only drawn on the outer panels, in the colour of its curve.
+    `panels`: animal → (x, {metric: y}); `styles`: (metric, color, label, marker) in axis order.
+    """
+    labels = list(panels)
+    if not labels:
+        return None
+    fig, axes = facet_grid(len(labels), ncols=ncols)
+    ncols = axes[0].get_subplotspec().get_gridspec().ncols
+    shade_panels(axes, list(spans))
+
+    line_kwargs.setdefault("linewidth", 1.2)
+    line_kwargs.setdefault("markersize", 2.5)
+    shared, handles = {}, {}
+    for i, (ax, label) in enumerate(zip(axes, labels)):
+        x, values = panels[label]
+        outer = (i + 1) % ncols == 0 or i == len(labels) - 1  # nothing drawn on its right
+        for k, (metric, color, name, marker) in enumerate(styles):
+            target = ax
+            if k:
+                target = ax.twinx()
+                if metric in shared:
+                    target.sharey(shared[metric])
+                else:
+                    shared[metric] = target
+                target.spines["right"].set_position(("outward", 36 * (k - 1)))
+                target.spines["right"].set_visible(outer)
+                target.tick_params(axis="y", right=outer, labelright=outer)
+            target.tick_params(axis="y", labelcolor=color, labelsize=7)
+            if metric in values:
+                line, = target.plot(x, values[metric], color=color, marker=marker, linestyle="-", label=name,
+                                    **line_kwargs)
+                handles.setdefault(name, line)
+        ax.set_title(panel_title.format(label), fontsize=9, pad=2)
+        ax.grid(True, axis="y", linestyle="--", alpha=0.5)
+
+    axes[0].xaxis.set_major_locator(mdates.HourLocator(interval=hour_interval))
+    axes[0].xaxis.set_major_formatter(mdates.DateFormatter(date_format))
+    for ax in axes:
+        ax.tick_params(axis="x", labelrotation=45, labelsize=8)
+
+    fig.suptitle(title, fontsize=13, fontweight="bold")
+    fig.legend(list(handles.values()), list(handles), loc="upper right", ncols=len(handles), fontsize=8,
+               frameon=False)
+    width, height = fig.get_size_inches()
+    right = 0.2 + 0.5 * (len(styles) - 1)  # room for the offset right axes of the last column
+    fig.subplots_adjust(left=0.6 / width, right=1 - right / width, bottom=0.9 / height, top=1 - 0.7 / height,
+                        wspace=0.08, hspace=0.35)
+    return save_figure(fig, path)
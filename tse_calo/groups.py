@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Group metadata sidecar and group-level summary curves
+Created by Pablo SAIDI
+
+The sidecar is a small table saved next to the data file, named
+<data file name>_groups.csv (or .xlsx), with one row per animal:
+
+    Animal,Group,Sex
+    1,WT,M
+    2,KO,M
+
+`Animal` is the box number used in the data, `Group` is the comparison
+factor (genotype, treatment...). Extra columns are kept as metadata.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+SIDECAR_SUFFIXES = ("_groups.csv", "_groups.xlsx")
+
+
+def find_sidecar(data_path):
+    """Return the path of the group sidecar next to `data_path`, or None."""
+    stem = os.path.splitext(data_path)[0]
+    for suffix in SIDECAR_SUFFIXES:
+        if os.path.exists(stem + suffix):
+            return stem + suffix
+    return None
+
+
+def read_groups(path):
+    """Read the sidecar into a frame with integer `Animal` and string `Group`."""
+    if path.lower().endswith(".csv"):
+        groups = pd.read_csv(path, sep=None, engine="python")
+    else:
+        groups = pd.read_excel(path)
+    groups.columns = groups.columns.str.strip()
+
+    missing = {"Animal", "Group"} - set(groups.columns)
+    if missing:
+        raise ValueError(f"❌ Group file {path} must have the columns Animal and Group (missing: {', '.join(sorted(missing))}).")
+
+    groups = groups[pd.to_numeric(groups["Animal"], errors="coerce").notna()].copy()
+    groups["Animal"] = groups["Animal"].astype(int)
+    groups["Group"] = groups["Group"].astype(str).str.strip()
+    if groups["Animal"].duplicated().any():
+        raise ValueError(f"❌ Group file {path} lists the same animal twice.")
+    return groups
+
+
+def group_summary(df, groups, metrics, time_col="DateTime", group_col="Group"):
+    """
+    Mean, SD, SEM and N across the animals of each group for every time bin
+    and metric, in one grouped pass. Animals missing from the sidecar are dropped.
+    Returns a tidy table: Group, time_col, Metric, Mean, SD, SEM, N.
+    """
+    metrics = [m for m in metrics if m in df.columns]
+    data = df[["Animal", time_col] + metrics].merge(groups[["Animal", group_col]], on="Animal", how="inner")
+    data[metrics] = data[metrics].apply(pd.to_numeric, errors="coerce")
+
+    stats = data.groupby([group_col, time_col], observed=True)[metrics].agg(["mean", "std", "count"])
+    stats.columns.names = ["Metric", "Stat"]
+    tidy = stats.stack("Metric", future_stack=True).reset_index()
+    tidy = tidy.rename(columns={"mean": "Mean", "std": "SD", "count": "N"})
+    tidy["SEM"] = tidy["SD"] / np.sqrt(tidy["N"].where(tidy["N"] > 0))
+    return tidy[[group_col, time_col, "Metric", "Mean", "SD", "SEM", "N"]]
+
+
+def plot_group_curves(ax, summary, metric, error="SEM", time_col="DateTime", group_col="Group", colors=None):
+    """One mean curve per group with a shaded ±error band (SEM or SD)."""
+    sub = summary[summary["Metric"] == metric]
+    for i, (group, g) in enumerate(sub.groupby(group_col, sort=True)):
+        g = g.sort_values(time_col)
+        color = (colors or {}).get(group, f"C{i}")
+        ax.plot(g[time_col], g["Mean"], color=color, linewidth=2, label=f"{group} (n={int(g['N'].max())})")
+        ax.fill_between(g[time_col], g["Mean"] - g[error], g["Mean"] + g[error], color=color, alpha=0.25, linewidth=0)
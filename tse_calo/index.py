@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Partition index: contiguous per-animal / per-day slices of a cleaned frame
+Created by Pablo SAIDI
+
+Plot and resample loops used to take the rows of each animal with a boolean
+mask over the whole frame (`df[df["Animal"] == animal]`), once per animal and
+per metric: O(animals × metrics × rows). `AnimalIndex` sorts the frame once
+by Animal then DateTime and keeps the row offsets where each animal (and
+each day of an animal) starts and stops, so a slice is a positional range
+(`iloc[start:stop]`), found in O(1) and shared by plotting, resampling and
+export:
+
+    index = AnimalIndex(df_day)
+    for animal, rows in index.items():
+        ...
+    index.get(animal, day=date(2025, 10, 15))
+
+Rows keep the order of a mask on a frame sorted by Animal / DateTime, which
+is how the scripts already sort their data (an already sorted frame is
+used as is, without a copy).
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class AnimalIndex:
+    """Row offsets of each animal (and each `day` value of an animal) in the frame sorted by `by` / `time`."""
+
+    def __init__(self, df, by="Animal", time="DateTime", day=None):
+        self.by, self.time, self.day = by, time, day
+        order = [c for c in (by, time) if c in df.columns]
+        if not _is_sorted(df, order):
+            df = df.sort_values(order, kind="stable")
+        self.frame = df
+
+        keys = df[by].to_numpy()
+        starts = np.flatnonzero(keys[1:] != keys[:-1]) + 1 if len(keys) else np.array([], dtype=int)
+        bounds = np.concatenate([[0], starts, [len(keys)]]).astype(int)
+        self._offsets = {_scalar(keys[start]): (start, stop)
+                         for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start}
+        self._days = {}
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __iter__(self):
+        return iter(self._offsets)
+
+    def __contains__(self, animal):
+        return animal in self._offsets
+
+    def __getitem__(self, animal):
+        start, stop = self._offsets[animal]
+        return self.frame.iloc[start:stop]
+
+    def animals(self):
+        return list(self._offsets)
+
+    def items(self):
+        """(animal, rows of the animal) in animal order."""
+        for animal in self._offsets:
+            yield animal, self[animal]
+
+    def offsets(self, animal):
+        """(start, stop) row positions of `animal` in `frame`."""
+        return self._offsets[animal]
+
+    def days(self, animal):
+        """Offsets of each day of `animal`: {day: (start, stop)} (needs `day`, a column of the frame)."""
+        if self.day is None:
+            raise ValueError("❌ AnimalIndex built without a day column.")
+        if animal not in self._days:
+            start, stop = self._offsets[animal]
+            values = self.frame[self.day].iloc[start:stop]
+            valid = values.notna().to_numpy()
+            codes = pd.factorize(values)[0]
+            cuts = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+            bounds = np.concatenate([[0], cuts, [len(codes)]]).astype(int)
+            self._days[animal] = {_scalar(values.iloc[a]): (start + a, start + b)
+                                  for a, b in zip(bounds[:-1], bounds[1:]) if b > a and valid[a]}
+        return self._days[animal]
+
+    def get(self, animal, day=None):
+        """Rows of `animal` (of one of its days when `day` is given); empty frame when absent."""
+        if animal not in self._offsets:
+            return self.frame.iloc[0:0]
+        if day is None:
+            return self[animal]
+        start, stop = self.days(animal).get(day, (0, 0))
+        return self.frame.iloc[start:stop]
+
+
+def _is_sorted(df, columns):
+    """True when the rows are already ordered by `columns` (lexicographically)."""
+    if not columns or len(df) < 2:
+        return True
+    keys = [df[c] for c in columns]
+    if keys[0].isna().any() or not keys[0].is_monotonic_increasing:
+        return False
+    if len(keys) == 1:
+        return True
+    first = keys[0].to_numpy()
+    second = keys[1]
+    if second.isna().any():  # NaT rows go last within each animal after sort_values
+        return False
+    same = first[1:] == first[:-1]
+    values = second.to_numpy()
+    return bool(np.all(values[1:][same] >= values[:-1][same]))
+
+
+def _scalar(value):
+    return value.item() if isinstance(value, np.generic) else value
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+Deferred imports of the heavy dependencies
+Created by Pablo SAIDI
+
+matplotlib alone takes ~0.4 s to import, about as long as pandas. The
+scripts and the library bind it with `lazy_import` so a run that never
+draws (cancelled dialog, invalid input, export-only path) never pays for
+it:
+
+    plt = lazy_import("matplotlib.pyplot")   # nothing imported yet
+    plt.subplots(...)                          # imported here, once
+"""
+
+import importlib
+
+
+class LazyModule:
+    """Stand-in for a module, imported on the first attribute access."""
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        if self._module is None:
+            self.__dict__["_module"] = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded yet"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name):
+    """Module `name`, imported when first used."""
+    return LazyModule(name)
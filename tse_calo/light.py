@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Light / Dark status of timestamps for the light cycle codes used by the scripts
+Created by Pablo SAIDI
+
+Cycle codes (same as the dialogs):
+    "1" = LD1:1  (alternating 1 h light / 1 h dark, light from 07:00)
+    "2" = DD     (24 h dark)
+    "3" = LD12:12 (light 07:00–19:00)
+
+Day-by-day runs take the cycle of each day from a schedule: the sidecar
+<data file name>_schedule.csv (or .xlsx) next to the data, one row per
+biological day (the date of its 07:00 start),
+
+    Day,Cycle
+    2025-10-14,3
+    2025-10-16,2
+
+or, for the days it does not list, the codes typed in the dialog ("3" for
+every day, "3,3,2,1" for one code per day in order, the last one repeated).
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+LIGHTS_ON_HOUR = 7
+CYCLE_CODES = ("1", "2", "3")
+SCHEDULE_SUFFIXES = ("_schedule.csv", "_schedule.xlsx")
+
+
+def light_dark(times, cycle_type):
+    """
+    Vectorized Light/Dark label for every timestamp.
+    `cycle_type` is one code or one code per timestamp; NaT gives "NA".
+    """
+    times = pd.Series(pd.to_datetime(times)).reset_index(drop=True)
+    cycle = pd.Series(cycle_type, index=times.index).astype(str).to_numpy()
+
+    hour = times.dt.hour.to_numpy()
+    since_on = (times - times.dt.normalize() - pd.Timedelta(hours=LIGHTS_ON_HOUR)) // pd.Timedelta(hours=1)
+    since_on = since_on.fillna(0).to_numpy(dtype=np.int64)
+
+    light = np.select(
+        [cycle == "1", cycle == "2", cycle == "3"],
+        [since_on % 2 == 0, False, (hour >= LIGHTS_ON_HOUR) & (hour < LIGHTS_ON_HOUR + 12)],
+        default=False,
+    )
+    labels = np.where(light, "Light", "Dark").astype(object)
+    labels[~np.isin(cycle, ["1", "2", "3"]) | times.isna().to_numpy()] = "NA"
+    return labels
+
+
+def dark_spans(day_start, cycle_type, hours=24, ld11_alpha=0.2, alpha=0.3):
+    """
+    Dark intervals of one biological day starting at `day_start` (07:00), as
+    (start, end, alpha) tuples: the same spans the scripts shade with axvspan.
+    """
+    day_start = pd.Timestamp(day_start)
+    cycle_type = str(cycle_type)
+    if cycle_type == "1":
+        return [(day_start + pd.Timedelta(hours=h + 1), day_start + pd.Timedelta(hours=h + 2), ld11_alpha)
+                for h in range(0, hours, 2)]
+    if cycle_type == "2":
+        return [(day_start, day_start + pd.Timedelta(hours=hours), alpha)]
+    if cycle_type == "3":
+        return [(day_start + pd.Timedelta(hours=12), day_start + pd.Timedelta(hours=24), alpha)]
+    return []
+
+
+# --------------------------
+# 📅 Light cycle schedule of day-by-day runs
+def find_schedule(data_path):
+    """Return the path of the schedule sidecar next to `data_path`, or None."""
+    stem = os.path.splitext(data_path)[0]
+    for suffix in SCHEDULE_SUFFIXES:
+        if os.path.exists(stem + suffix):
+            return stem + suffix
+    return None
+
+
+def read_schedule(path):
+    """Read the schedule sidecar into {date: cycle code}."""
+    if path.lower().endswith(".csv"):
+        schedule = pd.read_csv(path, sep=None, engine="python", dtype=str)
+    else:
+        schedule = pd.read_excel(path, dtype=str)
+    schedule.columns = schedule.columns.str.strip()
+
+    missing = {"Day", "Cycle"} - set(schedule.columns)
+    if missing:
+        raise ValueError(f"❌ Schedule file {path} must have the columns Day and Cycle (missing: {', '.join(sorted(missing))}).")
+    schedule = schedule.dropna(subset=["Day", "Cycle"])
+    codes = schedule["Cycle"].str.strip()
+    if not codes.isin(CYCLE_CODES).all():
+        raise ValueError(f"❌ Schedule file {path}: cycles must be 1 (LD1:1), 2 (DD) or 3 (LD12:12).")
+    return dict(zip(pd.to_datetime(schedule["Day"].str.strip()).dt.date, codes))
+
+
+def day_cycles(days, codes, schedule=None):
+    """
+    Cycle code of each of `days` ({day: code}): from `schedule` when it lists
+    the day, else from `codes`, one code or a comma-separated list of codes
+    in day order (the last one repeated).
+    """
+    codes = [c.strip() for c in str(codes or "").split(",") if c.strip()]
+    if any(c not in CYCLE_CODES for c in codes):
+        raise ValueError("❌ Invalid light cycle. Enter 1, 2 or 3, or one of them per day separated by commas.")
+    schedule = schedule or {}
+    cycles = {}
+    for i, day in enumerate(days):
+        if day in schedule:
+            cycles[day] = schedule[day]
+        elif codes:
+            cycles[day] = codes[min(i, len(codes) - 1)]
+        else:
+            raise ValueError(f"❌ No light cycle for {day}: add it to the schedule file or enter a cycle code.")
+    return cycles
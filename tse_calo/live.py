@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+"""
+Live mode: incremental processing of exports that keep growing
+Created by Pablo SAIDI
+
+During a running experiment the same export is saved again every few hours
+with more rows. PhenoMaster writes one block of rows per box, so a new save
+inserts rows at the end of every block rather than after the last line:
+`watch` polls a folder and, for every new or updated export (.xlsx / .csv),
+streams and cleans the whole sheet, then only keeps the rows of each animal
+that are newer than the last DateTime seen for it, wherever they are in the
+file.
+
+The rows already seen are kept as a check: when they no longer match the
+cached ones (new experiment under the same name, edited rows), the export
+is processed from scratch. Parsed rows, hourly values (Hour × Animal), the
+aggregate pyramid (15 min → day, tse_calo.pyramid) and figure fingerprints
+are cached in <output>/<export>_live/_cache. Hourly values and pyramid bins
+are recomputed from the first hour touched by the new rows only, the hourly
+table, the ZT chronology and the levels workbook are written again, and a
+figure is only redrawn when the data it shows (or the light cycle shading,
+from the <export>_schedule sidecar, LD12:12 for the days it does not list)
+has changed.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from tse_calo.engine import aggregate, prepare
+from tse_calo.export import write_table, write_tables
+from tse_calo.facets import plot_facets
+from tse_calo.lazy import lazy_import
+from tse_calo.groups import SIDECAR_SUFFIXES
+from tse_calo.light import LIGHTS_ON_HOUR, SCHEDULE_SUFFIXES, dark_spans, day_cycles, find_schedule, read_schedule
+from tse_calo.partitions import iter_export_chunks
+from tse_calo.pipeline import drain
+from tse_calo.profiling import stage
+from tse_calo.pyramid import LEVELS, build_pyramid, level_values, load_pyramid, save_pyramid, update_pyramid
+from tse_calo.schema import compact
+
+plt = lazy_import("matplotlib.pyplot")
+mdates = lazy_import("matplotlib.dates")
+
+EXTENSIONS = (".xlsx", ".csv")
+SETTLE_SECONDS = 5  # a file modified more recently may still be being written
+
+HOURLY = {"RER": "mean", "XT_YT": "sum", "Feed_diff": "sum", "EE": "mean"}
+LABELS = {"RER": "RER", "XT_YT": "XT_YT", "Feed_diff": "Feed", "EE": "EE"}
+UNITS = {"RER": "RER", "XT_YT": "XT+YT [u.a]", "Feed_diff": "Feed [g/h]", "EE": "EE [kcal/h]"}
+COLORS = {"RER": "blue", "XT_YT": "red", "Feed_diff": "green", "EE": "purple"}
+
+
+# --------------------------
+# 🧹 Parsing
+def clean_export(raw):
+    """Rows of an export (columns of pd.read_excel) → compact frame: Animal, DateTime, RER, XT_YT, Feed, EE."""
+    raw = raw.rename(columns=lambda c: str(c).strip())
+    columns = list(raw.columns)
+    if "TX002" not in columns:
+        raise ValueError("❌ No TX002 (Animal) column in the export header. Please check the file format.")
+    names = {columns[0]: "Date", "Unnamed: 1": "Time", "TX002": "Animal",
+             "Unnamed: 13": "RER", "Unnamed: 14": "XT_YT", "Unnamed: 15": "Feed"}
+    if len(columns) >= 17:
+        names[columns[16]] = "EE"
+    df = raw.rename(columns=names)
+    df = df[pd.to_numeric(df["Animal"], errors="coerce").notna()]
+
+    out = pd.DataFrame({
+        "Animal": df["Animal"].astype(float).astype(int),
+        "DateTime": pd.to_datetime(df["Date"].astype(str).str.strip() + " " + df["Time"].astype(str).str.strip(),
+                                   errors="coerce"),
+    })
+    for col in ["RER", "XT_YT", "Feed", "EE"]:
+        out[col] = pd.to_numeric(df[col], errors="coerce") if col in df.columns else np.nan
+    return compact(out.reset_index(drop=True))
+
+
+def _fingerprint(df):
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()).hexdigest()
+
+
+# --------------------------
+# ⏱️ Hourly values and ZT chronology
+def hourly_values(rows, exclude_feed=False, prepared=False):
+    """
+    Hour_Start × Animal means / sums of the rows (Feed_diff clipped at 0,
+    > 2 g removed on request; `prepared`: rows already from engine.prepare).
+    """
+    df = rows if prepared else prepare(rows, exclude_feed=exclude_feed)
+    df = df.assign(Hour_Start=df["DateTime"].dt.floor("h"))
+    return aggregate(df, ["Hour_Start", "Animal"], HOURLY)
+
+
+def rows_since(rows, since):
+    """
+    Rows of each animal from `since[animal]` on (animals missing from `since`
+    are left out), plus the row just before: the Feed difference of the first
+    row kept needs it. `rows` must be sorted by Animal / DateTime.
+    """
+    animal = rows["Animal"].to_numpy()
+    keep = (rows["DateTime"] >= rows["Animal"].map(since)).to_numpy()
+    same_animal_next = np.r_[animal[1:] == animal[:-1], False]
+    return rows[keep | (np.r_[keep[1:], False] & same_animal_next)]
+
+
+def hourly_table(hourly):
+    """Hourly values as in TSE_All_Graph_mean.py: Day, Hour, one column per metric × animal, DateTime."""
+    hourly = hourly.assign(Day=hourly["Hour_Start"].dt.date, Hour=hourly["Hour_Start"].dt.hour)
+    pivots = []
+    for metric, how in HOURLY.items():
+        pivot = hourly.pivot_table(index=["Day", "Hour"], columns="Animal", values=metric, aggfunc=how)
+        pivot.columns = [f"{LABELS[metric]}_Animal{a}" for a in pivot.columns]
+        pivots.append(pivot)
+    table = pd.concat(pivots, axis=1).reset_index()
+    table["DateTime"] = pd.to_datetime(table["Day"].astype(str)) + pd.to_timedelta(table["Hour"], unit="h")
+    return table
+
+
+def zt_chronology(hourly):
+    """
+    Hourly values in ZT order (ZT00 = lights on at 07:00), one sheet per
+    metric: ZT_Day (1 = first recorded day), ZT_Format, one column per animal.
+    """
+    zt_time = hourly["Hour_Start"] - pd.Timedelta(hours=LIGHTS_ON_HOUR)
+    zt_day = zt_time.dt.normalize()
+    hourly = hourly.assign(ZT_Day=((zt_day - zt_day.min()) // pd.Timedelta(days=1)).astype(int) + 1,
+                           ZT_Num=zt_time.dt.hour)
+    sheets = {}
+    for metric in HOURLY:
+        matrix = hourly.pivot(index=["ZT_Day", "ZT_Num"], columns="Animal", values=metric).reset_index()
+        matrix.insert(1, "ZT_Format", "ZT" + matrix["ZT_Num"].astype(str).str.zfill(2))
+        sheets[f"{LABELS[metric]}_Chronological"] = matrix.drop(columns="ZT_Num")
+    return sheets
+
+
+# --------------------------
+# 📈 Figures
+def plot_animal(hourly, path, title, spans=()):
+    """The four hourly metrics of one animal, stacked on a shared time axis."""
+    fig, axes = plt.subplots(len(HOURLY), 1, sharex=True, figsize=(14, 9))
+    x = hourly["Hour_Start"] + pd.Timedelta(minutes=30)
+    for ax, metric in zip(axes, HOURLY):
+        for start, end, alpha in spans:
+            ax.axvspan(start, end, color="gray", alpha=alpha, linewidth=0)
+        ax.plot(x, hourly[metric], color=COLORS[metric], marker="o", markersize=2.5, linewidth=1.2)
+        ax.set_ylabel(UNITS[metric], fontweight="bold")
+        ax.grid(True, linestyle="--", alpha=0.5)
+    axes[-1].xaxis.set_major_locator(mdates.HourLocator(byhour=[0, 12]))
+    axes[-1].xaxis.set_major_formatter(mdates.DateFormatter("%d-%Hh"))
+    fig.autofmt_xdate(rotation=45, ha="right")
+    axes[0].set_title(title, fontsize=14, fontweight="bold")
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+
+
+# --------------------------
+# 🔄 One export followed across scans
+class LiveExport:
+    """Last DateTime of each animal, cached rows / hourly values and figure fingerprints of one export."""
+
+    def __init__(self, path, output_dir, exclude_feed=False, sheet_name=0, cycle="3"):
+        self.path = path
+        self.cycle = cycle  # days missing from the schedule sidecar
+        self.output_dir = output_dir
+        self.exclude_feed = exclude_feed
+        self.sheet_name = sheet_name
+        self.base = os.path.splitext(os.path.basename(path))[0]
+        self.cache = os.path.join(output_dir, "_cache")
+        os.makedirs(self.cache, exist_ok=True)
+
+        state_file = os.path.join(self.cache, "state.json")
+        self.state = {}
+        if os.path.exists(state_file):
+            with open(state_file, encoding="utf-8") as f:
+                self.state = json.load(f)
+        if self.state.get("exclude_feed") != exclude_feed:  # cached values computed with the other setting
+            self.state = {}
+        self.rows = self._load("rows.pkl") if self.state else None
+        self.hourly = self._load("hourly.pkl") if self.state else None
+        self.pyramid = load_pyramid(self.cache) if self.state else None
+        if self.rows is None or self.hourly is None or self.pyramid is None:
+            self.state = {}
+
+    def _load(self, name):
+        path = os.path.join(self.cache, name)
+        return pd.read_pickle(path) if os.path.exists(path) else None
+
+    def _save(self):
+        self.rows.to_pickle(os.path.join(self.cache, "rows.pkl"))
+        self.hourly.to_pickle(os.path.join(self.cache, "hourly.pkl"))
+        save_pyramid(self.pyramid, self.cache)
+        with open(os.path.join(self.cache, "state.json"), "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=1)
+
+    def _stat(self):
+        st = os.stat(self.path)
+        schedule = find_schedule(self.path)
+        return [st.st_size, st.st_mtime_ns, os.stat(schedule).st_mtime_ns if schedule else None]
+
+    def changed(self):
+        """True when the export (or its schedule sidecar) was created or modified since the last update."""
+        return self._stat() != self.state.get("stat")
+
+    def _read(self):
+        """Every row of the export, cleaned chunk by chunk (sorted by Animal / DateTime)."""
+        parts = [clean_export(chunk) for chunk in iter_export_chunks(self.path, self.sheet_name)]
+        if not parts:
+            return None
+        rows = compact(pd.concat(parts, ignore_index=True))
+        return rows.sort_values(["Animal", "DateTime"], kind="stable", ignore_index=True)
+
+    def _split(self, rows):
+        """
+        (new rows, True when processed from scratch): rows of each animal after
+        the last DateTime seen for it. The rows up to it must be the cached ones.
+        """
+        last = self.state.get("last")
+        if self.rows is None or not last:
+            return rows, True
+        last = pd.Series({int(a): pd.Timestamp(t) for a, t in last}, dtype="datetime64[ns]")
+        until = rows["Animal"].map(last)
+        seen = (rows["DateTime"] <= until).to_numpy()
+        cached = self.rows.dropna(subset=["DateTime"])
+        if seen.sum() != len(cached) or _fingerprint(rows[seen].reset_index(drop=True)) != \
+                _fingerprint(cached.reset_index(drop=True)):
+            return rows, True
+        fresh = (until.isna() | (rows["DateTime"] > until)).to_numpy() & rows["DateTime"].notna().to_numpy()
+        return rows[fresh], False
+
+    def update(self):
+        """Parse the export, update hourly values / ZT chronology / figures from its new rows; returns a one-line report."""
+        t0 = time.perf_counter()
+        stat = self._stat()
+        with stage("live_read"):
+            rows = self._read()
+        if rows is None or rows.empty:
+            return f"⏳ {os.path.basename(self.path)}: no rows yet"
+        new, fresh = self._split(rows)
+
+        with stage("live_hourly"):
+            if fresh:
+                self.rows = new
+                prepared = prepare(self.rows, exclude_feed=self.exclude_feed)
+                self.hourly = hourly_values(prepared, prepared=True)
+                self.pyramid = build_pyramid(prepared)
+                since_text = "all hours"
+            elif len(new):
+                self.rows = pd.concat([self.rows, new], ignore_index=True).sort_values(
+                    ["Animal", "DateTime"], kind="stable", ignore_index=True)
+                # Only the hours from the first new row of each animal on are recomputed
+                since = new.dropna(subset=["DateTime"]).groupby("Animal")["DateTime"].min().dt.floor("h")
+                prepared = prepare(rows_since(self.rows, since), exclude_feed=self.exclude_feed)
+                part = hourly_values(prepared, prepared=True)
+                part = part[part["Hour_Start"] >= part["Animal"].map(since)]
+                stale = self.hourly["Hour_Start"] >= self.hourly["Animal"].map(since)
+                self.hourly = pd.concat([self.hourly[~stale], part]).sort_values(
+                    ["Hour_Start", "Animal"], ignore_index=True)
+                self.pyramid = update_pyramid(self.pyramid, prepared, since)
+                since_text = f"hours from {since.min():%Y-%m-%d %H:%M}" if len(since) else "no dated rows"
+            else:
+                since_text = "no new rows"
+
+        if fresh or len(new):
+            with stage("live_export"):
+                write_table(hourly_table(self.hourly), os.path.join(self.output_dir, f"{self.base}_Hourly_live.xlsx"))
+                write_tables(zt_chronology(self.hourly),
+                             os.path.join(self.output_dir, f"{self.base}_ZT_CHRONOLOGY_live.xlsx"))
+                write_tables({level: level_values(self.pyramid, level) for level in LEVELS},
+                             os.path.join(self.output_dir, f"{self.base}_Levels_live.xlsx"))
+        with stage("live_figures"):
+            drawn = self._render()  # also after a schedule change alone
+
+        last = self.rows.dropna(subset=["DateTime"]).groupby("Animal")["DateTime"].max()
+        self.state.update(stat=stat, exclude_feed=self.exclude_feed,
+                          last=[[int(a), t.isoformat()] for a, t in last.items()])
+        self._save()
+        mode = "full read" if fresh else "new rows only"
+        return (f"🔄 {os.path.basename(self.path)}: {len(new)} rows ({mode}, {since_text}), "
+                f"{len(drawn)} figure(s) redrawn in {time.perf_counter() - t0:.1f} s")
+
+    def _render(self):
+        """Redraw the figures whose data changed since they were last drawn; returns their names."""
+        hourly = self.hourly.dropna(subset=["Hour_Start"])
+        if hourly.empty:
+            return []
+        first = (hourly["Hour_Start"].min() - pd.Timedelta(hours=LIGHTS_ON_HOUR)).normalize()
+        days = pd.date_range(first, hourly["Hour_Start"].max(), freq="D")
+        # Light cycle of each biological day: the schedule sidecar (read again, it may be completed
+        # during the experiment), LD12:12 for the days it does not list
+        schedule_file = find_schedule(self.path)
+        cycles = day_cycles([d.date() for d in days], self.cycle, read_schedule(schedule_file) if schedule_file else None)
+        spans = [span for day in days
+                 for span in dark_spans(day + pd.Timedelta(hours=LIGHTS_ON_HOUR), cycles[day.date()])]
+
+        figures = self.state.setdefault("figures", {})
+        drawn = []
+
+        shading = hashlib.sha1(repr(spans).encode()).hexdigest()
+
+        def stale(name, data):
+            key = _fingerprint(data) + shading
+            if figures.get(name) == key and os.path.exists(os.path.join(self.output_dir, name)):
+                return False
+            figures[name] = key
+            drawn.append(name)
+            return True
+
+        for metric in HOURLY:
+            name = f"Live_{LABELS[metric]}.png"
+            data = hourly[["Hour_Start", "Animal", metric]]
+            if stale(name, data):
+                panels = {a: (g["Hour_Start"] + pd.Timedelta(minutes=30), g[metric])
+                          for a, g in data.groupby("Animal", sort=True)}
+                plot_facets(panels, os.path.join(self.output_dir, name), f"{self.base}: {LABELS[metric]} (hourly)",
+                            UNITS[metric], spans=spans, color=COLORS[metric], marker="o",
+                            date_format="%d-%Hh", hour_interval=12)
+
+        for animal, data in hourly.groupby("Animal", sort=True):
+            name = f"Live_Animal{animal}.png"
+            if stale(name, data):
+                plot_animal(data, os.path.join(self.output_dir, name), f"{self.base}: Animal {animal}", spans)
+        return drawn
+
+
+# --------------------------
+# 👀 Folder watch
+def scan(folder, output_root, exports, exclude_feed=False, settle=SETTLE_SECONDS):
+    """One pass over `folder`: update every new or modified export; returns the reports."""
+    reports = []
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        if name.startswith("~$") or not name.lower().endswith(EXTENSIONS) or not os.path.isfile(path):
+            continue
+        if name.lower().endswith(SCHEDULE_SUFFIXES + SIDECAR_SUFFIXES):
+            continue  # sidecars of an export, not exports
+        if settle and time.time() - os.path.getmtime(path) < settle:
+            continue  # still being written: next scan
+        live = exports.get(path)
+        if live is None:
+            base = os.path.splitext(name)[0]
+            live = exports[path] = LiveExport(path, os.path.join(output_root, f"{base}_live"), exclude_feed)
+        if live.changed():
+            reports.append(live.update())
+    drain(report=False)  # outputs of this scan complete before it is reported
+    return reports
+
+
+def watch(folder, output_root, interval=60, exclude_feed=False):
+    """Scan `folder` every `interval` seconds until interrupted (interval 0: one scan)."""
+    exports = {}
+    while True:
+        for report in scan(folder, output_root, exports, exclude_feed, settle=SETTLE_SECONDS if interval else 0):
+            print(report)
+        if not interval:
+            return exports
+        time.sleep(interval)
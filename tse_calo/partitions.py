@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Out-of-core processing, one animal at a time
+Created by Pablo SAIDI
+
+Every step of the scripts (Feed_diff, smoothing, hourly sums) is computed
+per animal, so a long experiment does not have to be held in memory at
+once. With TSE_OUT_OF_CORE=1 the export is streamed in chunks (openpyxl
+read-only for .xlsx, pandas chunks for .csv), each chunk is cleaned and its
+rows are written to one folder per animal. The analysis then loads one
+animal at a time and only keeps its (small) result:
+
+    with partitioned(path, clean, sheet_name="PS 2025 02") as parts:
+        hourly = pd.concat(map_partitions(parts, hourly_values))
+
+Peak memory is one chunk or one animal, whichever is larger. Partitions are
+Parquet files when pyarrow is installed, pickles otherwise, and are removed
+when the `with` block ends. Only the scripts of OUT_OF_CORE_SCRIPTS run this
+way; the others load the whole export and say so (`warn_in_memory`) when
+TSE_OUT_OF_CORE is set.
+"""
+
+import itertools
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+from contextlib import contextmanager
+
+import pandas as pd
+
+from tse_calo.lazy import lazy_import
+
+openpyxl = lazy_import("openpyxl")
+
+CHUNK_ROWS = 50_000
+SCAN_ROWS = 1_000  # leading rows read to find the width of an .xlsx sheet
+
+OUT_OF_CORE_SCRIPTS = ("TSE_All_Graph_mean.py",)
+
+Partitions = namedtuple("Partitions", ["folder", "animals", "columns", "rows", "ext"])
+
+
+def out_of_core(value=None):
+    """True when the run should process the export one animal at a time (TSE_OUT_OF_CORE)."""
+    if value is None:
+        value = os.environ.get("TSE_OUT_OF_CORE", "")
+    return str(value).strip().lower() not in ("", "0", "false", "no", "off")
+
+
+def warn_in_memory(script):
+    """Tell that TSE_OUT_OF_CORE is not honoured by `script`, which loads the whole export."""
+    if out_of_core():
+        print(f"⚠️ TSE_OUT_OF_CORE is ignored by {script}: the whole export is loaded in memory "
+              f"(one animal at a time only in {', '.join(OUT_OF_CORE_SCRIPTS)})")
+
+
+def read_export(path, sheet_name=0):
+    """Whole export in memory, as pd.read_excel gives it (.csv: same columns, text cells)."""
+    if path.lower().endswith(".csv"):
+        return pd.read_csv(path, dtype=object)
+    return pd.read_excel(path, sheet_name=sheet_name)
+
+
+def iter_export_chunks(path, sheet_name=0, chunksize=CHUNK_ROWS, skip=0):
+    """
+    The export in frames of `chunksize` rows with the columns of pd.read_excel
+    (first row as header, "Unnamed: i" for blank cells). Cells stay Python
+    objects, as in the mixed columns of a whole-sheet read. `skip`: number of
+    rows after the header that are not returned (rows already processed).
+    """
+    if path.lower().endswith(".csv"):
+        yield from pd.read_csv(path, dtype=object, chunksize=chunksize, skiprows=range(1, skip + 1))
+        return
+
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet_name] if isinstance(sheet_name, int) else wb[sheet_name]
+        rows = ws.iter_rows(values_only=True)
+        # Rows are not padded when the file has no dimension record: width of the widest leading row
+        head = list(itertools.islice(rows, SCAN_ROWS))
+        if not head:
+            return
+        width = max(len(r) for r in head)
+        header = tuple(head[0]) + (None,) * (width - len(head[0]))
+        columns = [v if v is not None else f"Unnamed: {i}" for i, v in enumerate(header)]
+        block = []
+        for row in itertools.islice(itertools.chain(head[1:], rows), skip, None):
+            block.append(tuple(row[:width]) + (None,) * (width - len(row)))
+            if len(block) == chunksize:
+                yield pd.DataFrame(block, columns=columns, dtype=object)
+                block = []
+        if block:
+            yield pd.DataFrame(block, columns=columns, dtype=object)
+    finally:
+        wb.close()
+
+
+def _parquet():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def partition_by_animal(path, folder, clean, sheet_name=0, chunksize=CHUNK_ROWS, by="Animal"):
+    """
+    Stream the export, apply `clean` (raw chunk → cleaned frame with a `by`
+    column) and append each animal's rows to folder/animal_<id>/.
+    Returns Partitions(folder, animals, raw columns, cleaned rows, file extension).
+    """
+    ext = ".parquet" if _parquet() else ".pkl"
+    os.makedirs(folder, exist_ok=True)
+    for old in os.listdir(folder):  # parts of a previous run in the same folder
+        if old.startswith("animal_"):
+            shutil.rmtree(os.path.join(folder, old))
+    animals, columns, rows = set(), None, 0
+    for k, chunk in enumerate(iter_export_chunks(path, sheet_name, chunksize)):
+        if columns is None:
+            columns = [str(c).strip() for c in chunk.columns]
+        cleaned = clean(chunk)
+        rows += len(cleaned)
+        for animal, part in cleaned.groupby(by, sort=False):
+            sub = os.path.join(folder, f"animal_{animal}")
+            os.makedirs(sub, exist_ok=True)
+            out = os.path.join(sub, f"part_{k:05d}{ext}")
+            if ext == ".parquet":
+                part.to_parquet(out, index=False)
+            else:
+                part.reset_index(drop=True).to_pickle(out)
+            animals.add(animal)
+    return Partitions(folder, sorted(animals), columns or [], rows, ext)
+
+
+def read_partition(parts, animal):
+    """All rows of one animal, in file order."""
+    sub = os.path.join(parts.folder, f"animal_{animal}")
+    files = sorted(f for f in os.listdir(sub) if f.endswith(parts.ext))
+    read = pd.read_parquet if parts.ext == ".parquet" else pd.read_pickle
+    frames = [read(os.path.join(sub, f)) for f in files]
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+
+def map_partitions(parts, func, animals=None):
+    """Yield func(rows of one animal) for each animal, loading one partition at a time."""
+    for animal in (parts.animals if animals is None else animals):
+        yield func(read_partition(parts, animal))
+
+
+@contextmanager
+def partitioned(path, clean, sheet_name=0, folder=None, chunksize=CHUNK_ROWS, by="Animal"):
+    """Partition the export for the duration of the block (temporary folder unless `folder` is given)."""
+    created = folder is None
+    folder = folder or tempfile.mkdtemp(prefix="tse_partitions_")
+    try:
+        yield partition_by_animal(path, folder, clean, sheet_name, chunksize, by)
+    finally:
+        if created:
+            shutil.rmtree(folder, ignore_errors=True)
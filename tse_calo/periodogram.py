@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized periodograms for free-running period estimation (DD days)
+Created by Pablo SAIDI
+
+All animals × metrics are laid out as the columns of one (time × series)
+matrix on a common time axis, and the power of every series is evaluated
+for the whole period grid at once:
+
+- Lomb-Scargle: uneven or gappy data (NaN = missing sample)
+- Chi-square (Sokolove-Bushell): regular sampling without gaps
+
+`method="auto"` uses chi-square when every series is regular, gap-free and
+covers at least two cycles of the longest period, Lomb-Scargle otherwise.
+
+A peak is only reported as the free-running period when its series covers
+MIN_CYCLES cycles of the longest period tested and the peak is not at
+either end of the grid (the power still rising there: the true period is
+outside the grid). Other series keep their spectrum, with Peak_Period left
+empty and the reason in Note.
+"""
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_METRICS = ["RER", "XT_YT", "Feed_diff", "EE"]
+MIN_CYCLES = 2  # cycles of the longest period a series must cover for its peak to be reported
+
+
+def period_grid(min_period=18.0, max_period=30.0, step=0.1):
+    """Periods (hours) to test, inclusive of both ends."""
+    return np.round(np.arange(min_period, max_period + step / 2, step), 6)
+
+
+def covered_hours(times):
+    """Hours covered by the timestamps: first to last sample plus one sampling interval."""
+    t = pd.Series(pd.to_datetime(times)).dropna().drop_duplicates().sort_values()
+    if len(t) < 2:
+        return 0.0
+    return (t.iloc[-1] - t.iloc[0] + t.diff().median()) / pd.Timedelta(hours=1)
+
+
+def lomb_scargle(t, Y, periods):
+    """
+    Lomb-Scargle power (standard normalization, 0..1) of every column of Y.
+
+    t: (n,) times in hours, Y: (n, k) values with NaN for missing samples,
+    periods: (F,) in hours. Returns (k, F).
+    Every sum over time is a matrix product, so no loop over series or periods.
+    """
+    t = np.asarray(t, dtype=float)
+    Y = np.asarray(Y, dtype=float)
+    valid = np.isfinite(Y)
+    w = valid.astype(float)
+    n = w.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(valid, Y, 0.0).sum(axis=0) / n
+    y = np.where(valid, Y - mean, 0.0)
+
+    omega = 2.0 * np.pi / np.asarray(periods, dtype=float)
+    wt = np.outer(t, omega)                       # (n, F)
+    cos_wt, sin_wt = np.cos(wt), np.sin(wt)
+    cos_2wt, sin_2wt = np.cos(2 * wt), np.sin(2 * wt)
+
+    # Per-series sums (k, F)
+    YC, YS = y.T @ cos_wt, y.T @ sin_wt
+    C2, S2 = w.T @ cos_2wt, w.T @ sin_2wt
+    YY = (y * y).sum(axis=0)[:, None]
+
+    # Time offset tau per series and frequency: tan(2ωτ) = S2 / C2
+    two_wtau = np.arctan2(S2, C2)
+    cos_2wtau, sin_2wtau = np.cos(two_wtau), np.sin(two_wtau)
+    cos_wtau, sin_wtau = np.cos(two_wtau / 2), np.sin(two_wtau / 2)
+
+    yc = YC * cos_wtau + YS * sin_wtau
+    ys = YS * cos_wtau - YC * sin_wtau
+    cc = (n[:, None] + C2 * cos_2wtau + S2 * sin_2wtau) / 2
+    ss = n[:, None] - cc
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        power = (yc ** 2 / cc + ys ** 2 / ss) / YY
+    power[(n < 3)] = np.nan
+    return power
+
+
+def chi_square(Y, sample_hours, periods):
+    """
+    Sokolove-Bushell chi-square periodogram (Qp) of every column of Y.
+
+    Y: (n, k) regularly sampled values, sample_hours: sampling interval,
+    periods: (F,) in hours (rounded to whole samples). Returns (k, F).
+    Every period's fold is one grouped sum over a (period, phase bin) key,
+    evaluated for all series together.
+    """
+    Y = np.asarray(Y, dtype=float)
+    n, k = Y.shape
+    p = np.maximum(np.rint(np.asarray(periods) / sample_hours).astype(int), 1)   # samples per cycle
+    cycles = n // p                                                               # K per period
+    F, p_max = len(p), int(p.max())
+
+    i = np.arange(n)
+    kept = i[:, None] < (cycles * p)[None, :]          # (n, F) truncation to K*p samples
+    phase = i[:, None] % p[None, :]
+    key = (np.arange(F)[None, :] * p_max + phase)[kept]
+    rows = np.broadcast_to(i[:, None], (n, F))[kept]
+
+    valid = np.isfinite(Y)
+    y = np.where(valid, Y, 0.0)
+
+    def grouped(values):
+        out = np.zeros((F * p_max, values.shape[1]))
+        np.add.at(out, key, values[rows])
+        return out.reshape(F, p_max, values.shape[1])
+
+    bin_sum, bin_n = grouped(y), grouped(valid.astype(float))
+    tot_sum, tot_n = bin_sum.sum(axis=1), bin_n.sum(axis=1)            # (F, k)
+    tot_sq = grouped(y * y).sum(axis=1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = tot_sum / tot_n
+        bin_mean = bin_sum / bin_n
+        between = np.nansum(bin_n * (bin_mean - mean[:, None, :]) ** 2, axis=1)
+        total = tot_sq - tot_n * mean ** 2
+        qp = cycles[:, None] * tot_n * (between / (tot_n / p[:, None])) / total
+    qp[cycles < 2] = np.nan
+    return qp.T
+
+
+def _is_regular(t, Y):
+    steps = np.diff(t)
+    return len(steps) > 0 and np.allclose(steps, steps[0]) and np.isfinite(Y).all()
+
+
+def periodogram(df, metrics=None, periods=None, method="auto", time_col="DateTime", by=("Animal",)):
+    """
+    Periodogram of every `by` group × metric of a long frame.
+
+    Returns (peaks, spectrum):
+    - peaks: one row per series with N, Hours covered, Peak_Period (h), Peak_Power,
+      Method and Note (why Peak_Period is empty: too short, or peak at the grid edge)
+    - spectrum: tidy table by..., Metric, Period, Power
+    """
+    by = list(by)
+    metrics = [m for m in (metrics or DEFAULT_METRICS) if m in df.columns]
+    if not metrics:
+        raise ValueError("❌ None of the requested metrics are present for the periodogram.")
+    periods = period_grid() if periods is None else np.asarray(periods, dtype=float)
+
+    # --------------------------
+    # One (time × series) matrix on the common time axis
+    data = df.loc[df[time_col].notna(), by + [time_col] + metrics]
+    data = data.assign(**{m: pd.to_numeric(data[m], errors="coerce") for m in metrics})
+    wide = data.pivot_table(index=time_col, columns=by, values=metrics, aggfunc="mean", dropna=False)
+    wide = wide.dropna(axis=1, how="all")
+    series = wide.columns.to_frame(index=False)
+    series.columns = ["Metric"] + by
+
+    t = ((wide.index - wide.index[0]).total_seconds() / 3600.0).to_numpy()
+    Y = wide.to_numpy(dtype=float)
+
+    if method == "auto":
+        long_enough = len(t) > 1 and t[-1] - t[0] >= 2 * periods.max()
+        method = "chi-square" if long_enough and _is_regular(t, Y) else "lomb-scargle"
+
+    if method == "lomb-scargle":
+        power = lomb_scargle(t, Y, periods)
+    elif method == "chi-square":
+        power = chi_square(Y, t[1] - t[0], periods)
+    else:
+        raise ValueError(f"❌ Unknown periodogram method '{method}' (use auto, lomb-scargle or chi-square).")
+
+    # --------------------------
+    # Peaks and tidy spectrum
+    has_power = np.isfinite(power).any(axis=1)
+    best = np.argmax(np.where(np.isfinite(power), power, -np.inf), axis=1)
+
+    peaks = series[by + ["Metric"]].copy()
+    valid = np.isfinite(Y)
+    step = np.median(np.diff(t)) if len(t) > 1 else 0.0
+    first = np.where(valid.any(axis=0), t[valid.argmax(axis=0)], np.nan)
+    last = np.where(valid.any(axis=0), t[len(t) - 1 - valid[::-1].argmax(axis=0)], np.nan)
+    hours = last - first + step
+    short = ~(hours >= MIN_CYCLES * periods.max())
+    edge = (best == 0) | (best == len(periods) - 1)
+    reliable = has_power & ~short & ~edge
+
+    peaks["N"] = valid.sum(axis=0)
+    peaks["Hours"] = np.round(hours, 2)
+    peaks["Peak_Period"] = np.where(reliable, periods[best], np.nan)
+    peaks["Peak_Power"] = np.where(reliable, power[np.arange(len(best)), best], np.nan)
+    peaks["Method"] = method
+    peaks["Note"] = np.select(
+        [~has_power, short, edge],
+        ["no power", f"fewer than {MIN_CYCLES} cycles of {periods.max():g} h",
+         f"peak at the edge of the {periods.min():g}–{periods.max():g} h grid"], "")
+
+    spectrum = series[by + ["Metric"]].loc[np.repeat(np.arange(len(series)), len(periods))].reset_index(drop=True)
+    spectrum["Period"] = np.tile(periods, len(series))
+    spectrum["Power"] = power.ravel()
+
+    return peaks, spectrum
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Background I/O: workbook reads and writes overlapped with the computation
+Created by Pablo SAIDI
+
+Scripts used to wait on the disk at every step: the export was parsed only
+once the dialogs were answered, and each output workbook was written before
+the next figure could be drawn. Two background threads now take this I/O:
+
+    prefetch(fn, ...)     starts an input read (pd.read_excel...) as soon as
+                          the file is known; `.result()` waits for it where
+                          the script used to read
+    background(fn, ...)   runs an output write; write_table / write_tables
+                          (tse_calo.export) go through it, so workbooks are
+                          written while the script computes and plots
+    drain()               waits for the pending writes, raises their first
+                          error and prints how much I/O time was hidden
+
+Reads and writes each have one thread, so writes keep their order. Tables
+are handed to the writer as they are at the call (a snapshot: shallow under
+copy-on-write, a deep copy otherwise), whatever the script does with them
+afterwards. On by default; with TSE_BACKGROUND_IO=0 every read and write
+runs in the script, where it is called, as before.
+"""
+
+import atexit
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tse_calo.profiling import stage
+
+KINDS = ("read", "write")
+
+_executors = {}
+_pending = []
+_stats = {kind: {"tasks": 0, "busy": 0.0, "waited": 0.0} for kind in KINDS}
+_lock = threading.Lock()
+_worker = threading.local()
+
+
+def enabled(value=None):
+    """Background I/O for this run (TSE_BACKGROUND_IO, default: on)."""
+    if value is None:
+        value = os.environ.get("TSE_BACKGROUND_IO", "")
+    return str(value).strip().lower() not in ("0", "false", "no", "off")
+
+
+def in_background():
+    """True inside a background read / write (nested I/O then runs in place)."""
+    return getattr(_worker, "active", False)
+
+
+class Task:
+    """One background read / write; `result()` waits for it and returns its value."""
+
+    def __init__(self, kind, fn, args, kwargs):
+        self.kind = kind
+        self._call = (fn, args, kwargs)
+        self._future = None
+        self._done = False
+        self._value = None
+
+    def _run(self):
+        fn, args, kwargs = self._call
+        _worker.active = True
+        t0 = time.perf_counter()
+        try:
+            with stage(f"background_{self.kind}"):
+                return fn(*args, **kwargs)
+        finally:
+            _worker.active = False
+            with _lock:
+                _stats[self.kind]["tasks"] += 1
+                _stats[self.kind]["busy"] += time.perf_counter() - t0
+
+    def start(self):
+        self._future = _executor(self.kind).submit(self._run)
+        return self
+
+    def result(self):
+        if self._future is None:  # background I/O off: run here, now
+            if not self._done:
+                fn, args, kwargs = self._call
+                self._value, self._done = fn(*args, **kwargs), True
+            return self._value
+        t0 = time.perf_counter()
+        try:
+            return self._future.result()
+        finally:
+            with _lock:
+                _stats[self.kind]["waited"] += time.perf_counter() - t0
+
+
+def _executor(kind):
+    with _lock:
+        if kind not in _executors:
+            if not _executors:
+                atexit.register(_drain_at_exit)
+            _executors[kind] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"tse-{kind}")
+        return _executors[kind]
+
+
+def prefetch(fn, *args, **kwargs):
+    """Start reading an input now; the returned task's `result()` gives the value where it is needed."""
+    task = Task("read", fn, args, kwargs)
+    return task.start() if enabled() and not in_background() else task
+
+
+def background(fn, *args, **kwargs):
+    """Run an output write on the writer thread (in place when background I/O is off)."""
+    task = Task("write", fn, args, kwargs)
+    if not enabled() or in_background():
+        task.result()
+        return task
+    with _lock:
+        _pending.append(task)
+    return task.start()
+
+
+# --------------------------
+# ⏳ End of run
+def drain(report=True):
+    """
+    Wait for every pending write and raise the first error. Prints the I/O
+    time spent in the background and the part of it hidden behind the
+    script (busy time - time the script waited); returns these figures.
+    """
+    with _lock:
+        tasks = list(_pending)
+        _pending.clear()
+    error = None
+    for task in tasks:
+        try:
+            task.result()
+        except Exception as e:  # every write is waited for before raising
+            error = error or e
+    if error is not None:
+        raise error
+
+    with _lock:
+        summary = {kind: dict(values) for kind, values in _stats.items()}
+    busy = sum(s["busy"] for s in summary.values())
+    waited = sum(s["waited"] for s in summary.values())
+    summary["hidden"] = max(busy - waited, 0.0)
+    if report and busy:
+        counts = " and ".join(f"{s['tasks']} {kind}{'s' if s['tasks'] > 1 else ''} ({s['busy']:.1f} s)"
+                              for kind, s in summary.items() if kind in KINDS and s["tasks"])
+        print(f"⏩ Background I/O: {counts}, {summary['hidden']:.1f} s hidden behind the script "
+              f"({waited:.1f} s waited)")
+    return summary
+
+
+def _drain_at_exit():
+    """Writes still pending when a script stops early: finish them and report their error."""
+    try:
+        drain(report=False)
+    except Exception as e:
+        print(f"❌ Background write failed: {e!r}")
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Stage timing and peak-memory instrumentation
+Created by Pablo SAIDI
+
+Off by default. Enable it per run with the TSE_PROFILE environment variable:
+
+    TSE_PROFILE=1        → JSON trace written at the end of the run
+    TSE_PROFILE=summary  → JSON trace + summary table printed in the console
+    TSE_PROFILE_DIR=...  → folder of the traces (default: current folder)
+
+Scripts are linear, so a stage is opened by `checkpoint("name")` and lasts
+until the next checkpoint (or the end of the run). Library code can use
+`with stage("name"):` for a nested stage. While a stage runs, a daemon
+thread samples the resident memory (RSS) every few milliseconds to get its
+peak; psutil is used when installed, /proc/self/statm otherwise (Linux).
+"""
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+SAMPLE_SECONDS = 0.01
+
+_mode = os.environ.get("TSE_PROFILE", "").strip().lower()
+ENABLED = _mode not in ("", "0", "false", "no", "off")
+SUMMARY = _mode == "summary"
+
+
+def _rss_reader():
+    try:
+        import psutil
+        process = psutil.Process()
+        return lambda: process.memory_info().rss
+    except ImportError:
+        pass
+    if os.path.exists("/proc/self/statm"):
+        page = os.sysconf("SC_PAGE_SIZE")
+
+        def read_statm():
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * page
+        return read_statm
+    return lambda: None
+
+
+class _Tracer:
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.started = datetime.now()
+        self.read_rss = _rss_reader()
+        self.records = []
+        self.current = None
+        self.peak = self.read_rss() or 0
+        self.lock = threading.Lock()
+        self.sampler = threading.Thread(target=self._sample, daemon=True)
+        self.sampler.start()
+
+    def _sample(self):
+        while True:
+            rss = self.read_rss()
+            if rss is None:
+                return
+            with self.lock:
+                self.peak = max(self.peak, rss)
+                for rec in self._open():
+                    rec["rss_peak"] = max(rec["rss_peak"], rss)
+            time.sleep(SAMPLE_SECONDS)
+
+    def _open(self):
+        return [r for r in self.records if r["end"] is None]
+
+    def begin(self, name, parent=None):
+        rss = self.read_rss()
+        rec = {"stage": name, "parent": parent, "start": time.perf_counter() - self.t0, "end": None,
+               "rss_start": rss, "rss_peak": rss or 0, "rss_end": None}
+        with self.lock:
+            self.records.append(rec)
+        return rec
+
+    def end(self, rec):
+        rss = self.read_rss()
+        with self.lock:
+            rec["end"] = time.perf_counter() - self.t0
+            rec["rss_end"] = rss
+            rec["rss_peak"] = max(rec["rss_peak"], rss or 0)
+
+    def finish(self):
+        if self.current is not None:
+            self.end(self.current)
+            self.current = None
+        for rec in self._open():
+            self.end(rec)
+
+        mb = 1024 * 1024
+        stages = [{
+            "stage": r["stage"],
+            "parent": r["parent"],
+            "start_s": round(r["start"], 4),
+            "duration_s": round(r["end"] - r["start"], 4),
+            "rss_start_mb": None if r["rss_start"] is None else round(r["rss_start"] / mb, 1),
+            "rss_peak_mb": round(r["rss_peak"] / mb, 1) if r["rss_peak"] else None,
+            "rss_end_mb": None if r["rss_end"] is None else round(r["rss_end"] / mb, 1),
+        } for r in self.records]
+
+        return {
+            "script": os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "interactive",
+            "started": self.started.isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "total_s": round(time.perf_counter() - self.t0, 4),
+            "peak_rss_mb": round(self.peak / mb, 1) if self.peak else None,
+            "stages": stages,
+        }
+
+
+_tracer = None
+
+
+def _get_tracer():
+    global _tracer
+    if _tracer is None:
+        _tracer = _Tracer()
+        atexit.register(_write_trace)
+    return _tracer
+
+
+def checkpoint(name):
+    """End the current top-level stage and start `name` (no-op unless TSE_PROFILE is set)."""
+    if not ENABLED:
+        return
+    tracer = _get_tracer()
+    if tracer.current is not None:
+        tracer.end(tracer.current)
+    tracer.current = tracer.begin(name)
+
+
+@contextmanager
+def stage(name):
+    """Nested stage for library code (no-op unless TSE_PROFILE is set)."""
+    if not ENABLED:
+        yield
+        return
+    tracer = _get_tracer()
+    rec = tracer.begin(name, parent=tracer.current["stage"] if tracer.current else None)
+    try:
+        yield
+    finally:
+        tracer.end(rec)
+
+
+def summary_table(trace):
+    """Human-readable table: one line per stage name (calls, total time, share, peak RSS)."""
+    totals = {}
+    for s in trace["stages"]:
+        key = (s["stage"], s["parent"])
+        t = totals.setdefault(key, {"calls": 0, "seconds": 0.0, "peak": None})
+        t["calls"] += 1
+        t["seconds"] += s["duration_s"]
+        if s["rss_peak_mb"] is not None:
+            t["peak"] = max(t["peak"] or 0, s["rss_peak_mb"])
+
+    width = max([len(k[0]) + (2 if k[1] else 0) for k in totals] + [5])
+    lines = [f"{'Stage':<{width}}  {'Calls':>5}  {'Time (s)':>9}  {'Share':>6}  {'Peak RSS (MB)':>13}",
+             "-" * (width + 43)]
+    for (name, parent), t in totals.items():
+        label = f"  {name}" if parent else name
+        share = 100 * t["seconds"] / trace["total_s"] if trace["total_s"] else 0
+        peak = f"{t['peak']:.1f}" if t["peak"] is not None else "n/a"
+        lines.append(f"{label:<{width}}  {t['calls']:>5}  {t['seconds']:>9.3f}  {share:>5.1f}%  {peak:>13}")
+    lines.append("-" * (width + 43))
+    peak = f"{trace['peak_rss_mb']:.1f}" if trace["peak_rss_mb"] is not None else "n/a"
+    lines.append(f"{'Total':<{width}}  {'':>5}  {trace['total_s']:>9.3f}  {'':>6}  {peak:>13}")
+    return "\n".join(lines)
+
+
+def _write_trace():
+    trace = _tracer.finish()
+    folder = os.environ.get("TSE_PROFILE_DIR", os.getcwd())
+    os.makedirs(folder, exist_ok=True)
+    stem = os.path.splitext(trace["script"])[0]
+    path = os.path.join(folder, f"tse_trace_{stem}_{_tracer.started:%Y%m%d_%H%M%S}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(trace, f, indent=2)
+
+    if SUMMARY:
+        print("\n⏱️ Stage timing / memory")
+        print(summary_table(trace))
+    print(f"⏱️ Trace written: {path}")
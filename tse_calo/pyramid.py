@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Multi-resolution aggregate pyramid: every zoom level of an experiment in one pass
+Created by Pablo SAIDI
+
+Tables and figures look at the same rows at 15 min, 1 h, 12 h (light /
+dark phase) and whole-day resolution, and each used to aggregate the raw
+rows again. `build_pyramid` bins the rows once at the finest level, then
+derives each coarser level from the one below it:
+
+    15min   Animal × 15-min bin        (from the rows)
+    1h      Animal × hour              (from 15min)
+    12h     Animal × ZT0–12 / ZT12–24  (from 1h; light / dark phase in LD12:12)
+    day     Animal × biological day    (from 12h; 07:00 → 07:00)
+
+Bins start at lights on (07:00) so they nest exactly. Each level keeps the
+sum and the number of samples of every metric (<metric>_sum, <metric>_n):
+sums add up from level to level, and means are sum / n at any level, so no
+level is an approximation of another. `level_values` turns a level into
+one column per metric (RER and EE as means, EE staying a rate in kcal/h at
+every level; XT_YT and Feed_diff as sums) and is a lookup: nothing is
+recomputed from the rows.
+
+The live mode keeps the pyramid with its cached rows (<export>_live/_cache,
+one pickle per level) and only rebins the hours touched by new rows; the
+analysis service keeps it with the parsed export (GET /levels).
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from tse_calo.engine import aggregate
+from tse_calo.light import LIGHTS_ON_HOUR
+
+LEVELS = {"15min": pd.Timedelta(minutes=15), "1h": pd.Timedelta(hours=1),
+          "12h": pd.Timedelta(hours=12), "day": pd.Timedelta(days=1)}  # finest first
+HOW = {"RER": "mean", "XT_YT": "sum", "Feed_diff": "sum", "EE": "mean"}  # EE in kcal/h, as live.HOURLY and every service route
+LIGHTS_ON = pd.Timedelta(hours=LIGHTS_ON_HOUR)
+NAT = np.iinfo(np.int64).min
+
+
+def _bin_start(t, width):
+    """Start of the `width` bin of each timestamp (int64 ns), bins aligned on lights on."""
+    offset, width = LIGHTS_ON.value, pd.Timedelta(width).value
+    return (t - offset) // width * width + offset
+
+
+def _sums(frame, by):
+    """Sum of every <metric>_sum / <metric>_n column per (by, Start), sorted."""
+    return aggregate(frame, [by, "Start"], {c: "sum" for c in frame.columns if c not in (by, "Start")})
+
+
+def base_level(rows, metrics=None, by="Animal", time="DateTime"):
+    """Finest level: rows binned by 15 min, sum and sample count of every metric."""
+    metrics = [m for m in (metrics or HOW) if m in rows.columns]
+    t = rows[time].to_numpy(dtype="datetime64[ns]").view(np.int64)
+    valid = t != NAT
+    frame = pd.DataFrame({by: rows[by].to_numpy()[valid],
+                          "Start": _bin_start(t[valid], LEVELS["15min"]).view("datetime64[ns]")})
+    for metric in metrics:
+        values = pd.to_numeric(rows[metric], errors="coerce").to_numpy(dtype="float64")[valid]
+        seen = ~np.isnan(values)
+        frame[f"{metric}_sum"] = np.where(seen, values, 0.0)
+        frame[f"{metric}_n"] = seen.astype(np.int64)
+    return _sums(frame, by)
+
+
+def derive_levels(base, by="Animal"):
+    """{level: table} from the finest level: each level is the sum of the bins of the level below."""
+    names = list(LEVELS)
+    pyramid = {names[0]: base}
+    for finer, level in zip(names, names[1:]):
+        table = pyramid[finer]
+        start = _bin_start(table["Start"].to_numpy(dtype="datetime64[ns]").view(np.int64), LEVELS[level])
+        pyramid[level] = _sums(table.assign(Start=start.view("datetime64[ns]")), by)
+    return pyramid
+
+
+def build_pyramid(rows, metrics=None, by="Animal", time="DateTime"):
+    """
+    Every level of `rows` (prepared rows: Animal, DateTime, RER / XT_YT /
+    Feed_diff / EE) in one pass: {"15min": ..., "1h": ..., "12h": ..., "day": ...}.
+    """
+    return derive_levels(base_level(rows, metrics, by, time), by)
+
+
+def update_pyramid(pyramid, rows, since, by="Animal", time="DateTime"):
+    """
+    Pyramid after new rows: the 15-min bins of each animal from `since[animal]`
+    (a bin start) on are rebinned from `rows`, the coarser levels derived again
+    from the finest one. Animals missing from `since` keep their bins.
+    """
+    base = pyramid[next(iter(LEVELS))]
+    metrics = [c[:-len("_sum")] for c in base.columns if c.endswith("_sum")]
+    fresh = base_level(rows, metrics, by, time)
+    fresh = fresh[fresh["Start"] >= fresh[by].map(since)]
+    stale = base["Start"] >= base[by].map(since)
+    base = pd.concat([base[~stale], fresh]).sort_values([by, "Start"], ignore_index=True)
+    return derive_levels(base, by)
+
+
+def level_values(pyramid, level, metrics=None, how=None, by="Animal"):
+    """
+    One level as Animal, Start, Day (biological day), ZT (hours since lights
+    on) and one column per metric: sum, or mean (sum / n) as in HOW / `how`.
+    Bins without any sample of a metric are NaN.
+    """
+    if level not in pyramid:
+        raise ValueError(f"❌ Unknown level '{level}'. Choose among: {', '.join(LEVELS)}")
+    table = pyramid[level]
+    available = [c[:-len("_sum")] for c in table.columns if c.endswith("_sum")]
+    metrics = metrics or available
+    unknown = [m for m in metrics if m not in available]
+    if unknown:
+        raise ValueError(f"❌ Unknown metric(s) {unknown}. Choose among: {', '.join(available)}")
+    how = {**HOW, **(how or {})}
+
+    bio = table["Start"] - LIGHTS_ON
+    out = pd.DataFrame({by: table[by], "Start": table["Start"], "Day": bio.dt.date,
+                        "ZT": (bio - bio.dt.normalize()) / pd.Timedelta(hours=1)})
+    for metric in metrics:
+        total, n = table[f"{metric}_sum"], table[f"{metric}_n"]
+        out[metric] = (total if how.get(metric, "mean") == "sum" else total / n).where(n > 0)
+    return out
+
+
+# --------------------------
+# 💾 Persistence with the cached experiment
+def save_pyramid(pyramid, folder):
+    """One pickle per level in `folder` (pyramid_<level>.pkl)."""
+    os.makedirs(folder, exist_ok=True)
+    for level, table in pyramid.items():
+        table.to_pickle(os.path.join(folder, f"pyramid_{level}.pkl"))
+
+
+def load_pyramid(folder):
+    """Levels saved by save_pyramid, or None when one of them is missing."""
+    paths = {level: os.path.join(folder, f"pyramid_{level}.pkl") for level in LEVELS}
+    if not all(os.path.exists(p) for p in paths.values()):
+        return None
+    return {level: pd.read_pickle(p) for level, p in paths.items()}
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Data-quality index: gaps, duplicates, out-of-order rows, NaT and NaN runs
+Created by Pablo SAIDI
+
+Everything comes from one stable sort by (Animal, DateTime) and one diff of
+the time axis, so the check costs about as much as the sort the scripts
+already do. Problems it catches silently corrupt the hourly sums:
+- NaT timestamps left by the errors="coerce" datetime parse
+- duplicated timestamps (e.g. overlapping files after TSE_merge_excel.py)
+- rows out of chronological order in the file
+- missing samples (gaps longer than the sampling interval of the animal,
+  detected per animal by tse_calo.sampling unless `interval` is given)
+- runs of NaN in the metric columns
+"""
+
+import numpy as np
+import pandas as pd
+
+from tse_calo.export import write_tables
+from tse_calo.sampling import detect_intervals
+
+DEFAULT_METRICS = ["RER", "XT_YT", "Feed", "EE"]
+
+
+def _runs(flags, starts):
+    """Start index and length of every run of True in `flags` (runs restart at `starts`)."""
+    flags = np.asarray(flags, dtype=bool)
+    begin = flags & (starts | ~np.r_[False, flags[:-1]])
+    run_id = np.cumsum(begin) - 1
+    first = np.flatnonzero(begin)
+    lengths = np.bincount(run_id[flags], minlength=len(first)) if len(first) else np.array([], dtype=int)
+    return first, lengths
+
+
+def quality_index(df, time_col="DateTime", by="Animal", metrics=None, interval=None):
+    """
+    Return (summary, events, coverage):
+    - summary: one row per animal with counts and coverage %
+    - events: one row per gap / duplicate / out-of-order row / NaN run
+    - coverage: % of expected samples present per animal × hour bin
+    """
+    metrics = [m for m in (metrics or DEFAULT_METRICS) if m in df.columns]
+    animal = df[by].to_numpy()
+    t = df[time_col].to_numpy(dtype="datetime64[ns]")
+    nat = np.isnat(t)
+
+    # --------------------------
+    # Out-of-order rows: time goes backwards within an animal, in file order
+    file_order = np.zeros(len(df), dtype=bool)
+    same = np.r_[False, animal[1:] == animal[:-1]]
+    prev_t = np.r_[np.datetime64("NaT", "ns"), t[:-1]]
+    file_order[1:] = same[1:] & ~nat[1:] & ~np.isnat(prev_t[1:]) & (t[1:] < prev_t[1:])
+
+    # --------------------------
+    # One stable sort + one diff
+    order = np.lexsort((t, animal))
+    a_s, t_s = animal[order], t[order]
+    nat_s = nat[order]
+    new_animal = np.r_[True, a_s[1:] != a_s[:-1]]
+    step = np.r_[np.timedelta64(0, "ns"), t_s[1:] - t_s[:-1]]
+    comparable = ~new_animal & ~nat_s & ~np.r_[True, nat_s[:-1]]
+
+    if interval is None:
+        intervals = detect_intervals(df, by=by, time=time_col)
+    else:
+        intervals = pd.Series(pd.Timedelta(interval), index=pd.unique(a_s))
+    iv = intervals.reindex(a_s).to_numpy(dtype="timedelta64[ns]")  # interval of the animal of each sorted row
+
+    duplicate = comparable & (step == np.timedelta64(0, "ns"))
+    gap = comparable & (step > iv * 1.5)
+    missing = np.zeros(len(step), dtype=np.int64)
+    missing[gap] = np.rint(step[gap] / iv[gap]).astype(np.int64) - 1
+
+    # --------------------------
+    # Events table
+    events = [
+        pd.DataFrame({"Animal": a_s[gap], "Type": "Gap", "Start": t_s[np.flatnonzero(gap) - 1],
+                      "End": t_s[gap], "Samples": missing[gap]}),
+        pd.DataFrame({"Animal": a_s[duplicate], "Type": "Duplicate", "Start": t_s[duplicate],
+                      "End": t_s[duplicate], "Samples": 1}),
+        pd.DataFrame({"Animal": animal[file_order], "Type": "Out of order", "Start": t[file_order],
+                      "End": t[file_order], "Samples": 1}),
+        pd.DataFrame({"Animal": animal[nat], "Type": "NaT", "Start": pd.NaT, "End": pd.NaT, "Samples": 1}),
+    ]
+
+    summary = pd.DataFrame({"Animal": a_s, "Rows": 1, "NaT": nat_s, "Duplicates": duplicate,
+                            "Gaps": gap, "Missing_Samples": missing})
+    summary = summary.groupby("Animal", sort=True).sum()
+    summary["Out_of_Order"] = pd.Series(file_order, index=animal).groupby(level=0).sum()
+
+    for m in metrics:
+        isnan = pd.to_numeric(df[m], errors="coerce").isna().to_numpy()[order]
+        first, lengths = _runs(isnan, new_animal)
+        runs = pd.DataFrame({"Animal": a_s[first], "Type": f"NaN {m}", "Start": t_s[first],
+                             "End": t_s[np.minimum(first + lengths - 1, len(t_s) - 1)], "Samples": lengths})
+        events.append(runs)
+        per_animal = runs.groupby("Animal")["Samples"]
+        summary[f"NaN_Runs_{m}"] = per_animal.size().reindex(summary.index, fill_value=0)
+        summary[f"Longest_NaN_Run_{m}"] = per_animal.max().reindex(summary.index, fill_value=0)
+
+    events = pd.concat([e for e in events if len(e)], ignore_index=True) if any(len(e) for e in events) \
+        else pd.DataFrame(columns=["Animal", "Type", "Start", "End", "Samples"])
+
+    # --------------------------
+    # Coverage: present unique samples / expected samples
+    valid_t = pd.Series(t_s[~nat_s & ~duplicate], index=a_s[~nat_s & ~duplicate])
+    span = valid_t.groupby(level=0).agg(["min", "max"])
+    expected = ((span["max"] - span["min"]) / intervals.reindex(span.index)).round().astype("int64") + 1
+    summary["Coverage_%"] = (100 * valid_t.groupby(level=0).size() / expected).reindex(summary.index).round(2)
+    summary["Interval"] = [str(value) for value in intervals.reindex(summary.index)]
+
+    hours = pd.DataFrame({"Animal": valid_t.index, "Hour": valid_t.dt.floor("h").to_numpy()})
+    counts = hours.groupby(["Animal", "Hour"]).size()
+    # Every hour from the first to the last sample of each animal: an hour without any sample is 0 %
+    span_h = hours.groupby("Animal")["Hour"].agg(["min", "max"])
+    n_hours = ((span_h["max"] - span_h["min"]) // pd.Timedelta(hours=1)).to_numpy(dtype="int64") + 1
+    offset = np.arange(n_hours.sum()) - np.repeat(np.cumsum(n_hours) - n_hours, n_hours)
+    full = pd.MultiIndex.from_arrays(
+        [np.repeat(span_h.index.to_numpy(), n_hours),
+         np.repeat(span_h["min"].to_numpy(), n_hours) + offset * np.timedelta64(1, "h")],
+        names=["Animal", "Hour"])
+    coverage = counts.reindex(full, fill_value=0).rename("Samples").reset_index()
+    # Expected samples: interval grid of the animal (from its first sample) inside the part of the hour
+    # within its recording, so the first and last hours, partial, are complete when nothing is missing
+    owner = coverage["Animal"].to_numpy()
+    t_first = span["min"].reindex(owner).to_numpy(dtype="datetime64[ns]").view(np.int64)
+    t_last = span["max"].reindex(owner).to_numpy(dtype="datetime64[ns]").view(np.int64)
+    every = intervals.reindex(owner).to_numpy(dtype="timedelta64[ns]").view(np.int64)
+    start = coverage["Hour"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+    low, high = np.maximum(start, t_first), np.minimum(start + pd.Timedelta(hours=1).value - 1, t_last)
+    coverage["Expected"] = (high - t_first) // every + (t_first - low) // every + 1  # grid points in [low, high]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percent = np.where(coverage["Expected"] > 0, 100 * coverage["Samples"] / coverage["Expected"], 100.0)
+    coverage["Coverage_%"] = np.round(np.clip(percent, None, 100), 1)
+
+    return summary.reset_index(), events, coverage
+
+
+def combine_quality(parts):
+    """
+    Merge the (summary, events, coverage) of animal partitions (tse_calo.partitions)
+    into the tables one quality_index call on all the rows gives.
+    """
+    summaries, events, coverages = zip(*parts)
+    summary = pd.concat(summaries, ignore_index=True)
+    coverage = pd.concat(coverages, ignore_index=True)
+    events = [e for e in events if len(e)]
+    if events:
+        events = pd.concat(events, ignore_index=True)
+        # Same order as quality_index: event type first (NaN runs in metric order), then animal
+        types = ["Gap", "Duplicate", "Out of order", "NaT"]
+        types += [t for t in dict.fromkeys(events["Type"]) if t not in types]
+        rank = events["Type"].map({t: i for i, t in enumerate(types)}).to_numpy()
+        events = events.iloc[rank.argsort(kind="stable")].reset_index(drop=True)
+    else:
+        events = pd.DataFrame(columns=["Animal", "Type", "Start", "End", "Samples"])
+    return summary, events, coverage
+
+
+def report_quality(df, output_path, time_col="DateTime", by="Animal", metrics=None, interval=None, parts=None):
+    """
+    Run the index, print a compact report and write the three tables next to the outputs.
+    Out-of-core runs pass `parts` (quality_index of each animal partition) instead of `df`.
+    """
+    if parts is None:
+        summary, events, coverage = quality_index(df, time_col, by, metrics, interval)
+    else:
+        summary, events, coverage = combine_quality(parts)
+
+    totals = summary[["NaT", "Duplicates", "Out_of_Order", "Gaps", "Missing_Samples"]].sum()
+    print("🩺 Data quality: "
+          f"{int(totals['NaT'])} NaT | {int(totals['Duplicates'])} duplicates | "
+          f"{int(totals['Out_of_Order'])} out of order | {int(totals['Gaps'])} gaps "
+          f"({int(totals['Missing_Samples'])} missing samples) | "
+          f"coverage {summary['Coverage_%'].min():.1f}–{summary['Coverage_%'].max():.1f} %")
+    low = coverage[coverage["Coverage_%"] < 100]
+    if len(low):
+        print(f"⚠️ {len(low)} animal-hour bin(s) below 100 % coverage: check {output_path}")
+
+    write_tables({"Summary": summary, "Events": events, "Hourly_Coverage": coverage}, output_path)
+    return summary, events, coverage
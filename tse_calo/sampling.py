@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Sampling interval of each animal, detected from its timestamps
+Created by Pablo SAIDI
+
+The scripts were written for 15-min exports: timestamp alignment of 15 min /
+7 min 30 s, "1 hour" rolling means of 4 points, 15-min resampling grids and
+hourly sums of 4 samples. The interval is now measured on the data, per
+animal (median of the positive steps between consecutive timestamps, one
+lexsort + diff for all animals), and those steps are derived from it:
+
+    intervals = detect_intervals(df)                                  # {animal: Timedelta}
+    df["DateTime"] = df["DateTime"] - row_shift(df, window_shift(intervals, "2"))
+    hourly_points(intervals[animal])                                  # samples in 1 h (rolling means)
+    grid_interval(intervals)                                          # step of a grid shared by animals
+    weight_rates(df_day, intervals)                                   # EE before hourly sums
+    rate_samples(df_day, intervals)                                   # 15-min samples behind those sums
+
+Hourly sums of rates (EE, kcal/h) count the samples of the hour: at 1 min an
+hour holds 60 samples instead of 4. `weight_rates` scales them by
+interval / 15 min, so hourly sums keep the meaning they had with 15-min
+exports (and stay identical for them). `rate_samples` counts the 15-min
+samples behind each sum (EE_samples), so that sum / samples is the mean
+rate of the hour (kcal/h) even when the hour is partial or has gaps. 15-min
+exports give the same outputs as before at every step.
+"""
+
+import numpy as np
+import pandas as pd
+
+REFERENCE_INTERVAL = pd.Timedelta(minutes=15)
+ALIGNMENTS = {"1": 1.0, "2": 0.5, "3": 0.0}  # dialog code → share of the interval removed from the timestamps
+RATE_COLUMNS = ("EE",)
+
+
+def detect_intervals(df, by="Animal", time="DateTime", default=None):
+    """
+    Sampling interval of each animal (Series animal → Timedelta, sorted by
+    animal): median of its positive steps, rounded to the second. Animals
+    with fewer than two timestamps get the median of the others (`default`,
+    else 15 min, when no animal has one).
+    """
+    animal = df[by].to_numpy()
+    animals = np.sort(pd.unique(animal))
+    t = df[time].to_numpy(dtype="datetime64[ns]").view(np.int64)
+    valid = t != np.iinfo(np.int64).min  # NaT
+    animal, t = animal[valid], t[valid]
+
+    order = np.lexsort((t, animal))
+    a_s, t_s = animal[order], t[order]
+    step = np.diff(t_s)
+    positive = (a_s[1:] == a_s[:-1]) & (step > 0)
+
+    steps = pd.Series(step[positive], index=a_s[1:][positive])
+    found = pd.to_timedelta(steps.groupby(level=0, sort=True).median(), unit="ns").dt.round("1s")
+
+    if default is None:
+        default = found.median() if len(found) else REFERENCE_INTERVAL
+    intervals = found.reindex(animals).fillna(pd.Timedelta(default))
+    intervals.index.name = by
+    return intervals.rename("Interval")
+
+
+def window_shift(intervals, alignment):
+    """Timestamp correction of each animal for a dialog code: 1 = whole interval, 2 = half, 3 = none."""
+    if str(alignment) not in ALIGNMENTS:
+        raise ValueError("❌ Invalid choice. Restart and enter 1, 2, or 3.")
+    return intervals * ALIGNMENTS[str(alignment)]
+
+
+def row_shift(df, shifts, by="Animal"):
+    """Per-row Timedelta of the animal of each row (`shifts`: Series animal → Timedelta, or one value)."""
+    if not isinstance(shifts, pd.Series):
+        return pd.Timedelta(shifts)
+    values = shifts.reindex(df[by].to_numpy()).to_numpy()
+    return pd.Series(values, index=df.index).fillna(pd.Timedelta(0))
+
+
+def hourly_points(interval, span="1h"):
+    """Number of samples covering `span` at `interval` (4 for 15 min, 60 for 1 min)."""
+    return max(1, int(round(pd.Timedelta(span) / pd.Timedelta(interval))))
+
+
+def grid_interval(intervals):
+    """Step of a time grid shared by all animals: the shortest interval (no animal is sub-sampled)."""
+    return intervals.min() if len(intervals) else REFERENCE_INTERVAL
+
+
+def interval_label(interval, sep=""):
+    """Label of an interval: "15min", "1min", "30s" (`sep`="-": "15-min", " ": "15 min" for titles)."""
+    seconds = int(pd.Timedelta(interval).total_seconds())
+    return f"{seconds // 60}{sep}min" if seconds % 60 == 0 else f"{seconds}{sep}s"
+
+
+def describe_intervals(intervals):
+    """One line for the console: "15min (8 animals)" or "1min (animals 1, 2) · 15min (animals 3, 4)"."""
+    if intervals.nunique() <= 1:
+        label = interval_label(grid_interval(intervals))
+        return f"{label} ({len(intervals)} animals)"
+    return " · ".join(f"{interval_label(value)} (animals {', '.join(map(str, group.index))})"
+                      for value, group in intervals.groupby(intervals, sort=True))
+
+
+def weight_rates(df, intervals, by="Animal", columns=RATE_COLUMNS):
+    """
+    `df` with its rate columns (EE) scaled by interval / 15 min, for hourly
+    sums that count samples as 15-min samples. The frame itself is returned
+    when every animal is sampled every 15 min.
+    """
+    columns = [c for c in columns if c in df.columns]
+    if not columns or (intervals == REFERENCE_INTERVAL).all():
+        return df
+    weight = (intervals / REFERENCE_INTERVAL).reindex(df[by].to_numpy()).fillna(1.0).to_numpy()
+    return df.assign(**{c: (df[c] * weight).astype(df[c].dtype) for c in columns})
+
+
+def rate_samples(df, intervals, by="Animal", columns=RATE_COLUMNS):
+    """
+    `df` with one `<rate>_samples` column per rate column (EE_samples): the
+    weight of each row as a 15-min sample (interval / 15 min, 0 where the
+    rate is missing). Summed in the same pass as the weighted rates, it gives
+    the samples behind each hourly sum; sum / samples is the mean rate.
+    """
+    columns = [c for c in columns if c in df.columns]
+    if not columns:
+        return df
+    weight = (intervals / REFERENCE_INTERVAL).reindex(df[by].to_numpy()).fillna(1.0).to_numpy(dtype="float32")
+    return df.assign(**{f"{c}_samples": np.where(df[c].isna().to_numpy(), np.float32(0), weight) for c in columns})
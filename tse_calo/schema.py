@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Compact in-memory schema of the calorimetry frames
+Created by Pablo SAIDI
+
+Once parsed, a long export frame still holds the Date / Time text of every
+row, the unused raw columns of the export (object dtype, because the
+metadata rows are mixed in), float64 metrics and the same few labels
+("Light", "D2_DD"...) repeated on every row. `compact` reduces it to:
+
+    DateTime                              datetime64 (Date / Time text dropped once parsed)
+    Animal                                smallest integer type (int8 up to 127 cages)
+    VO2, VCO2, RER, XT_YT, EE,
+    Feed_diff, Activity                   float32 (~7 significant digits, far above the sensor resolution)
+    Feed                                  float64 (cumulative hopper counter: its differences need full precision)
+    Day, Cycle, CycleType, Light/Dark,
+    Biological_Day, ZT_Format, Group      category
+
+Other columns are kept as they are. Group-bys on compact frames pass
+observed=True so that categorical keys only give the combinations present
+in the data, with pandas 2 as with pandas 3.
+
+The cleaning path relies on copy-on-write (always on from pandas 3; the
+scripts switch it on for their own run with `use_copy_on_write`, the library
+never touches the pandas options): column selections, renames and drops
+share the data of the frame they come from, row filters and sorts already
+return new data, and derived columns are assigned in place, so the scripts
+never need a defensive `.copy()`. Without it (tse_calo imported on pandas 2)
+the same code gives the same results, with deep copies where a snapshot is
+needed (`copy_on_write`). The unnamed raw columns are dropped with `drop_unused`
+right after the read, before the first row filter copies them.
+"""
+
+import pandas as pd
+
+RAW_TEXT = ("Date", "Time")
+FLOAT32 = ("VO2", "VCO2", "RER", "XT_YT", "EE", "Feed_diff", "Activity")
+FLOAT64 = ("Feed",)
+CATEGORIES = ("Day", "Cycle", "CycleType", "Light/Dark", "Biological_Day", "ZT_Format", "Group")
+INTEGERS = ("Animal",)
+
+
+def copy_on_write():
+    """True when pandas copies on write: always from pandas 3, when switched on for the run on pandas 2."""
+    return int(pd.__version__.split(".")[0]) >= 3 or pd.options.mode.copy_on_write is True
+
+
+def use_copy_on_write():
+    """
+    Switch copy-on-write on for the run of an entry script (pandas 2; the
+    default from pandas 3). Only the scripts call it: importing tse_calo
+    leaves the pandas options of the caller alone.
+    """
+    if not copy_on_write():
+        try:
+            pd.set_option("mode.copy_on_write", True)
+        except (KeyError, ValueError):
+            pass
+    return copy_on_write()
+
+
+def is_raw_column(col):
+    """Leftovers of the export layout, never used once the frame is parsed."""
+    return col in RAW_TEXT or str(col).startswith("Unnamed:")
+
+
+def drop_unused(df, keep=()):
+    """
+    Frame without the unnamed raw export columns (except `keep`), before any
+    row filter or sort copies them. Under copy-on-write the remaining columns
+    are not copied.
+    """
+    unused = [c for c in df.columns if str(c).startswith("Unnamed:") and c not in keep]
+    return df.drop(columns=unused) if unused else df
+
+
+def compact(df, drop_raw=True):
+    """
+    Frame in the compact schema (see module docstring).
+    `drop_raw`: drop Date / Time and the unnamed raw export columns; only
+    call it once DateTime has been parsed.
+    """
+    if drop_raw:
+        df = df.drop(columns=[c for c in df.columns if is_raw_column(c)])
+
+    converted = {}
+    for col in df.columns:
+        values = df[col]
+        if col in FLOAT32 and values.dtype != "float32":
+            converted[col] = pd.to_numeric(values, errors="coerce").astype("float32")
+        elif col in FLOAT64 and values.dtype != "float64":
+            converted[col] = pd.to_numeric(values, errors="coerce").astype("float64")
+        elif col in CATEGORIES and not isinstance(values.dtype, pd.CategoricalDtype):
+            converted[col] = values.astype("category")
+        elif col in INTEGERS and pd.api.types.is_integer_dtype(values.dtype):
+            converted[col] = pd.to_numeric(values, downcast="integer")
+    return df.assign(**converted) if converted else df
+
+
+def memory_mb(df):
+    """Resident size of a frame, text included (MB)."""
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+"""
+Warm analysis service: parsed experiments kept in memory between requests
+Created by Pablo SAIDI
+
+Exploring one experiment used to mean running TSE_One_Day_* again for every
+start date or light cycle, and parsing the whole export each time. The
+service parses an export on its first request, keeps the compact rows in
+memory and answers on localhost (HTTP, JSON / CSV / PNG):
+
+    GET /datasets                                   resident exports (rows, animals, MB, idle time)
+    GET /hourly?file=...&day=2025-10-15             hourly values of the 7 AM → 7 AM window,
+                                                    Relative_Hour × Animal
+    GET /zt?file=...&metric=RER                     ZT chronology: ZT_Day × ZT hour, one column per animal
+    GET /levels?file=...&level=12h&metric=EE        one level of the aggregate pyramid (15min, 1h, 12h,
+                                                    day; tse_calo.pyramid), Animal × bin
+    GET /figure?file=...&day=...&metric=RER         one panel per animal for the day (PNG)
+    GET /evict?file=...                             drop an export from memory
+
+Common parameters: sheet (name or position, default: first sheet), offset
+(timestamp shift in minutes, default 0), exclude_feed (1: Feed_diff > 2 g
+removed), format (json / csv), cycle (figure shading, "1" / "2" / "3",
+default "3"), animal (figure or levels of one animal). Every route gives
+the metrics with one convention (pyramid.HOW, as the live mode and the
+catalog): RER and EE as means, EE staying a rate in kcal/h; XT_YT and
+Feed_diff as sums. Feed differences, hourly values, the aggregate pyramid
+and rendered figures are cached with their dataset, so a repeated or
+neighbouring request only costs a window selection and a group-by, and any
+level of the pyramid is a lookup.
+
+Datasets are dropped least recently used first when their total size
+(rows and cached tables) goes over the memory budget, and after `idle`
+seconds without a request; when the datasets left are still over it, their
+cached tables are dropped, least recently used first, and computed again
+on the next request that needs them. An export modified on disk is parsed
+again. The server only listens on
+127.0.0.1:
+
+    python -m tse_calo.service --port 8765 --budget-mb 2048 --idle 1800 [exports to preload...]
+"""
+
+import argparse
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from tse_calo.engine import aggregate, prepare, window
+from tse_calo.facets import plot_facets
+from tse_calo.light import LIGHTS_ON_HOUR, dark_spans
+from tse_calo.live import HOURLY, LABELS, clean_export, hourly_values, zt_chronology
+from tse_calo.partitions import read_export
+from tse_calo.profiling import stage
+from tse_calo.pyramid import HOW, build_pyramid, level_values
+from tse_calo.schema import memory_mb
+
+DEFAULT_PORT = 8765
+DEFAULT_BUDGET_MB = 2048
+DEFAULT_IDLE_SECONDS = 1800
+SWEEP_SECONDS = 30  # idle datasets are looked for at most this often
+FIGURES = {"RER": ("blue", "RER", "o"), "XT_YT": ("red", "XT+YT / 8000", "s"),
+           "Feed_diff": ("green", "Feed (g/h)", "D"), "EE": ("#800080", "EE (kcal/h)", "^")}
+
+
+def _metric(name):
+    """Metric column from a metric or label name (Feed → Feed_diff)."""
+    names = {**{m: m for m in HOURLY}, **{label: m for m, label in LABELS.items()}}
+    if name not in names:
+        raise ValueError(f"❌ Unknown metric '{name}'. Choose among: {', '.join(LABELS.values())}")
+    return names[name]
+
+
+def _size_mb(value):
+    if isinstance(value, pd.DataFrame):
+        return memory_mb(value)
+    if isinstance(value, dict):
+        return sum(_size_mb(v) for v in value.values())
+    if isinstance(value, bytes):
+        return len(value) / 1024 ** 2
+    return 0.0
+
+
+# --------------------------
+# 🧠 Resident datasets
+class Dataset:
+    """One parsed export: compact rows sorted by Animal / DateTime, and the tables computed from them."""
+
+    def __init__(self, path, sheet_name=0):
+        self.path = path
+        self.sheet_name = sheet_name
+        self.mtime = os.path.getmtime(path)
+        t0 = time.perf_counter()
+        with stage("service_parse"):
+            rows = clean_export(read_export(path, sheet_name=sheet_name))
+        self.rows = rows.sort_values(["Animal", "DateTime"], ignore_index=True)
+        self.parse_seconds = time.perf_counter() - t0
+        self.last_used = time.monotonic()
+        self._cache = OrderedDict()  # least recently used first
+        self._sizes = {}
+        self._cache_mb = 0.0
+        self._lock = threading.RLock()  # figures are computed from cached hourly values
+        self.rows_mb = memory_mb(self.rows)
+
+    @property
+    def size_mb(self):
+        return self.rows_mb + self._cache_mb
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+    def cached(self, key, compute):
+        """Value of `key`, computed once per dataset (tables and figures) until `trim` drops it."""
+        with self._lock:
+            if key not in self._cache:
+                value = compute()
+                self._cache[key] = value
+                self._sizes[key] = _size_mb(value)
+                self._cache_mb += self._sizes[key]
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+    def trim(self, limit_mb):
+        """Drop cached tables, least recently used first, until the dataset fits in `limit_mb`; MB freed."""
+        freed = 0.0
+        with self._lock:
+            while self._cache and self.size_mb > limit_mb:
+                key, _ = self._cache.popitem(last=False)
+                size = self._sizes.pop(key)
+                self._cache_mb -= size
+                freed += size
+        return freed
+
+    def prepared(self, exclude_feed=False):
+        """All rows with Feed_diff and XT_YT / 8000 (no window, no timestamp shift)."""
+        return self.cached(("prepared", exclude_feed), lambda: prepare(self.rows, exclude_feed=exclude_feed))
+
+    def hourly_window(self, day, offset_minutes=0.0, exclude_feed=False):
+        """Relative_Hour × Animal values of the 7 AM → 7 AM window of `day`, with the DateTime of each hour's middle."""
+        start = pd.Timestamp(day) + pd.Timedelta(hours=LIGHTS_ON_HOUR)
+
+        def compute():
+            rows = window(self.prepared(exclude_feed), start, start + pd.Timedelta(hours=24), offset_minutes)
+            hourly = aggregate(rows, ["Relative_Hour", "Animal"], {m: how for m, how in HOW.items() if m in rows.columns})
+            hourly["DateTime"] = start + pd.to_timedelta(hourly["Relative_Hour"], unit="h") + pd.Timedelta(minutes=30)
+            return hourly
+        return self.cached(("hourly", start, float(offset_minutes), exclude_feed), compute)
+
+    def levels(self, level, metrics=None, exclude_feed=False, animal=None):
+        """One level of the aggregate pyramid (every level built in one pass on the first request)."""
+        pyramid = self.cached(("pyramid", exclude_feed), lambda: build_pyramid(self.prepared(exclude_feed)))
+        values = level_values(pyramid, level, metrics)
+        return values if animal is None else values[values["Animal"] == animal]
+
+    def zt_matrix(self, metric, exclude_feed=False):
+        """ZT chronology of one metric over the whole recording (as the live mode writes it)."""
+        sheets = self.cached(("zt", exclude_feed),
+                             lambda: zt_chronology(hourly_values(self.prepared(exclude_feed), prepared=True)))
+        return sheets[f"{LABELS[metric]}_Chronological"]
+
+    def figure(self, day, metric, cycle="3", offset_minutes=0.0, exclude_feed=False, animal=None):
+        """PNG of the hourly values of `metric` for the day, one panel per animal (or only `animal`)."""
+        def compute():
+            hourly = self.hourly_window(day, offset_minutes, exclude_feed)
+            if animal is not None:
+                hourly = hourly[hourly["Animal"] == animal]
+            if metric not in hourly.columns or hourly.empty:
+                raise ValueError(f"❌ No {LABELS[metric]} values for {day}"
+                                 + (f" (animal {animal})" if animal is not None else ""))
+            panels = {a: (rows["DateTime"], rows[metric]) for a, rows in hourly.groupby("Animal", sort=True)}
+            color, ylabel, marker = FIGURES[metric]
+            buffer = io.BytesIO()
+            plot_facets(panels, buffer, f"{LABELS[metric]} - {day} (Cycle {cycle})", ylabel,
+                        spans=dark_spans(pd.Timestamp(day) + pd.Timedelta(hours=LIGHTS_ON_HOUR), cycle),
+                        color=color, marker=marker)
+            return buffer.getvalue()
+        return self.cached(("figure", str(day), metric, str(cycle), float(offset_minutes), exclude_feed, animal),
+                           compute)
+
+    def describe(self):
+        return {"file": self.path, "sheet": self.sheet_name, "rows": len(self.rows),
+                "animals": int(self.rows["Animal"].nunique()), "size_mb": round(self.size_mb, 1),
+                "parse_s": round(self.parse_seconds, 2), "idle_s": round(time.monotonic() - self.last_used, 1)}
+
+
+class Store:
+    """Parsed exports by (file, sheet), least recently used first, kept under a memory budget."""
+
+    def __init__(self, budget_mb=DEFAULT_BUDGET_MB, idle_seconds=DEFAULT_IDLE_SECONDS):
+        self.budget_mb = budget_mb
+        self.idle_seconds = idle_seconds
+        self._datasets = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def _resident(self, key):
+        """Dataset of `key` if resident and up to date (marked as just used)."""
+        dataset = self._datasets.get(key)
+        if dataset is not None and dataset.mtime == os.path.getmtime(key[0]):
+            self._datasets.move_to_end(key)
+            dataset.touch()
+            return dataset
+        return None
+
+    def get(self, path, sheet_name=0):
+        """Dataset of the export, parsed on first use (one parse even with concurrent requests)."""
+        path = os.path.abspath(path)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"❌ File not found: {path}")
+        key = (path, sheet_name)
+        with self._lock:
+            dataset = self._resident(key)
+            if dataset is not None:
+                return dataset
+            loading = self._loading.setdefault(key, threading.Lock())
+        with loading:
+            with self._lock:
+                dataset = self._resident(key)
+            if dataset is None:
+                dataset = Dataset(path, sheet_name)
+                print(f"📥 Parsed {os.path.basename(path)}: {len(dataset.rows)} rows, "
+                      f"{dataset.rows_mb:.1f} MB in {dataset.parse_seconds:.1f} s")
+                with self._lock:
+                    self._datasets[key] = dataset
+                    self._datasets.move_to_end(key)
+                    self._loading.pop(key, None)
+        self.evict()
+        return dataset
+
+    def drop(self, path, sheet_name=0):
+        with self._lock:
+            return self._datasets.pop((os.path.abspath(path), sheet_name), None) is not None
+
+    def evict(self):
+        """
+        Drop idle datasets, then the least recently used ones while over
+        budget (the last one used stays), then cached tables of the datasets
+        left while still over budget.
+        """
+        now = time.monotonic()
+        with self._lock:
+            dropped = [key for key, d in self._datasets.items() if now - d.last_used > self.idle_seconds]
+            for key in dropped:
+                del self._datasets[key]
+            while len(self._datasets) > 1 and sum(d.size_mb for d in self._datasets.values()) > self.budget_mb:
+                dropped.append(self._datasets.popitem(last=False)[0])
+            freed = 0.0
+            for dataset in self._datasets.values():  # least recently used first
+                over = sum(d.size_mb for d in self._datasets.values()) - self.budget_mb
+                if over <= 0:
+                    break
+                freed += dataset.trim(max(dataset.rows_mb, dataset.size_mb - over))
+        for path, sheet in dropped:
+            print(f"🧹 Evicted {os.path.basename(path)} [{sheet}]")
+        if freed:
+            print(f"🧹 Dropped {freed:.1f} MB of cached tables")
+        return dropped
+
+    def describe(self):
+        with self._lock:
+            datasets = [d.describe() for d in self._datasets.values()]
+        return {"budget_mb": self.budget_mb, "idle_s": self.idle_seconds,
+                "resident_mb": round(sum(d["size_mb"] for d in datasets), 1), "datasets": datasets}
+
+
+# --------------------------
+# 🛰️ HTTP front
+def _flag(value):
+    return str(value).strip().lower() in ("1", "true", "yes", "y", "on")
+
+
+def _sheet(value):
+    return int(value) if str(value).isdigit() else value
+
+
+class Handler(BaseHTTPRequestHandler):
+    """GET routes of the service (see module docstring)."""
+
+    store = None  # set by serve()
+
+    def do_GET(self):
+        t0 = time.perf_counter()
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        route = getattr(self, f"_route_{url.path.strip('/') or 'datasets'}", None)
+        try:
+            if route is None:
+                raise LookupError(f"❌ Unknown route '{url.path}'. Use /datasets, /hourly, /zt, /levels, /figure or /evict.")
+            status, content_type, body = 200, *route(params)
+        except FileNotFoundError as e:
+            status, content_type, body = 404, "application/json", json.dumps({"error": str(e)})
+        except (LookupError, ValueError, TypeError) as e:
+            status, content_type, body = 400, "application/json", json.dumps({"error": str(e)})
+        except Exception as e:  # reported to the client, the service keeps running
+            status, content_type, body = 500, "application/json", json.dumps({"error": repr(e)})
+        self.store.evict()  # the route may have cached new tables
+        body = body.encode("utf-8") if isinstance(body, str) else body
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-Elapsed-ms", f"{elapsed_ms:.1f}")
+        self.end_headers()
+        self.wfile.write(body)
+        print(f"🛰️ {url.path} → {status} in {elapsed_ms:.0f} ms")
+
+    def log_message(self, format, *args):  # one line per request is printed by do_GET
+        pass
+
+    # Routes: params → (content type, body)
+    def _dataset(self, params):
+        if "file" not in params:
+            raise ValueError("❌ Missing 'file' parameter (path of the export).")
+        return self.store.get(params["file"], _sheet(params.get("sheet", 0)))
+
+    @staticmethod
+    def _table(df, params):
+        if params.get("format", "json") == "csv":
+            return "text/csv", df.to_csv(index=False)
+        return "application/json", df.to_json(orient="records", date_format="iso")
+
+    @staticmethod
+    def _options(params):
+        return {"offset_minutes": float(params.get("offset", 0)), "exclude_feed": _flag(params.get("exclude_feed", 0))}
+
+    @staticmethod
+    def _day(params):
+        if "day" not in params:
+            raise ValueError("❌ Missing 'day' parameter (YYYY-MM-DD).")
+        return pd.to_datetime(params["day"]).date()
+
+    def _route_datasets(self, params):
+        self.store.evict()
+        return "application/json", json.dumps(self.store.describe())
+
+    def _route_hourly(self, params):
+        return self._table(self._dataset(params).hourly_window(self._day(params), **self._options(params)), params)
+
+    def _route_zt(self, params):
+        dataset = self._dataset(params)
+        return self._table(dataset.zt_matrix(_metric(params.get("metric", "RER")),
+                                             exclude_feed=_flag(params.get("exclude_feed", 0))), params)
+
+    def _route_levels(self, params):
+        metrics = [_metric(m) for m in params["metric"].split(",")] if "metric" in params else None
+        animal = int(params["animal"]) if "animal" in params else None
+        return self._table(self._dataset(params).levels(params.get("level", "1h"), metrics, animal=animal,
+                                                        exclude_feed=_flag(params.get("exclude_feed", 0))), params)
+
+    def _route_figure(self, params):
+        animal = int(params["animal"]) if "animal" in params else None
+        png = self._dataset(params).figure(self._day(params), _metric(params.get("metric", "RER")),
+                                           cycle=params.get("cycle", "3"), animal=animal, **self._options(params))
+        return "image/png", png
+
+    def _route_evict(self, params):
+        if "file" not in params:
+            raise ValueError("❌ Missing 'file' parameter (path of the export).")
+        dropped = self.store.drop(params["file"], _sheet(params.get("sheet", 0)))
+        return "application/json", json.dumps({"evicted": dropped})
+
+
+class Server(ThreadingHTTPServer):
+    """Threaded HTTP server that also drops idle datasets between requests."""
+
+    daemon_threads = True
+
+    def __init__(self, address, store):
+        handler = type("BoundHandler", (Handler,), {"store": store})
+        super().__init__(address, handler)
+        self.store = store
+        self._last_sweep = time.monotonic()
+
+    def service_actions(self):
+        if time.monotonic() - self._last_sweep > SWEEP_SECONDS:
+            self._last_sweep = time.monotonic()
+            self.store.evict()
+
+
+def serve(port=DEFAULT_PORT, budget_mb=DEFAULT_BUDGET_MB, idle_seconds=DEFAULT_IDLE_SECONDS, preload=(), sheet_name=0):
+    """Run the service on 127.0.0.1:`port` until interrupted (Ctrl+C)."""
+    store = Store(budget_mb=budget_mb, idle_seconds=idle_seconds)
+    for path in preload:
+        store.get(path, sheet_name)
+    server = Server(("127.0.0.1", port), store)
+    print(f"🛰️ Analysis service on http://127.0.0.1:{server.server_address[1]} "
+          f"(budget {budget_mb:g} MB, idle datasets dropped after {idle_seconds:g} s)")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep parsed exports in memory and answer analysis requests on localhost.")
+    parser.add_argument("preload", nargs="*", help="exports parsed at startup")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--budget-mb", type=float, default=DEFAULT_BUDGET_MB, help="memory budget of the resident datasets")
+    parser.add_argument("--idle", type=float, default=DEFAULT_IDLE_SECONDS, help="seconds before an unused dataset is dropped")
+    parser.add_argument("--sheet", default="0", help="sheet of the preloaded exports (name or position)")
+    args = parser.parse_args(argv)
+    try:
+        serve(args.port, args.budget_mb, args.idle, args.preload, _sheet(args.sheet))
+    except KeyboardInterrupt:
+        print("⏹️ Service stopped")
+
+
+if __name__ == "__main__":
+    main()
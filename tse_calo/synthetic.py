@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic PhenoMaster-shaped exports for benchmarks and demos
+Created by Pablo SAIDI
+
+Writes workbooks / CSVs laid out like a TSE PhenoMaster export, so every
+script can run without real animal data:
+
+    row 1            title (also the sheet name) in A1, device "TX002" in C1
+    rows 3..         Box / Weight table in B:C (one row per cage)
+    2 blank rows
+    header row       Date, Time, Box, Animal No., ..., VO2(1), VCO2(1), RER, XT+YT, Feed, Energy expenditure
+    unit row         [ml/h/kg] under VO2(1)
+    data             one block of rows per box, in chronological order
+
+Signals follow a 12:12 light cycle (lights on at 07:00): VO2, RER and
+activity rise in the dark phase, food is eaten in bouts and Feed is the
+cumulative hopper counter, reset to 0 when the hopper is refilled (with a
+handling spike on the next sample, as on the real system).
+
+    python -m tse_calo.synthetic out.xlsx --cages 16 --days 4 --interval 15min
+"""
+
+import argparse
+import csv
+import os
+import numpy as np
+import pandas as pd
+
+from tse_calo.energy import LEGACY_FACTOR
+from tse_calo.light import LIGHTS_ON_HOUR
+
+HEADER = ["Date", "Time", "Box", "Animal No.", "Text1", "Weight", "LightC", "H(1)", "dH(1)",
+          "Ref.O2", "O2", "VO2(1)", "VCO2(1)", "RER", "XT+YT", "Feed", "Energy expenditure"]
+EXCEL_MAX_ROWS = 1_048_576
+
+# Sheet name read by each script → title in A1 (the scripts rename the A1 column to "Date")
+SCRIPT_SHEETS = {
+    "PS 2025 01 arvis M": "PS 2025 01 arvis M",  # TSE_One_Day_mean.py, TSE_One_Day_raw.py
+    "PS 2025 02": "PS 2025 02",                  # TSE_4_Days_raw.py, TSE_All_Graph_*.py
+    "2em PS 2025 01": "2em PS 2025 01",          # TSE_4_Days_mean.py
+    "PS 2025 03 M": "PS 2025 03",                # TSE_4_Days_Raw_Excel
+}
+
+
+def header_row(n_cages):
+    """1-based row of the column header for an export with `n_cages` boxes (9 for 4 cages)."""
+    return 3 + n_cages + 2
+
+
+def synthetic_frame(n_cages=4, days=4, interval="15min", start="2025-10-14 07:15",
+                    refill_days=2, missing_rate=0.0, seed=0):
+    """Data block of the export (one row per box × sample), as a DataFrame with the export columns."""
+    rng = np.random.default_rng(seed)
+    interval = pd.Timedelta(interval)
+    n = int(pd.Timedelta(days=days) / interval)
+    times = pd.date_range(start, periods=n, freq=interval)
+    minutes = interval.total_seconds() / 60
+
+    hour = ((times - times.normalize()) / pd.Timedelta(hours=1)).to_numpy()
+    dark = ((hour < LIGHTS_ON_HOUR) | (hour >= LIGHTS_ON_HOUR + 12))[None, :]
+    phase = np.cos(2 * np.pi * (hour - 19) / 24)[None, :]
+    shape = (n_cages, n)
+
+    weight = np.round(rng.normal(26, 2, n_cages), 1)
+    vo2 = 3000 + 500 * phase + 300 * dark + rng.normal(0, 120, shape)
+    rer = np.clip(0.86 + 0.05 * phase + 0.03 * dark + rng.normal(0, 0.02, shape), 0.7, 1.1)
+    vco2 = vo2 * rer
+    moving = rng.random(shape) < np.where(dark, 0.6, 0.2)
+    activity = np.where(moving, rng.gamma(2.0, 1500 if minutes >= 15 else 150, shape), 0.0)
+
+    # Cumulative hopper counter: meals of a few 0.01 g, more in the dark, reset at each refill
+    eating = rng.random(shape) < np.where(dark, 0.35, 0.08) * min(minutes / 15, 1)
+    intake = np.where(eating, rng.exponential(0.08 * min(minutes / 15, 1) + 0.01, shape), 0.0)
+    refill = np.zeros(n, dtype=bool)
+    if refill_days:
+        since_start = (times - times[0]) / pd.Timedelta(days=1)
+        refill_at = (times.hour == 10) & (times.minute < minutes) & (since_start >= 1)
+        refill = np.asarray(refill_at & (np.floor(since_start) % refill_days == 0), dtype=bool)
+    block = np.cumsum(refill)
+    feed = np.empty(shape)
+    for b in np.unique(block):  # a few refills at most: cumulative sum restarts at each one
+        cols = block == b
+        feed[:, cols] = np.cumsum(intake[:, cols], axis=1)
+    spike = np.r_[False, refill[:-1]]
+    feed[:, spike] += rng.uniform(2.5, 5.0, (n_cages, spike.sum()))
+
+    boxes = np.arange(1, n_cages + 1)
+    data = pd.DataFrame({
+        "Date": np.tile(times.strftime("%Y-%m-%d"), n_cages),
+        "Time": np.tile(times.strftime("%H:%M:%S"), n_cages),
+        "Box": np.repeat(boxes, n),
+        "Animal No.": np.repeat(boxes, n),
+        "Text1": "",
+        "Weight": np.repeat(weight, n),
+        "LightC": np.tile(np.where(dark[0], 0, 100), n_cages),
+        "H(1)": 0,
+        "dH(1)": 0,
+        "Ref.O2": 20.9,
+        "O2": 20.5,
+        "VO2(1)": vo2.ravel(),
+        "VCO2(1)": vco2.ravel(),
+        "RER": rer.ravel(),
+        "XT+YT": activity.ravel(),
+        "Feed": np.round(feed.ravel(), 3),
+        "Energy expenditure": vo2.ravel() * np.repeat(weight, n) * LEGACY_FACTOR,
+    })
+    if missing_rate:
+        lost = rng.random(len(data)) < missing_rate
+        data.loc[lost, ["VO2(1)", "VCO2(1)", "RER", "XT+YT", "Feed", "Energy expenditure"]] = np.nan
+    return data
+
+
+def _preamble(title, weights, ee):
+    """Metadata rows + two-row header, as lists of cells (same layout in xlsx and csv)."""
+    width = len(HEADER) if ee else len(HEADER) - 1
+    rows = [[title, None, "TX002"] + [None] * (width - 3), [None] * width]
+    rows += [[None, box, weight] + [None] * (width - 3) for box, weight in weights.items()]
+    rows += [[None] * width, [None] * width]
+    rows.append(HEADER[:width])
+    units = [None] * width
+    units[HEADER.index("VO2(1)")] = "[ml/h/kg]"
+    rows.append(units)
+    return rows
+
+
+def write_export(path, data=None, sheets=tuple(SCRIPT_SHEETS), ee=True, sep=",", **frame_kwargs):
+    """
+    Write `data` (default: `synthetic_frame(**frame_kwargs)`) as a PhenoMaster-shaped export.
+    .xlsx: one sheet per name in `sheets` (default: the sheets read by every script);
+    .csv: a single table with the same metadata rows and header.
+    Returns the data frame that was written.
+    """
+    if data is None:
+        data = synthetic_frame(**frame_kwargs)
+    if not ee:
+        data = data.drop(columns="Energy expenditure")
+    weights = data.groupby("Box", sort=True)["Weight"].first().to_dict()
+
+    if path.lower().endswith(".csv"):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f, delimiter=sep).writerows(
+                [["" if v is None else v for v in row] for row in _preamble(SCRIPT_SHEETS.get(sheets[0], sheets[0]), weights, ee)])
+            data.to_csv(f, sep=sep, header=False, index=False, lineterminator="\n")
+        return data
+
+    rows_needed = header_row(len(weights)) + 1 + len(data)
+    if rows_needed > EXCEL_MAX_ROWS:
+        raise ValueError(f"❌ {rows_needed} rows do not fit in one Excel sheet ({EXCEL_MAX_ROWS} max): "
+                         "write a .csv instead, or fewer cages / days / a longer interval.")
+
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    values = data.to_numpy(dtype=object)
+    for name in sheets:
+        ws = wb.create_sheet(name)
+        for row in _preamble(SCRIPT_SHEETS.get(name, name), weights, ee):
+            ws.append(row)
+        for row in values:
+            ws.append(row.tolist())
+    wb.save(path)
+    return data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic PhenoMaster-shaped export (.xlsx or .csv).")
+    parser.add_argument("path")
+    parser.add_argument("--cages", type=int, default=4)
+    parser.add_argument("--days", type=float, default=4)
+    parser.add_argument("--interval", default="15min")
+    parser.add_argument("--start", default="2025-10-14 07:15")
+    parser.add_argument("--sheets", nargs="+", default=list(SCRIPT_SHEETS),
+                        help="sheet names (default: the sheets read by every script)")
+    parser.add_argument("--no-ee", action="store_true", help="leave out the Energy expenditure column (input of TSE_Add_EE.py)")
+    parser.add_argument("--missing-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    data = write_export(args.path, sheets=args.sheets, ee=not args.no_ee, n_cages=args.cages, days=args.days,
+                        interval=args.interval, start=args.start, missing_rate=args.missing_rate, seed=args.seed)
+    print(f"✅ {len(data)} rows ({args.cages} cages × {args.days:g} days at {args.interval}) written to {os.path.abspath(args.path)}")
+
+
+if __name__ == "__main__":
+    main()
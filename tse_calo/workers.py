@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Worker pool for the independent pieces of one experiment
+Created by Pablo SAIDI
+
+Once Feed_diff is computed, the day windows of the 4-day scripts and the
+per-metric figures (one panel per animal) no longer depend on each other.
+`map_ordered` fans such pieces out over a pool of threads and returns their
+results in the order of the inputs, so tables are concatenated and written
+exactly as in a serial run. The pool size is chosen per run with TSE_WORKERS:
+
+    TSE_WORKERS=4 python TSE_4_Days_mean.py      (auto: one per CPU)
+
+Default 1: everything runs in the script, one piece after the other. Threads
+rather than processes: the scripts have no `__main__` guard, so spawned
+worker processes (Windows) would run their dialogs again, and the pieces
+spend most of their time in pandas / NumPy kernels and Agg rendering, which
+release the GIL. Figures drawn in workers must not go through pyplot
+(tse_calo.facets draws on standalone matplotlib figures).
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from tse_calo.profiling import stage
+
+
+def workers(value=None):
+    """Pool size of this run (TSE_WORKERS: a number or auto, default 1)."""
+    if value is None:
+        value = os.environ.get("TSE_WORKERS", "")
+    value = str(value).strip().lower()
+    if value in ("", "0", "1", "off", "no", "false"):
+        return 1
+    if value == "auto":
+        return os.cpu_count() or 1
+    try:
+        count = int(value)
+    except ValueError:
+        raise ValueError(f"❌ Invalid TSE_WORKERS '{value}'. Use a number of workers or 'auto'.")
+    return max(count, 1)
+
+
+def map_ordered(func, items, n_workers=None):
+    """
+    [func(item) for item in items], computed by up to `n_workers` threads
+    (default: TSE_WORKERS). Results keep the order of `items`; the first
+    error (in that order) is raised once every piece has finished.
+    """
+    items = list(items)
+    n_workers = min(workers(n_workers), len(items))
+    if n_workers <= 1:
+        return [func(item) for item in items]
+
+    def run(item):
+        with stage(f"worker_{getattr(func, '__name__', 'task')}"):
+            return func(item)
+
+    with ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix="tse-worker") as pool:
+        futures = [pool.submit(run, item) for item in items]
+    return [future.result() for future in futures]